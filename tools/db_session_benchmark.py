@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Counts the queries and connections used to handle GET /instances/{id}.
+
+The request goes through ContextMiddleware to the instance controller,
+with and without sql_connection_per_request. The instance is still being
+built, so neither nova nor the guest is called.
+"""
+
+import optparse
+import os
+import sys
+import time
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'trove', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from sqlalchemy import event
+import webob
+import webob.dec
+
+from trove.common import cfg
+from trove.common import utils
+from trove.common import wsgi
+from trove.db import get_db_api
+from trove.db.sqlalchemy import session
+from trove.instance import models
+from trove.instance import service
+from trove.instance.tasks import InstanceTasks
+from trove.openstack.common import jsonutils
+
+CONF = cfg.CONF
+
+
+class Counter(object):
+
+    def __init__(self, engine):
+        self.queries = 0
+        self.connections = 0
+        event.listen(engine, "before_cursor_execute", self.query)
+        event.listen(engine, "checkout", self.checkout)
+
+    def query(self, *args):
+        self.queries += 1
+
+    def checkout(self, *args):
+        self.connections += 1
+
+
+def create_instance(tenant_id):
+    instance = models.DBInstance.create(
+        name='benchmark', flavor_id=1, tenant_id=tenant_id,
+        volume_size=1, task_status=InstanceTasks.BUILDING)
+    models.InstanceServiceStatus.create(
+        instance_id=instance.id,
+        status=models.ServiceStatuses.NEW)
+    return instance.id
+
+
+def show_app(tenant_id, instance_id):
+    controller = service.InstanceController()
+
+    @webob.dec.wsgify(RequestClass=wsgi.Request)
+    def app(req):
+        result = controller.show(req, tenant_id, instance_id)
+        return webob.Response(
+            status=result.status,
+            body=jsonutils.dumps(result.data('application/json')))
+    return app
+
+
+def run(app, tenant_id, instance_id, requests):
+    url = "/v1.0/%s/instances/%s" % (tenant_id, instance_id)
+    start = time.time()
+    for i in xrange(requests):
+        req = webob.Request.blank(url, headers={'X-Auth-Token': 'token',
+                                                'X-Tenant-Id': tenant_id})
+        response = req.get_response(app)
+        assert response.status_int == 200, response.body
+    return time.time() - start
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--connection",
+                      default="sqlite:////tmp/trove_session_benchmark.sqlite",
+                      help="Database to read the instance from")
+    parser.add_option("--requests", type="int", default=1000,
+                      help="Number of requests to make in each mode")
+    options, args = parser.parse_args()
+
+    db_options = {'sql_connection': options.connection}
+    get_db_api().db_sync(db_options)
+    session.configure_db(db_options)
+    counter = Counter(session._ENGINE)
+
+    tenant_id = utils.generate_uuid()
+    instance_id = create_instance(tenant_id)
+    for per_request in (False, True):
+        CONF.sql_connection_per_request = per_request
+        app = wsgi.ContextMiddleware(show_app(tenant_id, instance_id))
+        counter.queries = counter.connections = 0
+        elapsed = run(app, tenant_id, instance_id, options.requests)
+        print("sql_connection_per_request=%s: %.1f queries, "
+              "%.1f connections, %.2f ms per request" %
+              (per_request, float(counter.queries) / options.requests,
+               float(counter.connections) / options.requests,
+               elapsed * 1e3 / options.requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measures the overhead of the rate limiter per API request.
+
+Requests from many distinct users are checked against the default limits
+plus a few extra URI limits, the way RateLimitingMiddleware does it.
+"""
+
+import optparse
+import os
+import random
+import resource
+import sys
+import time
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'trove', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from trove.common import limits
+
+
+EXTRA_LIMITS = ("(POST, */instances, .*/instances$, 20, MINUTE);"
+                "(POST, */backups, .*/backups$, 10, HOUR);"
+                "(GET, */instances/*, .*/instances/[^/]+$, 600, MINUTE);"
+                "(DELETE, */instances/*, .*/instances/[^/]+$, 20, HOUR)")
+
+REQUESTS = [
+    ("GET", "/v1.0/%s/instances"),
+    ("GET", "/v1.0/%s/instances/1234"),
+    ("GET", "/v1.0/%s/flavors"),
+    ("POST", "/v1.0/%s/instances"),
+    ("POST", "/v1.0/%s/backups"),
+    ("PUT", "/v1.0/%s/instances/1234"),
+    ("DELETE", "/v1.0/%s/instances/1234"),
+]
+
+
+def run(limiter, users, requests):
+    random.seed(42)
+    calls = [(verb, url % user, user)
+             for verb, url, user in
+             ((random.choice(REQUESTS) + (random.choice(users),))
+              for _ in xrange(requests))]
+    start = time.time()
+    for verb, url, user in calls:
+        limiter.check_for_delay(verb, url, user)
+        limiter.get_limits(user)
+    return time.time() - start
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--users", type="int", default=10000,
+                      help="Number of distinct users making requests")
+    parser.add_option("--requests", type="int", default=200000,
+                      help="Number of requests to check")
+    parser.add_option("--limiter", default="trove.common.limits.Limiter",
+                      help="Limiter class to measure")
+    options, args = parser.parse_args()
+
+    limiter_class = limits.importutils.import_class(options.limiter)
+    limiter = limiter_class(limits.DEFAULT_LIMITS +
+                            limits.Limiter.parse_limits(EXTRA_LIMITS))
+    users = ["tenant-%d" % i for i in xrange(options.users)]
+
+    elapsed = run(limiter, users, options.requests)
+    print("%s: %d requests from %d users in %.2fs, %.1f us per request" %
+          (options.limiter, options.requests, options.users, elapsed,
+           elapsed * 1e6 / options.requests))
+    print("Peak memory: %d KB" %
+          resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Reserves and commits instance quota for one tenant from parallel threads.
+
+Every thread keeps creating instances until the quota is used up. The
+instances in use must end up exactly at the limit: anything above it
+was let through by two reservations that read the same usage.
+
+On MySQL and PostgreSQL the usage rows are locked with SELECT ... FOR
+UPDATE; on SQLite every transaction takes the database write lock.
+"""
+
+import optparse
+import os
+import sys
+import threading
+import time
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'trove', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from trove.common import exception
+from trove.common import utils
+from trove.db import get_db_api
+from trove.db.sqlalchemy import session
+from trove.quota.models import Quota
+from trove.quota.models import QuotaUsage
+from trove.quota.models import Resource
+from trove.quota.quota import QUOTAS
+
+
+class Worker(threading.Thread):
+
+    def __init__(self, tenant_id):
+        super(Worker, self).__init__()
+        self.tenant_id = tenant_id
+        self.committed = 0
+        self.errors = 0
+
+    def run(self):
+        while True:
+            try:
+                reservations = QUOTAS.reserve(self.tenant_id, instances=1)
+            except exception.QuotaExceeded:
+                return
+            except Exception:
+                self.errors += 1
+                return
+            QUOTAS.commit(reservations)
+            self.committed += 1
+
+
+def run(tenant_id, workers):
+    threads = [Worker(tenant_id) for i in xrange(workers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return threads, time.time() - start
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--connection",
+                      default="sqlite:////tmp/trove_quota_benchmark.sqlite",
+                      help="Database to reserve quota in")
+    parser.add_option("--workers", type="int", default=20,
+                      help="Number of threads reserving at once")
+    parser.add_option("--limit", type="int", default=200,
+                      help="Instance quota of the tenant")
+    options, args = parser.parse_args()
+
+    db_options = {'sql_connection': options.connection}
+    get_db_api().db_sync(db_options)
+    session.configure_db(db_options)
+
+    tenant_id = utils.generate_uuid()
+    Quota.create(tenant_id=tenant_id, resource=Resource.INSTANCES,
+                 hard_limit=options.limit)
+
+    threads, elapsed = run(tenant_id, options.workers)
+    committed = sum(thread.committed for thread in threads)
+    errors = sum(thread.errors for thread in threads)
+    usage = QuotaUsage.find_by(tenant_id=tenant_id,
+                               resource=Resource.INSTANCES)
+    print("%d workers committed %d instances in %.2fs, %.1f ms each, "
+          "%d workers failed" %
+          (options.workers, committed, elapsed,
+           elapsed * 1e3 / max(committed, 1), errors))
+    print("Limit %d, in use %d, reserved %d, over-allocated %d" %
+          (options.limit, usage.in_use, usage.reserved,
+           max(usage.in_use + usage.reserved - options.limit, 0)))
+    return 1 if usage.in_use + usage.reserved > options.limit else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
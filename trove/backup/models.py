@@ -18,6 +18,7 @@ from trove.common import cfg
 from trove.common import exception
 from trove.db.models import DatabaseModelBase
 from trove.openstack.common import log as logging
+from trove.openstack.common.gettextutils import _
 from swiftclient.client import ClientException
 from trove.taskmanager import api
 from trove.common.remote import create_swift_client
@@ -42,7 +43,8 @@ class BackupState(object):
 class Backup(object):
 
     @classmethod
-    def create(cls, context, instance, name, description=None):
+    def create(cls, context, instance, name, description=None,
+               parent_id=None):
         """
         create db record for Backup
         :param cls:
@@ -50,6 +52,7 @@ class Backup(object):
         :param instance:
         :param name:
         :param description:
+        :param parent_id: Id of the backup an incremental backup builds on
         :return:
         """
 
@@ -64,12 +67,16 @@ class Backup(object):
 
             cls.verify_swift_auth_token(context)
 
+            if parent_id is not None:
+                cls.validate_parent(context, parent_id, instance_id)
+
             try:
                 db_info = DBBackup.create(name=name,
                                           description=description,
                                           tenant_id=context.tenant,
                                           state=BackupState.NEW,
                                           instance_id=instance_id,
+                                          parent_id=parent_id,
                                           deleted=False)
             except exception.InvalidModelError as ex:
                 LOG.exception("Unable to create Backup record:")
@@ -82,6 +89,26 @@ class Backup(object):
                                {'backups': 1},
                                _create_resources)
 
+    @classmethod
+    def validate_parent(cls, context, parent_id, instance_id):
+        """
+        Checks that an incremental backup can build on the given backup
+        :param parent_id: Id of the parent backup
+        :param instance_id: Id of the instance being backed up
+        """
+        parent = cls.get_by_id(context, parent_id)
+        if parent.instance_id != instance_id:
+            msg = ("Backup %s is not a backup of instance %s." %
+                   (parent_id, instance_id))
+            raise exception.UnprocessableEntity(msg)
+        if parent.state != BackupState.COMPLETED:
+            msg = "Backup %s is not completed." % parent_id
+            raise exception.UnprocessableEntity(msg)
+        if parent.to_lsn is None:
+            msg = ("Backup %s has no LSN to start an incremental backup "
+                   "from." % parent_id)
+            raise exception.UnprocessableEntity(msg)
+
     @classmethod
     def running(cls, instance_id, exclude=None):
         """
@@ -115,29 +142,34 @@ class Backup(object):
         except exception.NotFound:
             raise exception.NotFound(uuid=backup_id)
 
+    @classmethod
+    def _page_limit(cls, context):
+        limit = int(context.limit or CONF.backups_page_size)
+        return min(limit, CONF.backups_page_size)
+
     @classmethod
     def list(cls, context):
         """
-        list all live Backups belong to given tenant
+        list a page of live Backups belong to given tenant, newest first
         :param cls:
-        :param context: tenant_id included
-        :return:
+        :param context: tenant_id, limit and marker included
+        :return: the Backups and the marker of the next page (or None)
         """
-        db_info = DBBackup.find_all(tenant_id=context.tenant,
-                                    deleted=False)
-        return db_info
+        return DBBackup.find_page(cls._page_limit(context), context.marker,
+                                  tenant_id=context.tenant, deleted=False)
 
     @classmethod
-    def list_for_instance(cls, instance_id):
+    def list_for_instance(cls, context, instance_id):
         """
-        list all live Backups associated with given instance
+        list a page of live Backups associated with given instance, newest
+        first
         :param cls:
+        :param context: limit and marker included
         :param instance_id:
-        :return:
+        :return: the Backups and the marker of the next page (or None)
         """
-        db_info = DBBackup.find_all(instance_id=instance_id,
-                                    deleted=False)
-        return db_info
+        return DBBackup.find_page(cls._page_limit(context), context.marker,
+                                  instance_id=instance_id, deleted=False)
 
     @classmethod
     def delete(cls, context, backup_id):
@@ -155,6 +187,10 @@ class Backup(object):
                 msg = ("Backup %s cannot be delete because it is running." %
                        backup_id)
                 raise exception.UnprocessableEntity(msg)
+            if DBBackup.find_all(parent_id=backup_id, deleted=False).count():
+                msg = ("Backup %s cannot be deleted because incremental "
+                       "backups depend on it." % backup_id)
+                raise exception.UnprocessableEntity(msg)
             cls.verify_swift_auth_token(context)
             api.API(context).delete_backup(backup_id)
 
@@ -195,9 +231,55 @@ class DBBackup(DatabaseModelBase):
     _data_fields = ['id', 'name', 'description', 'location', 'backup_type',
                     'size', 'tenant_id', 'state', 'instance_id',
                     'checksum', 'backup_timestamp', 'deleted', 'created',
-                    'updated', 'deleted_at']
+                    'updated', 'deleted_at', 'compression', 'encryption',
+                    'parent_id', 'from_lsn', 'to_lsn']
     preserve_on_delete = True
 
+    @property
+    def is_incremental(self):
+        return self.parent_id is not None
+
+    @classmethod
+    def find_page(cls, limit, marker=None, **conditions):
+        """Loads a page of backups, newest first.
+
+        The marker is the id of the last backup on the previous page; the
+        page continues after its creation time (and id, for backups created
+        at the same time) so no rows are skipped over with an offset. Returns
+        the backups on the page and the marker of the next page (or None).
+
+        """
+        query = cls.query().filter_by(**conditions)
+        if marker:
+            # The marker may have been deleted since the last page was read.
+            marker_conditions = dict((key, value) for key, value
+                                     in conditions.items() if key != 'deleted')
+            last = cls.query().filter_by(id=marker,
+                                         **marker_conditions).first()
+            if last is None:
+                raise exception.BadRequest(_("Invalid marker: %s") % marker)
+            query = query.filter((cls.created < last.created) |
+                                 ((cls.created == last.created) &
+                                  (cls.id < last.id)))
+        query = query.order_by(cls.created.desc(), cls.id.desc())
+        backups = query.limit(limit + 1).all()
+        next_marker = None
+        if len(backups) > limit:
+            backups = backups[:limit]
+            next_marker = backups[-1].id
+        return backups, next_marker
+
+    def chain(self):
+        """
+        Returns the backups needed to restore this one, oldest first: a full
+        backup followed by the incremental backups built on it.
+        """
+        chain = [self]
+        while chain[0].is_incremental:
+            chain.insert(0, DBBackup.find_by(id=chain[0].parent_id,
+                                             deleted=False))
+        return chain
+
     @property
     def is_running(self):
         return self.state in BackupState.RUNNING_STATES
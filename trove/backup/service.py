@@ -20,6 +20,7 @@ from trove.backup import views
 from trove.backup.models import Backup
 from trove.common import exception
 from trove.common import cfg
+from trove.common import pagination
 from trove.openstack.common import log as logging
 from trove.openstack.common.gettextutils import _
 import trove.common.apischema as apischema
@@ -40,8 +41,11 @@ class BackupController(wsgi.Controller):
         """
         LOG.debug("Listing Backups for tenant '%s'" % tenant_id)
         context = req.environ[wsgi.CONTEXT_KEY]
-        backups = Backup.list(context)
-        return wsgi.Result(views.BackupViews(backups).data(), 200)
+        backups, marker = Backup.list(context)
+        view = views.BackupViews(backups)
+        paged = pagination.SimplePaginatedDataView(req.url, 'backups', view,
+                                                   marker)
+        return wsgi.Result(paged.data(), 200)
 
     def show(self, req, tenant_id, id):
         """Return a single backup."""
@@ -58,7 +62,9 @@ class BackupController(wsgi.Controller):
         instance = data['instance']
         name = data['name']
         desc = data.get('description')
-        backup = Backup.create(context, instance, name, desc)
+        parent_id = data.get('parent_id')
+        backup = Backup.create(context, instance, name, desc,
+                               parent_id=parent_id)
         return wsgi.Result(views.BackupView(backup).data(), 202)
 
     def delete(self, req, tenant_id, id):
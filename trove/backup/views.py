@@ -30,7 +30,8 @@ class BackupView(object):
             "instance_id": self.backup.instance_id,
             "created": self.backup.created,
             "updated": self.backup.updated,
-            "status": self.backup.state
+            "status": self.backup.state,
+            "parent_id": self.backup.parent_id
         }
         }
 
@@ -138,31 +138,45 @@ users_list = {
     }
 }
 
+instance_def = {
+    "type": "object",
+    "required": ["name", "flavorRef", "volume"],
+    "additionalProperties": False,
+    "properties": {
+        "name": non_empty_string,
+        "flavorRef": flavorref,
+        "volume": volume,
+        "databases": databases_def,
+        "users": users_list,
+        "restorePoint": {
+            "type": "object",
+            "required": ["backupRef"],
+            "additionalProperties": False,
+            "properties": {
+                "backupRef": uuid
+            }
+        }
+    }
+}
+
 instance = {
     "create": {
         "type": "object",
         "required": ["instance"],
         "additionalProperties": False,
         "properties": {
-            "instance": {
-                "type": "object",
-                "required": ["name", "flavorRef", "volume"],
-                "additionalProperties": False,
-                "properties": {
-                    "name": non_empty_string,
-                    "flavorRef": flavorref,
-                    "volume": volume,
-                    "databases": databases_def,
-                    "users": users_list,
-                    "restorePoint": {
-                        "type": "object",
-                        "required": ["backupRef"],
-                        "additionalProperties": False,
-                        "properties": {
-                            "backupRef": uuid
-                        }
-                    }
-                }
+            "instance": instance_def
+        }
+    },
+    "batch": {
+        "type": "object",
+        "required": ["instances"],
+        "additionalProperties": False,
+        "properties": {
+            "instances": {
+                "type": "array",
+                "minItems": 1,
+                "items": instance_def
             }
         }
     },
@@ -292,7 +306,8 @@ backup = {
                 "properties": {
                     "description": non_empty_string,
                     "instance": uuid,
-                    "name": non_empty_string
+                    "name": non_empty_string,
+                    "parent_id": uuid
                 }
             }
         }
@@ -24,6 +24,20 @@ common_opts = [
                help='SQL Connection'),
     cfg.IntOpt('sql_idle_timeout', default=3600),
     cfg.BoolOpt('sql_query_log', default=False),
+    cfg.IntOpt('sql_max_pool_size', default=None,
+               help='Connections kept open in the pool of each process '
+                    '(the SQLAlchemy default when not set)'),
+    cfg.IntOpt('sql_max_overflow', default=None,
+               help='Connections opened beyond sql_max_pool_size when '
+                    'they are all in use'),
+    cfg.IntOpt('sql_pool_timeout', default=None,
+               help='Seconds to wait for a free connection from the pool'),
+    cfg.BoolOpt('sql_pool_pre_ping', default=False,
+                help='Check each connection with a SELECT 1 when it is '
+                     'taken from the pool, replacing dropped ones'),
+    cfg.BoolOpt('sql_connection_per_request', default=False,
+                help='Whether the database calls made for one API request '
+                     'share one database connection'),
     cfg.IntOpt('bind_port', default=8779),
     cfg.StrOpt('api_extensions_path', default='',
                help='Path to extensions'),
@@ -67,6 +81,7 @@ common_opts = [
     cfg.IntOpt('users_page_size', default=20),
     cfg.IntOpt('databases_page_size', default=20),
     cfg.IntOpt('instances_page_size', default=20),
+    cfg.IntOpt('backups_page_size', default=20),
     cfg.ListOpt('ignore_users', default=[]),
     cfg.ListOpt('ignore_dbs', default=[]),
     cfg.IntOpt('agent_call_low_timeout', default=5),
@@ -74,6 +89,14 @@ common_opts = [
     cfg.StrOpt('guest_id', default=None),
     cfg.IntOpt('state_change_wait_time', default=3 * 60),
     cfg.IntOpt('agent_heartbeat_time', default=10),
+    cfg.IntOpt('status_refresh_interval', default=10 * 60,
+               help='Seconds after which the guest agent writes its status '
+                    'again even if it has not changed'),
+    cfg.StrOpt('mysql_status_probe', default='process',
+               help="How the guest agent checks that MySQL is up: "
+                    "'connection' pings it over a pooled local connection "
+                    "and only checks the mysqld process when that fails, "
+                    "'process' always runs mysqladmin"),
     cfg.IntOpt('num_tries', default=3),
     cfg.StrOpt('volume_fstype', default='ext3'),
     cfg.StrOpt('format_options', default='-m 5'),
@@ -87,10 +110,55 @@ common_opts = [
                help='default maximum for total volume used by a tenant'),
     cfg.IntOpt('max_backups_per_user', default=5,
                help='default maximum number of backups created by a tenant'),
+    cfg.IntOpt('instance_batch_max_size', default=50,
+               help='Maximum number of instances in a batch create request'),
+    cfg.IntOpt('instance_batch_chunk_size', default=10,
+               help='Number of instances of a batch sent to the task '
+                    'manager in one message'),
     cfg.StrOpt('quota_driver',
                default='trove.quota.quota.DbQuotaDriver',
                help='default driver to use for quota checks'),
+    cfg.IntOpt('quota_cache_ttl', default=30,
+               help='Seconds each process keeps the quotas of a tenant '
+                    'before reading them again (0 disables the cache)'),
+    cfg.IntOpt('reservation_expire', default=86400,
+               help='Seconds after which a quota reservation which was '
+                    'neither committed nor rolled back is expired'),
+    cfg.IntOpt('reservation_expire_ticks', default=60,
+               help='Number of report_intervals between two sweeps of the '
+                    'expired quota reservations'),
+    cfg.IntOpt('host_update_workers', default=10,
+               help='Number of guests of a compute host the management API '
+                    'updates at once'),
     cfg.StrOpt('taskmanager_queue', default='taskmanager'),
+    cfg.StrOpt('conductor_queue', default='conductor'),
+    cfg.BoolOpt('guest_use_conductor', default=False,
+                help='Whether the guest agent reports its heartbeat and '
+                     'status through trove-conductor instead of writing '
+                     'them to the database itself'),
+    cfg.IntOpt('conductor_flush_ticks', default=0,
+               help='Number of report_intervals to skip between writes of '
+                    'the buffered heartbeats (see report_interval)'),
+    cfg.ListOpt('task_event_sources', default=[],
+                help='Changes the taskmanager is told about instead of '
+                     'polling for them: guest (status changes flushed by '
+                     'trove-conductor) and compute (nova notifications)'),
+    cfg.IntOpt('task_wait_fallback_interval', default=30,
+               help='Seconds between the polls of a task waiting on a '
+                    'change reported by one of the task_event_sources'),
+    cfg.StrOpt('nova_notification_topic', default='notifications.info',
+               help='Topic nova sends its notifications to'),
+    cfg.StrOpt('nova_notification_exchange', default='nova',
+               help='Exchange nova sends its notifications to'),
+    cfg.IntOpt('task_max_running', default=0,
+               help='Maximum number of tasks a task manager runs at once; '
+                    'the others are queued (0 means no limit)'),
+    cfg.IntOpt('task_max_running_per_tenant', default=0,
+               help='Maximum number of tasks a task manager runs at once '
+                    'for one tenant (0 means no limit)'),
+    cfg.IntOpt('task_stats_ticks', default=6,
+               help='Number of report_intervals between two logs of the '
+                    'task queue statistics'),
     cfg.BoolOpt('use_nova_server_volume', default=False),
     cfg.StrOpt('fake_mode_events', default='simulated'),
     cfg.StrOpt('device_path', default='/dev/vdb'),
@@ -110,6 +178,13 @@ common_opts = [
     cfg.IntOpt('http_post_rate', default=200),
     cfg.IntOpt('http_delete_rate', default=200),
     cfg.IntOpt('http_put_rate', default=200),
+    cfg.StrOpt('rate_limit_store',
+               default='trove.common.limits.MemoryLimiterStore',
+               help='Store keeping the rate limits of the SharedLimiter; '
+                    'use trove.common.limits.RedisLimiterStore to share '
+                    'them between API workers and nodes'),
+    cfg.StrOpt('rate_limit_redis_url', default='redis://localhost:6379/0',
+               help='Redis server of the RedisLimiterStore'),
     cfg.BoolOpt('hostname_require_ipv4', default=True,
                 help="Require user hostnames to be IPv4 addresses."),
     cfg.BoolOpt('trove_security_groups_support', default=True),
@@ -126,6 +201,10 @@ common_opts = [
                default='trove.guestagent.backup.backup_types.InnoBackupEx'),
     cfg.StrOpt('backup_strategy', default='InnoBackupEx',
                help='Default strategy to perform backups'),
+    cfg.StrOpt('backup_incremental_strategy',
+               default='InnoBackupExIncremental',
+               help='Strategy to perform incremental backups on top of '
+                    'backups taken with backup_strategy'),
     cfg.StrOpt('backup_namespace',
                default='trove.guestagent.strategies.backup.impl',
                help='Namespace to load backup strategies from'),
@@ -144,12 +223,33 @@ common_opts = [
                 help='Encrypt backups using openssl.'),
     cfg.StrOpt('backup_aes_cbc_key', default='default_aes_cbc_key',
                help='default openssl aes_cbc key.'),
+    cfg.BoolOpt('backup_stream_stages', default=False,
+                help='Compress and encrypt backups inside the guest agent '
+                     'instead of piping them through gzip and openssl, '
+                     'which keeps the key off the command line.'),
+    cfg.IntOpt('backup_compression_workers', default=1,
+               help='Number of threads compressing a backup when '
+                    'backup_stream_stages is set.'),
     cfg.BoolOpt('backup_use_snet', default=False,
                 help='Send backup files over snet.'),
     cfg.IntOpt('backup_chunk_size', default=2 ** 16,
                help='Chunk size to stream to swift container'),
     cfg.IntOpt('backup_segment_max_size', default=2 * (1024 ** 3),
                help="Maximum size of each segment of the backup file."),
+    cfg.IntOpt('backup_upload_workers', default=1,
+               help='Number of backup segments uploaded to Swift at once. '
+                    'Above 1 every segment in flight is held in memory, '
+                    'so lower backup_segment_max_size accordingly.'),
+    cfg.IntOpt('backup_download_workers', default=1,
+               help='Number of backup segments downloaded from Swift at '
+                    'once during a restore. Above 1 the segments are '
+                    'fetched with the Swift API and held in memory until '
+                    'read, instead of streamed by the swift command.'),
+    cfg.IntOpt('backup_restore_read_ahead', default=0,
+               help='Number of backup chunks downloaded ahead of the one '
+                    'being extracted during a restore, so the download '
+                    'and the extraction overlap. 0 only reads a chunk '
+                    'once the previous one is extracted.'),
     cfg.StrOpt('remote_dns_client',
                default='trove.common.remote.dns_client'),
     cfg.StrOpt('remote_guest_client',
@@ -160,6 +260,20 @@ common_opts = [
                default='trove.common.remote.nova_volume_client'),
     cfg.StrOpt('remote_swift_client',
                default='trove.common.remote.swift_client'),
+    cfg.StrOpt('server_cache_driver',
+               default='trove.common.server_cache.LRUServerCacheDriver',
+               help='Driver used to cache the state of Nova servers'),
+    cfg.IntOpt('server_cache_size', default=1000,
+               help='Maximum number of Nova servers kept in the cache'),
+    cfg.IntOpt('server_cache_ttl', default=5,
+               help='Seconds a cached Nova server state stays fresh; '
+                    '0 disables the cache'),
+    cfg.IntOpt('server_cache_stats_interval', default=300,
+               help='Seconds between logging the server cache hit and miss '
+                    'counts; 0 disables the logging'),
+    cfg.IntOpt('server_load_workers', default=10,
+               help='Number of Nova servers the instance list fetches at '
+                    'once'),
     cfg.StrOpt('exists_notification_transformer',
                help='Transformer for exists notifications'),
     cfg.IntOpt('exists_notification_ticks', default=360,
@@ -18,7 +18,6 @@ Module dedicated functions/classes dealing with rate limiting requests.
 """
 
 import collections
-import copy
 import httplib
 import math
 import re
@@ -43,6 +42,26 @@ PER_HOUR = 60 * 60
 PER_DAY = 60 * 60 * 24
 
 
+def leak(water_level, last_request, capacity, request_value, hit, now):
+    """
+    Leaks the water of a bucket since its last request and, for a hit,
+    pours in the value of a new request.
+
+    @return: Tuple of the delay until the request fits (or None) and the
+             new water level.
+    """
+    if last_request is None:
+        last_request = now
+    water_level = max(water_level - (now - last_request), 0)
+    if not hit:
+        return None, water_level
+    water_level += request_value
+    difference = water_level - capacity
+    if difference > 0:
+        return difference, water_level - request_value
+    return None, water_level
+
+
 class Limit(object):
     """
     Stores information about a limit for HTTP requests.
@@ -84,6 +103,7 @@ class Limit(object):
         self.water_level = 0
         self.capacity = self.unit
         self.request_value = float(self.capacity) / float(self.value)
+        self.match = re.compile(regex).match
         msg = _("Only %(value)s %(verb)s request(s) can be "
                 "made to %(uri)s every %(unit_string)s.")
         self.error_message = msg % self.__dict__
@@ -95,35 +115,37 @@ class Limit(object):
         @param verb: string http verb (POST, GET, etc.)
         @param url: string URL
         """
-        if self.verb != verb or not re.match(self.regex, url):
+        if self.verb != verb or not self.match(url):
             return
 
-        now = self._get_time()
-
-        if self.last_request is None:
-            self.last_request = now
-
-        leak_value = now - self.last_request
-
-        self.water_level -= leak_value
-        self.water_level = max(self.water_level, 0)
-        self.water_level += self.request_value
+        return self.fill(self, self._get_time())
 
-        difference = self.water_level - self.capacity
-
-        self.last_request = now
+    def fill(self, bucket, now):
+        """
+        Pours a request into the bucket, which holds the state of this
+        limit for one user: either the limit itself or a `Bucket`.
 
-        if difference > 0:
-            self.water_level -= self.request_value
-            self.next_request = now + difference
-            return difference
+        @return: Delay in seconds before the request fits, or None
+        """
+        delay, bucket.water_level = leak(bucket.water_level,
+                                         bucket.last_request, self.capacity,
+                                         self.request_value, True, now)
+        self.refresh(bucket, now, delay)
+        return delay
+
+    def refresh(self, bucket, now, delay):
+        """Updates what the bucket shows after a request at now."""
+        bucket.last_request = now
+        if delay:
+            bucket.next_request = now + delay
+            return
 
         cap = self.capacity
-        water = self.water_level
+        water = bucket.water_level
         val = self.value
 
-        self.remaining = math.floor(((cap - water) / cap) * val)
-        self.next_request = now
+        bucket.remaining = math.floor(((cap - water) / cap) * val)
+        bucket.next_request = now
 
     def _get_time(self):
         """Retrieve the current time. Broken out for testability."""
@@ -133,18 +155,62 @@ class Limit(object):
         """Display the string name of the unit."""
         return self.UNITS.get(self.unit, "UNKNOWN")
 
-    def display(self):
-        """Return a useful representation of this class."""
+    def display(self, bucket=None):
+        """Return a useful representation of this class.
+
+        @param bucket: `Bucket` holding the state of a user, if not this
+                       limit itself
+        """
+        bucket = bucket or self
         return {
             "verb": self.verb,
             "URI": self.uri,
             "regex": self.regex,
             "value": self.value,
-            "remaining": int(self.remaining),
+            "remaining": int(bucket.remaining),
             "unit": self.display_unit(),
-            "resetTime": int(self.next_request or self._get_time()),
+            "resetTime": int(bucket.next_request or self._get_time()),
         }
 
+
+class Bucket(object):
+    """
+    The state of one `Limit` for one user.
+    """
+
+    __slots__ = ['water_level', 'last_request', 'next_request', 'remaining']
+
+    def __init__(self, limit):
+        self.water_level = 0
+        self.last_request = None
+        self.next_request = None
+        self.remaining = limit.value
+
+
+class LimitList(list):
+    """
+    A list of `Limit` objects, indexed by HTTP verb.
+    """
+
+    def __init__(self, limits=()):
+        super(LimitList, self).__init__(limits)
+        self.by_verb = collections.defaultdict(list)
+        for index, limit in enumerate(self):
+            self.by_verb[limit.verb].append((index, limit))
+
+
+class UserLimits(dict):
+    """
+    The limits of each user: the defaults, unless set for that user.
+    """
+
+    def __init__(self, default):
+        super(UserLimits, self).__init__()
+        self.default = default
+
+    def __missing__(self, username):
+        return self.default
+
 # "Limit" format is a dictionary with the HTTP verb, human-readable URI,
 # a regular-expression to match, value and unit of measure (PER_DAY, etc.)
 DEFAULT_LIMITS = [
@@ -225,22 +291,38 @@ class Limiter(object):
         """
         Initialize the new `Limiter`.
 
+        The limits are shared by all the users; the state of each user is
+        kept in a `Bucket` per limit, created on the first request that
+        limit applies to.
+
         @param limits: List of `Limit` objects
         """
-        self.limits = copy.deepcopy(limits)
-        self.levels = collections.defaultdict(lambda: copy.deepcopy(limits))
+        self.limits = LimitList(limits)
+        self.levels = UserLimits(self.limits)
+        self.buckets = {}
 
         # Pick up any per-user limit information
         for key, value in kwargs.items():
             if key.startswith('user:'):
                 username = key[5:]
-                self.levels[username] = self.parse_limits(value)
+                self.levels[username] = LimitList(self.parse_limits(value))
+
+    def _get_buckets(self, username, limits):
+        """Returns the buckets of the user, one per limit."""
+        buckets = self.buckets.get(username)
+        if buckets is None:
+            buckets = [Bucket(limit) for limit in limits]
+            self.buckets[username] = buckets
+        return buckets
 
     def get_limits(self, username=None):
         """
         Return the limits for a given user.
         """
-        return [limit.display() for limit in self.levels[username]]
+        limits = self.levels[username]
+        buckets = self.buckets.get(username) or [None] * len(limits)
+        return [limit.display(bucket)
+                for limit, bucket in zip(limits, buckets)]
 
     def check_for_delay(self, verb, url, username=None):
         """
@@ -249,9 +331,15 @@ class Limiter(object):
         @return: Tuple of delay (in seconds) and error message (or None, None)
         """
         delays = []
-
-        for limit in self.levels[username]:
-            delay = limit(verb, url)
+        buckets = None
+        limits = self.levels[username]
+
+        for index, limit in limits.by_verb.get(verb, ()):
+            if not limit.match(url):
+                continue
+            if buckets is None:
+                buckets = self._get_buckets(username, limits)
+            delay = limit.fill(buckets[index], limit._get_time())
             if delay:
                 delays.append((delay, limit.error_message))
 
@@ -325,6 +413,172 @@ class Limiter(object):
         return result
 
 
+class LimiterStore(object):
+    """
+    Keeps the leaky buckets of a `SharedLimiter`, which several API workers
+    or nodes can share.
+    """
+
+    def hit(self, buckets, now):
+        """
+        Leaks the given buckets and pours a request into the hit ones, in
+        a single atomic step.
+
+        @param buckets: List of (key, capacity, request_value, hit) tuples
+        @param now: Time of the request
+        @return: List of (delay, water_level) tuples, one per bucket, where
+                 delay is None unless the request is over the limit
+        """
+        raise NotImplementedError()
+
+
+class MemoryLimiterStore(LimiterStore):
+    """
+    Keeps the buckets in process memory, so they are only shared by the
+    limiters of one worker.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+
+    def hit(self, buckets, now):
+        results = []
+        for key, capacity, request_value, hit in buckets:
+            water_level, last_request = self.buckets.get(key, (0, None))
+            delay, water_level = leak(water_level, last_request, capacity,
+                                      request_value, hit, now)
+            if hit or last_request is not None:
+                self.buckets[key] = (water_level, now)
+            results.append((delay, water_level))
+        return results
+
+
+class RedisLimiterStore(LimiterStore):
+    """
+    Keeps the buckets in Redis, or any server speaking its protocol, so all
+    the workers pointed at it enforce the same limits. A Lua script updates
+    every bucket of a request in one round trip.
+    """
+
+    KEY_PREFIX = 'trove:ratelimit:'
+
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local results = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local request_value = tonumber(ARGV[i * 3])
+    local hit = ARGV[i * 3 + 1] == '1'
+    local state = redis.call('HMGET', key, 'water_level', 'last_request')
+    local water_level = tonumber(state[1]) or 0
+    local last_request = tonumber(state[2]) or now
+    water_level = math.max(water_level - (now - last_request), 0)
+    local delay = ''
+    if hit then
+        water_level = water_level + request_value
+        local difference = water_level - capacity
+        if difference > 0 then
+            water_level = water_level - request_value
+            delay = tostring(difference)
+        end
+    end
+    if hit or state[2] then
+        redis.call('HMSET', key, 'water_level', tostring(water_level),
+                   'last_request', tostring(now))
+        redis.call('EXPIRE', key, math.ceil(capacity) + 1)
+    end
+    results[i] = {delay, tostring(water_level)}
+end
+return results
+"""
+
+    def __init__(self, client=None):
+        if client is None:
+            redis = importutils.import_module('redis')
+            client = redis.StrictRedis.from_url(CONF.rate_limit_redis_url)
+        self.client = client
+        self.script = client.register_script(self.SCRIPT)
+
+    def hit(self, buckets, now):
+        keys = []
+        args = [repr(now)]
+        for key, capacity, request_value, hit in buckets:
+            keys.append(self.KEY_PREFIX + key)
+            args.extend([repr(capacity), repr(request_value),
+                         '1' if hit else '0'])
+        results = self.script(keys=keys, args=args)
+        return [(float(delay) if delay else None, float(water_level))
+                for delay, water_level in results]
+
+
+class SharedLimiter(Limiter):
+    """
+    Rate-limit checking class which keeps the limits in a `LimiterStore`,
+    so API workers sharing a store enforce one limit between them. Every
+    check costs a single call to the store.
+    """
+
+    def __init__(self, limits, store=None, **kwargs):
+        """
+        Initialize the new `SharedLimiter`.
+
+        @param limits: List of `Limit` objects
+        @param store: `LimiterStore` keeping the buckets, by default the
+                      one configured with rate_limit_store
+        """
+        super(SharedLimiter, self).__init__(limits, **kwargs)
+        if store is None:
+            store = importutils.import_object(CONF.rate_limit_store)
+        self.store = store
+
+    @staticmethod
+    def _bucket_key(username, limit):
+        return '%s:%s:%s:%s:%s' % (username or '', limit.verb, limit.regex,
+                                   limit.value, limit.unit)
+
+    def _get_time(self):
+        """Retrieve the current time. Broken out for testability."""
+        return time.time()
+
+    def check_for_delay(self, verb, url, username=None):
+        """
+        Check the given verb/user/user triplet for limit.
+
+        Every limit of the user is leaked so get_limits() can show them
+        without asking the store again. Requests no limit applies to are
+        not sent to the store.
+
+        @return: Tuple of delay (in seconds) and error message (or None, None)
+        """
+        limits = self.levels[username]
+        if not any(limit.match(url) for index, limit in
+                   limits.by_verb.get(verb, ())):
+            return None, None
+
+        now = self._get_time()
+        hits = []
+        for limit in limits:
+            hit = limit.verb == verb and limit.match(url) is not None
+            hits.append((self._bucket_key(username, limit),
+                         limit.capacity, limit.request_value, hit))
+
+        delays = []
+        results = self.store.hit(hits, now)
+        buckets = self._get_buckets(username, limits)
+        for limit, bucket, (delay, water_level) in zip(limits, buckets,
+                                                       results):
+            bucket.water_level = water_level
+            limit.refresh(bucket, now, delay)
+            if delay:
+                delays.append((delay, limit.error_message))
+
+        if delays:
+            delays.sort()
+            return delays[0]
+
+        return None, None
+
+
 class WsgiLimiter(object):
     """
     Rate-limit checking from a WSGI application. Uses an in-memory `Limiter`.
@@ -44,5 +44,20 @@ class ManagerAPI(object):
             LOG.error(e)
             raise exception.TaskManagerError(original_message=str(e))
 
+    def _fanout_cast(self, method_name, **kwargs):
+        """Casts to every service listening on the routing key."""
+        if CONF.remote_implementation == "fake":
+            self._fake_cast(method_name, **kwargs)
+        else:
+            self._real_fanout_cast(method_name, **kwargs)
+
+    def _real_fanout_cast(self, method_name, **kwargs):
+        try:
+            rpc.fanout_cast(self.context, self._get_routing_key(),
+                            {"method": method_name, "args": kwargs})
+        except Exception as e:
+            LOG.error(e)
+            raise exception.TaskManagerError(original_message=str(e))
+
     def _fake_cast(self, method_name, **kwargs):
         pass
@@ -0,0 +1,176 @@
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Read-through cache of Nova server state for the API.
+
+The cache lives in the memory of each API process, so other services such as
+the taskmanager cannot invalidate it. Entries stay fresh for at most
+server_cache_ttl seconds, and get_server_state bypasses the cache while an
+instance has a task running, which is when the taskmanager changes servers.
+"""
+
+import time
+
+from trove.common import cfg
+from trove.openstack.common import importutils
+from trove.openstack.common.gettextutils import _
+from trove.openstack.common import log as logging
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+class ServerCacheDriver(object):
+    """The base class that all server cache drivers should inherit from.
+
+    Entries are keyed by the compute instance id. The base driver stores
+    nothing, so every lookup goes through to Nova.
+
+    """
+
+    def get(self, server_id):
+        """Returns the cached server, or None if there is no fresh entry."""
+        return None
+
+    def set(self, server_id, server):
+        """Stores the server."""
+        pass
+
+    def delete(self, server_id):
+        """Removes the server from the cache, if present."""
+        pass
+
+    def size(self):
+        return 0
+
+
+class LRUServerCacheDriver(ServerCacheDriver):
+    """Keeps servers in process memory for a limited time.
+
+    At most max_size servers are kept; when full the least recently used
+    entry is evicted. Entries older than ttl seconds are never returned.
+
+    """
+
+    # Indexes into the entries of the doubly linked recency list.
+    PREV, NEXT, KEY, VALUE, EXPIRES = range(5)
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or CONF.server_cache_size
+        self.ttl = ttl if ttl is not None else CONF.server_cache_ttl
+        self.evictions = 0
+        self._entries = {}
+        # The root of a circular list ordered from least to most recently
+        # used, so both lookups and evictions are O(1).
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None, None]
+
+    def _unlink(self, entry):
+        entry[self.PREV][self.NEXT] = entry[self.NEXT]
+        entry[self.NEXT][self.PREV] = entry[self.PREV]
+
+    def _append(self, entry):
+        last = self._root[self.PREV]
+        entry[self.PREV] = last
+        entry[self.NEXT] = self._root
+        last[self.NEXT] = entry
+        self._root[self.PREV] = entry
+
+    def get(self, server_id):
+        entry = self._entries.get(server_id)
+        if entry is None:
+            return None
+        if entry[self.EXPIRES] <= time.time():
+            self.delete(server_id)
+            return None
+        self._unlink(entry)
+        self._append(entry)
+        return entry[self.VALUE]
+
+    def set(self, server_id, server):
+        if self.ttl <= 0:
+            return
+        self.delete(server_id)
+        if len(self._entries) >= self.max_size:
+            oldest = self._root[self.NEXT]
+            self.delete(oldest[self.KEY])
+            self.evictions += 1
+        entry = [None, None, server_id, server, time.time() + self.ttl]
+        self._append(entry)
+        self._entries[server_id] = entry
+
+    def delete(self, server_id):
+        entry = self._entries.pop(server_id, None)
+        if entry is not None:
+            self._unlink(entry)
+
+    def size(self):
+        return len(self._entries)
+
+
+class ServerCache(object):
+    """Looks up Nova servers by id, going through a cache driver first.
+
+    Only use the cached servers to read their state; they may be shared
+    between requests so never call actions on them.
+
+    """
+
+    def __init__(self, driver=None, stats_interval=None):
+        if driver is None:
+            driver = importutils.import_object(CONF.server_cache_driver)
+        if stats_interval is None:
+            stats_interval = CONF.server_cache_stats_interval
+        self._driver = driver
+        self.stats_interval = stats_interval
+        self.hits = 0
+        self.misses = 0
+        self._stats_logged_at = time.time()
+
+    def get(self, client, server_id):
+        """Returns the server, fetching it with the client on a miss."""
+        self._log_stats()
+        server = self._driver.get(server_id)
+        if server is not None:
+            self.hits += 1
+            return server
+        self.misses += 1
+        server = client.servers.get(server_id)
+        self._driver.set(server_id, server)
+        return server
+
+    def invalidate(self, server_id):
+        if server_id:
+            LOG.debug("Invalidating cached state of server %s." % server_id)
+            self._driver.delete(server_id)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': getattr(self._driver, 'evictions', 0),
+                'size': self._driver.size()}
+
+    def _log_stats(self):
+        """Logs the stats at most once every stats_interval seconds."""
+        if self.stats_interval <= 0:
+            return
+        now = time.time()
+        if now - self._stats_logged_at < self.stats_interval:
+            return
+        self._stats_logged_at = now
+        LOG.info(_("Server cache stats: %s") % self.stats())
+
+
+SERVERS = ServerCache()
@@ -29,16 +29,20 @@ import webob.dec
 import webob.exc
 from lxml import etree
 from xml.dom import minidom
+from xml import sax
 
 from trove.common import context as rd_context
 from trove.common import exception
 from trove.common import utils
+from trove.db import get_db_api
+from trove.openstack.common import exception as openstack_exception
 from trove.openstack.common.gettextutils import _
 from trove.openstack.common import jsonutils
 
 from trove.openstack.common import pastedeploy
 from trove.openstack.common import service
 from trove.openstack.common import wsgi as openstack_wsgi
+from trove.openstack.common import xmlutils
 from trove.openstack.common import log as logging
 from trove.common import cfg
 
@@ -438,14 +442,30 @@ class Controller(object):
                                                                    "none"))
             return matching_schema
 
+    @classmethod
+    def get_validator(cls, schema):
+        """Returns the validator of a schema, built once per controller.
+
+        Validators are kept by schema identity, along with the schema so
+        its id cannot be reused by another one.
+        """
+        validators = cls.__dict__.get('_validators')
+        if validators is None:
+            validators = cls._validators = {}
+        cached = validators.get(id(schema))
+        if cached is None or cached[0] is not schema:
+            cached = (schema, jsonschema.Draft4Validator(schema))
+            validators[id(schema)] = cached
+        return cached[1]
+
     def validate_request(self, action, action_args):
         body = action_args.get('body', {})
         schema = self.get_schema(action, body)
         if schema:
-            validator = jsonschema.Draft4Validator(schema)
-            if not validator.is_valid(body):
-                errors = sorted(validator.iter_errors(body),
-                                key=lambda e: e.path)
+            validator = self.get_validator(schema)
+            errors = sorted(validator.iter_errors(body),
+                            key=lambda e: e.path)
+            if errors:
                 messages = []
                 for error in errors:
                     messages.append(error.message)
@@ -458,6 +478,11 @@ class Controller(object):
                     message="Validation error: %s" % error_msg)
 
     def create_resource(self):
+        # Builds the validators of the action schemas up front; the ones
+        # picked by the request body are built on first use.
+        for schema in self.schemas.values():
+            if isinstance(schema, dict) and 'type' in schema:
+                self.get_validator(schema)
         serializer = TroveResponseSerializer(
             body_serializers={'application/xml': TroveXMLDictSerializer()})
         return Resource(
@@ -501,35 +526,72 @@ class TroveXMLDeserializer(XMLDeserializer):
         return {'body': self._from_xml(re.sub(r'((?<=>)\s+)*\n*(\s+(?=<))*',
                                               '', datastring))}
 
-    def _from_xml_node(self, node, listnames):
-        """Convert a minidom node to a simple Python type.
+    def _from_xml(self, datastring):
+        """Convert the request body to a simple Python type.
 
-           Overridden from openstack deserializer to skip xmlns attributes and
-           remove certain unicode characters
-
-        :param listnames: list of XML node names whose subnodes should
-                          be considered list items.
+           Overridden from openstack deserializer to build the result while
+           the body is parsed instead of walking a minidom document, and to
+           skip xmlns attributes.
 
         """
+        handler = _XMLDictHandler(set(self.metadata.get('plurals', {})))
+        parser = xmlutils.ProtectedExpatParser()
+        parser.setContentHandler(handler)
+        try:
+            parser.feed(datastring)
+            parser.close()
+        except sax.SAXParseException:
+            raise openstack_exception.MalformedRequestBody(
+                reason=_("cannot understand XML"))
+        return handler.result
+
 
-        if len(node.childNodes) == 1 and node.childNodes[0].nodeType == 3:
-            return node.childNodes[0].nodeValue
-        elif node.nodeName in listnames:
-            return [self._from_xml_node(n, listnames) for n in node.childNodes]
+class _XMLDictHandler(sax.handler.ContentHandler):
+    """Builds the dictionary for an XML document as it is parsed.
+
+    Elements holding only text become strings, elements named in listnames
+    become lists of their children and all others become dictionaries of
+    their attributes and children.
+    """
+
+    def __init__(self, listnames):
+        sax.handler.ContentHandler.__init__(self)
+        self.listnames = listnames
+        self.result = None
+        self._stack = []
+
+    def startElement(self, name, attrs):
+        self._stack.append((name, attrs.items(), [], []))
+
+    def characters(self, content):
+        self._stack[-1][3].append(content)
+
+    def endElement(self, name):
+        name, attrs, children, text = self._stack.pop()
+        if text and not children:
+            value = ''.join(text)
+        elif name in self.listnames:
+            value = [child for child_name, child in children]
         else:
-            result = dict()
-            for attr in node.attributes.keys():
-                if attr == 'xmlns':
-                    continue
-                result[attr] = node.attributes[attr].nodeValue
-            for child in node.childNodes:
-                if child.nodeType != node.TEXT_NODE:
-                    result[child.nodeName] = self._from_xml_node(child,
-                                                                 listnames)
-            return result
+            value = dict((key, attr) for key, attr in attrs
+                         if key != 'xmlns')
+            value.update(children)
+        if self._stack:
+            self._stack[-1][2].append((name, value))
+        else:
+            self.result = {name: value}
 
 
 class TroveXMLDictSerializer(openstack_wsgi.XMLDictSerializer):
+    """Writes the XML for a response body without building a DOM.
+
+    The output is the same as that of toprettyxml on the minidom document
+    the openstack serializer would build: sorted attributes, four spaces of
+    indentation and text kept on the line of its element.
+    """
+
+    indent = '    '
+
     def __init__(self, metadata=None, xmlns=None):
         super(TroveXMLDictSerializer, self).__init__(metadata, XMLNS)
 
@@ -552,6 +614,18 @@ class TroveXMLDictSerializer(openstack_wsgi.XMLDictSerializer):
             msg = "Missing root key in dict: %s" % data
             LOG.error(msg)
             raise RuntimeError(msg)
+        if hasattr(data[root_key], "to_xml"):
+            return self._dom_default(data, root_key, has_links)
+        links = [('links', data['links'])] if has_links else []
+        out = _XMLWriter()
+        attrs = {}
+        if self.xmlns is not None:
+            attrs['xmlns'] = self.xmlns
+        self._write_xml_node(out, self.metadata, root_key, data[root_key],
+                             '', attrs, links)
+        return out.getvalue().encode('UTF-8')
+
+    def _dom_default(self, data, root_key, has_links):
         doc = minidom.Document()
         node = self._to_xml_node(doc, self.metadata, root_key, data[root_key])
         if has_links:
@@ -571,6 +645,115 @@ class TroveXMLDictSerializer(openstack_wsgi.XMLDictSerializer):
             nodename,
             data)
 
+    def _write_xml_node(self, out, metadata, nodename, data, indent,
+                        root_attrs=None, extra=()):
+        """Write an element the way _to_xml_node would build it."""
+        if hasattr(data, "to_xml"):
+            data.to_xml().writexml(out, indent, self.indent, '\n')
+            return
+        attrs = {}
+        children = []
+        leaves = []
+        text = None
+        xmlns = metadata.get('xmlns', None)
+        if xmlns:
+            attrs['xmlns'] = xmlns
+
+        if type(data) is list:
+            collections = metadata.get('list_collections', {})
+            if nodename in collections:
+                collection = collections[nodename]
+                for item in data:
+                    leaves.append(({collection['item_key']: str(item)}, None))
+                leaf_name = collection['item_name']
+            else:
+                singular = metadata.get('plurals', {}).get(nodename, None)
+                if singular is None:
+                    if nodename.endswith('s'):
+                        singular = nodename[:-1]
+                    else:
+                        singular = 'item'
+                children = [(singular, item) for item in data]
+        elif type(data) is dict:
+            collections = metadata.get('dict_collections', {})
+            if nodename in collections:
+                collection = collections[nodename]
+                for k, v in data.items():
+                    leaves.append(({collection['item_key']: str(k)}, str(v)))
+                leaf_name = collection['item_name']
+            else:
+                node_attrs = CUSTOM_SERIALIZER_METADATA.get(nodename, {})
+                for k, v in data.items():
+                    if k in node_attrs:
+                        attrs[k] = str(v)
+                    else:
+                        children.append((k, v))
+        else:
+            text = str(data)
+        attrs.update(root_attrs or {})
+        children.extend(extra)
+
+        if text is not None or not (children or leaves):
+            self._write_leaf(out, indent, nodename, attrs, text)
+            return
+        self._write_start(out, indent, nodename, attrs)
+        out.write('>\n')
+        child_indent = indent + self.indent
+        for leaf_attrs, leaf_text in leaves:
+            self._write_leaf(out, child_indent, leaf_name, leaf_attrs,
+                             leaf_text)
+        for name, child in children:
+            self._write_xml_node(out, metadata, name, child, child_indent)
+        out.write('%s</%s>\n' % (indent, nodename))
+
+    def _write_start(self, out, indent, nodename, attrs):
+        out.write(indent + '<' + nodename)
+        for name in sorted(attrs):
+            out.write(' %s="%s"' % (name, _escape_xml(attrs[name])))
+
+    def _write_leaf(self, out, indent, nodename, attrs, text):
+        """Write an element holding at most a text node."""
+        self._write_start(out, indent, nodename, attrs)
+        if text is None:
+            out.write('/>\n')
+        elif _MINIDOM_INLINES_TEXT:
+            out.write('>%s</%s>\n' % (_escape_xml(text), nodename))
+        else:
+            out.write('>\n%s%s%s\n%s</%s>\n' % (indent, self.indent,
+                                                _escape_xml(text), indent,
+                                                nodename))
+
+
+def _minidom_inlines_text():
+    """Whether toprettyxml writes a lone text node on its element's line.
+
+    Python 2.7.3 and later do; older versions write the text indented on
+    a line of its own.
+    """
+    doc = minidom.Document()
+    node = doc.createElement('a')
+    node.appendChild(doc.createTextNode('b'))
+    return node.toprettyxml(indent='', newl='\n') == '<a>b</a>\n'
+
+
+_MINIDOM_INLINES_TEXT = _minidom_inlines_text()
+
+
+def _escape_xml(data):
+    return data.replace("&", "&amp;").replace("<", "&lt;").replace(
+        "\"", "&quot;").replace(">", "&gt;")
+
+
+class _XMLWriter(object):
+    """Collects the written parts of a document and joins them once."""
+
+    def __init__(self):
+        self._parts = []
+        self.write = self._parts.append
+
+    def getvalue(self):
+        return ''.join(self._parts)
+
 
 class TroveResponseSerializer(openstack_wsgi.ResponseSerializer):
     def serialize_body(self, response, data, content_type, action):
@@ -671,8 +854,21 @@ class Fault(webob.exc.HTTPException):
 class ContextMiddleware(openstack_wsgi.Middleware):
     def __init__(self, application):
         self.admin_roles = CONF.admin_roles
+        self.connection_per_request = CONF.sql_connection_per_request
         super(ContextMiddleware, self).__init__(application)
 
+    @webob.dec.wsgify
+    def __call__(self, req):
+        response = self.process_request(req)
+        if response:
+            return response
+        if not self.connection_per_request:
+            response = req.get_response(self.application)
+        else:
+            with get_db_api().request_scope():
+                response = req.get_response(self.application)
+        return self.process_response(response)
+
     def _extract_limits(self, params):
         return dict([(key, params[key]) for key in params.keys()
                      if key in ["limit", "marker"]])
@@ -0,0 +1,47 @@
+# Copyright 2012 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+"""
+Routes the heartbeats and statuses of the guest agents to the conductor.
+"""
+
+from trove.common import cfg
+from trove.common.manager import ManagerAPI
+from trove.openstack.common import log as logging
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+class API(ManagerAPI):
+    """API for reporting to the conductor."""
+
+    def _fake_cast(self, method_name, **kwargs):
+        from trove.conductor.manager import Manager
+        manager = Manager()
+        getattr(manager, method_name)(self.context, **kwargs)
+        manager.flush(self.context)
+
+    def _get_routing_key(self):
+        """Create the routing key for the conductor"""
+        return CONF.conductor_queue
+
+    def heartbeat(self, instance_id, status_code=None):
+        LOG.debug("Sending heartbeat for instance %s to the conductor."
+                  % instance_id)
+        self._cast("heartbeat", instance_id=instance_id,
+                   status_code=status_code)
@@ -0,0 +1,100 @@
+# Copyright 2012 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+"""
+Buffers the heartbeats and statuses sent by the guest agents and writes
+them to the database in batches.
+"""
+
+from trove.common import cfg
+from trove.common.context import TroveContext
+from trove.guestagent.models import AgentHeartBeat
+from trove.instance.models import InstanceServiceStatus
+from trove.instance.models import ServiceStatus
+from trove.openstack.common import log as logging
+from trove.openstack.common import periodic_task
+from trove.openstack.common.gettextutils import _
+from trove.taskmanager import api as task_api
+from trove.taskmanager import events
+
+LOG = logging.getLogger(__name__)
+RPC_API_VERSION = "1.0"
+CONF = cfg.CONF
+
+
+class Manager(periodic_task.PeriodicTasks):
+    """Coalesces guest reports into a few bulk writes per flush.
+
+    Every instance gets at most one heartbeat refresh and one status
+    write per flush, no matter how often its agent reported since the
+    previous one; only the latest status is kept.
+
+    """
+
+    def __init__(self):
+        super(Manager, self).__init__()
+        self._heartbeats = set()
+        self._statuses = {}
+
+    def heartbeat(self, context, instance_id, status_code=None):
+        self._heartbeats.add(instance_id)
+        if status_code is not None:
+            try:
+                self._statuses[instance_id] = ServiceStatus.from_code(
+                    status_code)
+            except ValueError as error:
+                LOG.error(_("Ignoring status of instance %(instance_id)s: "
+                            "%(error)s")
+                          % {'instance_id': instance_id, 'error': error})
+
+    @periodic_task.periodic_task(
+        ticks_between_runs=CONF.conductor_flush_ticks)
+    def flush(self, context):
+        """Writes the heartbeats and statuses received since the last flush.
+
+        The buffers are swapped out before touching the database so
+        reports arriving meanwhile go to the next flush. If the writes
+        fail the reports are put back, unless newer ones came in.
+
+        """
+        heartbeats, self._heartbeats = self._heartbeats, set()
+        statuses, self._statuses = self._statuses, {}
+        if not heartbeats:
+            return
+        try:
+            AgentHeartBeat.touch_all(heartbeats)
+            changed = InstanceServiceStatus.update_all_statuses(statuses)
+        except Exception:
+            LOG.exception(_("Failed to flush %s heartbeats, will retry.")
+                          % len(heartbeats))
+            self._heartbeats.update(heartbeats)
+            for instance_id, status in statuses.items():
+                self._statuses.setdefault(instance_id, status)
+            return
+        LOG.debug(_("Flushed %(count)s heartbeats, %(changed)s status "
+                    "changes.") % {'count': len(heartbeats),
+                                   'changed': changed})
+        if changed and events.GUEST in CONF.task_event_sources:
+            self._notify_taskmanagers(statuses.keys())
+
+    @staticmethod
+    def _notify_taskmanagers(instance_ids):
+        """Wakes up the tasks waiting on the instances reported on."""
+        try:
+            task_api.API(TroveContext()).instance_status_changed(instance_ids)
+        except Exception:
+            LOG.exception(_("Failed to notify the task managers; they will "
+                            "notice the changes when they next poll."))
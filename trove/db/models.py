@@ -29,15 +29,23 @@ class DatabaseModelBase(models.ModelBase):
 
     @classmethod
     def create(cls, **values):
+        instance = cls.new(**values).save()
+        if not instance.is_valid():
+            raise exception.InvalidModelError(errors=instance.errors)
+        return instance
+
+    @classmethod
+    def new(cls, **values):
+        """Builds a model the way create() does, without saving it."""
         if 'id' not in values:
             values['id'] = utils.generate_uuid()
         if hasattr(cls, 'deleted') and 'deleted' not in values:
             values['deleted'] = False
         values['created'] = utils.utcnow()
-        instance = cls(**values).save()
-        if not instance.is_valid():
-            raise exception.InvalidModelError(errors=instance.errors)
-        return instance
+        model = cls(**values)
+        if 'updated' not in values:
+            model['updated'] = values['created']
+        return model
 
     @property
     def db_api(self):
@@ -54,6 +62,10 @@ class DatabaseModelBase(models.ModelBase):
     def save(self):
         if not self.is_valid():
             raise exception.InvalidModelError(errors=self.errors)
+        if self.db_api.changes(self) == {}:
+            LOG.debug(_("Not saving unchanged %s: %s") %
+                      (self.__class__.__name__, self.id))
+            return self
         self['updated'] = utils.utcnow()
         LOG.debug(_("Saving %s: %s") %
                   (self.__class__.__name__, self.__dict__))
@@ -15,10 +15,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import types
+
 import sqlalchemy.exc
 from sqlalchemy import and_
 from sqlalchemy import or_
+from sqlalchemy import orm
 from sqlalchemy.orm import aliased
+from sqlalchemy.orm import attributes as orm_attributes
+from sqlalchemy.orm import exc as orm_exc
 
 from trove.common import exception
 from trove.common import utils
@@ -51,6 +57,11 @@ def find_by(model, **kwargs):
 
 def save(model):
     try:
+        changed = changes(model)
+        if changed is not None and orm.object_session(model) is None:
+            # Loaded or saved before: only the changes need writing.
+            if not changed or _update_changes(model, changed):
+                return model
         db_session = session.get_session()
         model = db_session.merge(model)
         db_session.flush()
@@ -60,6 +71,86 @@ def save(model):
                                           error=str(error.orig))
 
 
+def changes(model):
+    """Returns the columns changed since the model was loaded or saved.
+
+    Returns None when the model has not been saved yet.
+    """
+    try:
+        state = orm_attributes.instance_state(model)
+    except orm_exc.NO_STATE:
+        return None
+    if state.key is None:
+        return None
+    changed = {}
+    for key in state.committed_state:
+        history = orm_attributes.get_history(
+            model, key, passive=orm_attributes.PASSIVE_NO_INITIALIZE)
+        if history.added:
+            changed[key] = history.added[0]
+    return changed
+
+
+def _update_changes(model, changed):
+    """Updates the changed columns of the model's row by primary key.
+
+    Returns False if the row is gone.
+    """
+    mapper = orm.object_mapper(model)
+    key = mapper.primary_key_from_instance(model)
+    query = session.get_session().query(mapper).filter(
+        and_(*[column == value
+               for column, value in zip(mapper.primary_key, key)]))
+    if not query.update(changed, synchronize_session=False):
+        return False
+    state = orm_attributes.instance_state(model)
+    state.commit_all(state.dict)
+    return True
+
+
+def save_all(models):
+    try:
+        db_session = session.get_session()
+        with db_session.begin():
+            for model in models:
+                db_session.add(model)
+        return models
+    except sqlalchemy.exc.IntegrityError as error:
+        model_name = models[0].__class__.__name__
+        raise exception.DBConstraintError(model_name=model_name,
+                                          error=str(error.orig))
+
+
+@contextlib.contextmanager
+def transaction():
+    """Yields a session whose work is committed or rolled back at once."""
+    db_session = session.get_session()
+    with db_session.begin():
+        yield db_session
+
+
+@contextlib.contextmanager
+def request_scope():
+    """Shares one connection between the calls made in it."""
+    begun = session.begin_request_scope()
+    try:
+        yield
+    finally:
+        if begun:
+            session.end_request_scope()
+
+
+def find_all_for_update(db_session, model, **conditions):
+    """Loads and locks the matching rows until the transaction ends."""
+    query = _filter(db_session.query(model), model, conditions)
+    return query.with_lockmode('update').all()
+
+
+def update_all_in(db_session, model, conditions, values):
+    query = _filter(db_session.query(model), model, conditions)
+    query.update(values, synchronize_session=False)
+
+
 def delete(model):
     db_session = session.get_session()
     model = db_session.merge(model)
@@ -127,6 +218,17 @@ def _query_by(cls, **conditions):
     return query
 
 
+def _filter(query, model, conditions):
+    """Like filter_by, but a list of values matches any of them."""
+    for key, value in conditions.iteritems():
+        column = getattr(model, key)
+        if isinstance(value, (types.ListType, tuple, set)):
+            query = query.filter(column.in_(value))
+        else:
+            query = query.filter(column == value)
+    return query
+
+
 def _limits(query_func, model, conditions, limit, marker, marker_column=None):
     query = query_func(model, **conditions)
     marker_column = marker_column or model.id
@@ -0,0 +1,46 @@
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy.schema import Index
+from sqlalchemy.schema import MetaData
+
+from trove.db.sqlalchemy.migrate_repo.schema import Table
+
+
+def _indexes(backups):
+    # Serve the backup lists, which filter on the tenant or the instance and
+    # page through the live backups by creation time.
+    return [Index('backups_tenant_id_deleted_created',
+                  backups.c.tenant_id, backups.c.deleted, backups.c.created),
+            Index('backups_instance_id_deleted_created',
+                  backups.c.instance_id, backups.c.deleted,
+                  backups.c.created)]
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    backups = Table('backups', meta, autoload=True)
+    for index in _indexes(backups):
+        index.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    backups = Table('backups', meta, autoload=True)
+    for index in _indexes(backups):
+        index.drop(migrate_engine)
@@ -16,8 +16,14 @@
 #    under the License.
 
 import contextlib
+import os
+
+from eventlet import corolocal
 from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import exc
 from sqlalchemy import MetaData
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.orm import sessionmaker
 
 from trove.common import cfg
@@ -27,6 +33,8 @@ from trove.db.sqlalchemy import mappers
 
 _ENGINE = None
 _MAKER = None
+# The connection shared by the calls made while handling a request.
+_REQUEST = corolocal.local()
 
 
 LOG = logging.getLogger(__name__)
@@ -70,12 +78,84 @@ def _create_engine(options):
         "pool_recycle": CONF.sql_idle_timeout,
         "echo": CONF.sql_query_log
     }
+    url = make_url(options['sql_connection'])
+    if not url.drivername.startswith('sqlite'):
+        # SQLite uses a pool without these settings.
+        if CONF.sql_max_pool_size is not None:
+            engine_args['pool_size'] = CONF.sql_max_pool_size
+        if CONF.sql_max_overflow is not None:
+            engine_args['max_overflow'] = CONF.sql_max_overflow
+        if CONF.sql_pool_timeout is not None:
+            engine_args['pool_timeout'] = CONF.sql_pool_timeout
     LOG.info(_("Creating SQLAlchemy engine with args: %s") % engine_args)
-    return create_engine(options['sql_connection'], **engine_args)
+    engine = create_engine(url, **engine_args)
+    if engine.name == 'sqlite':
+        _lock_sqlite_transactions(engine)
+    _check_connections(engine)
+    return engine
+
+
+def _check_connections(engine):
+    """Keeps pooled connections from being used after a fork or drop.
+
+    The API forks its workers after the engine is created, so a worker
+    could be handed a connection opened by its parent. Those are thrown
+    away, as are connections which fail a ping when sql_pool_pre_ping
+    is set; the pool then opens a new one.
+    """
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        if connection_record.info['pid'] != os.getpid():
+            connection_record.connection = None
+            connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                "Connection belongs to process %s."
+                % connection_record.info['pid'])
+        if CONF.sql_pool_pre_ping:
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            except Exception as e:
+                raise exc.DisconnectionError(str(e))
+            finally:
+                cursor.close()
+
+
+def _lock_sqlite_transactions(engine):
+    """Makes SQLite transactions take the write lock when they begin.
+
+    SQLite ignores SELECT ... FOR UPDATE and pysqlite only begins a
+    transaction at the first write, so two transactions could read the
+    same rows and both update them. Beginning them with BEGIN IMMEDIATE
+    makes them wait for each other instead.
+    """
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        # Leaves beginning transactions to the listener below.
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(connection):
+        connection.execute("BEGIN IMMEDIATE")
 
 
 def get_session(autocommit=True, expire_on_commit=False):
-    """Helper method to grab session."""
+    """Helper method to grab session.
+
+    Within a request scope the session uses the connection of the request.
+    """
+    maker = _get_maker(autocommit, expire_on_commit)
+    connection = getattr(_REQUEST, 'connection', None)
+    if connection is not None:
+        return maker(bind=connection)
+    return maker()
+
+
+def _get_maker(autocommit=True, expire_on_commit=False):
     global _MAKER, _ENGINE
     if not _MAKER:
         if not _ENGINE:
@@ -85,7 +165,29 @@ def get_session(autocommit=True, expire_on_commit=False):
         _MAKER = sessionmaker(bind=_ENGINE,
                               autocommit=autocommit,
                               expire_on_commit=expire_on_commit)
-    return _MAKER()
+    return _MAKER
+
+
+def begin_request_scope():
+    """Makes the sessions use one connection until end_request_scope.
+
+    Applies to the sessions of the current green thread. They are still
+    separate sessions, so changes made to a model which is not saved do
+    not get written when another one is. Returns False, and changes
+    nothing, if a scope has already begun.
+    """
+    if getattr(_REQUEST, 'connection', None) is not None:
+        return False
+    _get_maker()
+    _REQUEST.connection = _ENGINE.connect()
+    return True
+
+
+def end_request_scope():
+    connection = getattr(_REQUEST, 'connection', None)
+    if connection is not None:
+        _REQUEST.connection = None
+        connection.close()
 
 
 def raw_query(model, autocommit=True, expire_on_commit=False):
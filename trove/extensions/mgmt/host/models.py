@@ -19,10 +19,13 @@
 Model classes that extend the instances functionality for MySQL instances.
 """
 
+import eventlet
+
 from trove.openstack.common import log as logging
 
 from trove import db
 
+from trove.common import cfg
 from trove.common import exception
 from trove.common import utils
 from trove.instance.models import DBInstance
@@ -34,6 +37,7 @@ from trove.common.remote import create_nova_client
 from novaclient import exceptions as nova_exceptions
 
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -66,37 +70,44 @@ class DetailedHost(object):
         for instance in self.instances:
             instance['server_id'] = instance['uuid']
             del instance['uuid']
-            try:
-                db_info = DBInstance.find_by(
-                    compute_instance_id=instance['server_id'])
+        found = DBInstance.find_all_by_compute_ids(
+            [instance['server_id'] for instance in self.instances])
+        for instance in self.instances:
+            db_info, status = found.get(instance['server_id'], (None, None))
+            if db_info is not None:
                 instance['id'] = db_info.id
                 instance['tenant_id'] = db_info.tenant_id
-                status = InstanceServiceStatus.find_by(
-                    instance_id=db_info.id)
-                instance_info = SimpleInstance(None, db_info, status)
-                instance['status'] = instance_info.status
-            except exception.TroveError as re:
-                LOG.error(re)
+            if status is None:
                 LOG.error("Compute Instance ID found with no associated RD "
                           "instance: %s" % instance['server_id'])
                 instance['id'] = None
+                continue
+            instance_info = SimpleInstance(None, db_info, status)
+            instance['status'] = instance_info.status
 
     def update_all(self, context):
         num_i = len(self.instances)
         LOG.debug("Host %s has %s instances to update" % (self.name, num_i))
-        failed_instances = []
-        for instance in self.instances:
-            client = create_guest_client(context, instance['id'])
-            try:
-                client.update_guest()
-            except exception.TroveError as re:
-                LOG.error(re)
-                LOG.error("Unable to update instance: %s" % instance['id'])
-                failed_instances.append(instance['id'])
+        pool = eventlet.GreenPool(CONF.host_update_workers)
+        updated = pool.imap(lambda instance: self._update_guest(context,
+                                                                instance),
+                            self.instances)
+        failed_instances = [instance['id'] for instance, ok
+                            in zip(self.instances, updated) if not ok]
         if len(failed_instances) > 0:
             msg = "Failed to update instances: %s" % failed_instances
             raise exception.UpdateGuestError(msg)
 
+    def _update_guest(self, context, instance):
+        client = create_guest_client(context, instance['id'])
+        try:
+            client.update_guest()
+            return True
+        except exception.TroveError as re:
+            LOG.error(re)
+            LOG.error("Unable to update instance: %s" % instance['id'])
+            return False
+
     @staticmethod
     def load(context, name):
         client = create_nova_client(context)
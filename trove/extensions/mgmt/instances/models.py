@@ -16,6 +16,7 @@ import datetime
 from trove.common import cfg
 from trove.common import remote
 from trove.common import utils
+from trove.openstack.common import jsonutils
 from trove.openstack.common import log as logging
 from trove.openstack.common.notifier import api as notifier
 from trove.instance import models as imodels
@@ -88,6 +89,12 @@ class SimpleMgmtInstance(imodels.BaseInstance):
     def task_description(self):
         return self.db_info.task_description
 
+    @property
+    def build_timings(self):
+        """Seconds each step of the build took, by step name."""
+        timings = getattr(self.db_info, 'build_timings', None)
+        return jsonutils.loads(timings) if timings else None
+
 
 class DetailedMgmtInstance(SimpleMgmtInstance):
     def __init__(self, *args, **kwargs):
@@ -63,6 +63,7 @@ class MgmtInstanceDetailView(MgmtInstanceView):
 
     def data(self):
         result = super(MgmtInstanceDetailView, self).data()
+        result['instance']['build_timings'] = self.instance.build_timings
         if self.instance.server is not None:
             server = self.instance.server
             result['instance']['server'].update(
@@ -150,14 +151,21 @@ class DiagnosticsView(object):
         self.diagnostics = diagnostics
 
     def data(self):
-        return {
-            'diagnostics': {
-                'version': self.diagnostics['version'],
-                'threads': self.diagnostics['threads'],
-                'fdSize': self.diagnostics['fd_size'],
-                'vmSize': self.diagnostics['vm_size'],
-                'vmPeak': self.diagnostics['vm_peak'],
-                'vmRss': self.diagnostics['vm_rss'],
-                'vmHwm': self.diagnostics['vm_hwm'],
-            }
+        data = {
+            'version': self.diagnostics['version'],
+            'threads': self.diagnostics['threads'],
+            'fdSize': self.diagnostics['fd_size'],
+            'vmSize': self.diagnostics['vm_size'],
+            'vmPeak': self.diagnostics['vm_peak'],
+            'vmRss': self.diagnostics['vm_rss'],
+            'vmHwm': self.diagnostics['vm_hwm'],
         }
+        if 'status_writes' in self.diagnostics:
+            data['statusWrites'] = self.diagnostics['status_writes']
+            data['statusWritesSkipped'] = \
+                self.diagnostics['status_writes_skipped']
+            data['statusProbeLatency'] = \
+                self.diagnostics.get('status_probe_latency')
+            data['statusProbeFallbacks'] = \
+                self.diagnostics.get('status_probe_fallbacks')
+        return {'diagnostics': data}
@@ -65,4 +65,5 @@ class QuotaController(wsgi.Controller):
 
             quotas[resource] = quota
 
+        quota_engine.invalidate_quotas(id)
         return wsgi.Result(views.QuotaView(quotas).data(), 200)
@@ -203,6 +203,13 @@ class API(proxy.RpcProxy):
         LOG.debug(_("Check diagnostics on Instance %s"), self.id)
         return self._call("get_diagnostics", AGENT_LOW_TIMEOUT)
 
+    def get_restore_progress(self):
+        """Make a synchronous call to get the progress of the restore the
+           guest runs while it is prepared from a backup
+        """
+        LOG.debug(_("Check restore progress on Instance %s"), self.id)
+        return self._call("get_restore_progress", AGENT_LOW_TIMEOUT)
+
     def prepare(self, memory_mb, databases, users,
                 device_path='/dev/vdb', mount_point='/mnt/volume',
                 backup_id=None):
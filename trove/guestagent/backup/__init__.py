@@ -25,3 +25,14 @@ def restore(context, backup_id, restore_location):
     :param backup_id:   the id of the persisted backup object
     """
     return AGENT.execute_restore(context, backup_id, restore_location)
+
+
+def restore_progress():
+    """
+    Returns the progress of the last restore run by this agent, a dict of
+    bytes restored, total bytes when known, throughput and ETA, or None if
+    nothing was restored.
+    """
+    if AGENT.restore_progress is None:
+        return None
+    return AGENT.restore_progress.stats()
@@ -15,6 +15,8 @@
 #
 
 import logging
+import time
+
 from trove.backup.models import DBBackup
 from trove.backup.models import BackupState
 from trove.common import cfg, utils
@@ -31,11 +33,65 @@ CONF = cfg.CONF
 
 RUNNER = get_backup_strategy(CONF.backup_strategy,
                              CONF.backup_namespace)
+INCREMENTAL_RUNNER = get_backup_strategy(CONF.backup_incremental_strategy,
+                                         CONF.backup_namespace)
 BACKUP_CONTAINER = CONF.backup_swift_container
+# Backup sizes are recorded in gigabytes.
+BYTES_PER_GB = 1024 ** 3
+
+
+class RestoreProgress(object):
+    """Tracks how much of a backup has been restored and how fast."""
+
+    # Seconds between progress messages in the log.
+    LOG_INTERVAL = 60
+
+    def __init__(self, backup_id, total_bytes=None):
+        self.backup_id = backup_id
+        self.total_bytes = total_bytes
+        self.bytes_restored = 0
+        self.started = time.time()
+        self.finished = None
+        self.last_logged = self.started
+
+    def update(self, length):
+        self.bytes_restored += length
+        now = time.time()
+        if now - self.last_logged >= self.LOG_INTERVAL:
+            self.last_logged = now
+            LOG.info("Restore of backup %(backup_id)s: %(bytes_restored)s "
+                     "of %(total_bytes)s bytes, %(bytes_per_second)s "
+                     "bytes/s, %(eta_seconds)s seconds left", self.stats())
+
+    def finish(self):
+        self.finished = time.time()
+
+    def stats(self):
+        elapsed = (self.finished or time.time()) - self.started
+        rate = self.bytes_restored / elapsed if elapsed > 0 else 0
+        percent = eta = None
+        if self.total_bytes:
+            percent = min(100.0, 100.0 * self.bytes_restored /
+                          self.total_bytes)
+            if self.finished:
+                eta = 0
+            elif rate:
+                remaining = max(0, self.total_bytes - self.bytes_restored)
+                eta = int(remaining / rate)
+        return {'backup_id': self.backup_id,
+                'bytes_restored': self.bytes_restored,
+                'total_bytes': self.total_bytes,
+                'bytes_per_second': int(rate),
+                'percent': percent,
+                'eta_seconds': eta,
+                'finished': self.finished is not None}
 
 
 class BackupAgent(object):
 
+    def __init__(self):
+        self.restore_progress = None
+
     def _get_restore_runner(self, backup_type):
         """Returns the RestoreRunner associated with this backup type."""
         try:
@@ -44,7 +100,8 @@ class BackupAgent(object):
             raise UnknownBackupType("Unknown Backup type: %s" % backup_type)
         return runner
 
-    def execute_backup(self, context, backup_id, runner=RUNNER):
+    def execute_backup(self, context, backup_id, runner=RUNNER,
+                       incremental_runner=INCREMENTAL_RUNNER):
         LOG.debug("Searching for backup instance %s", backup_id)
         backup = DBBackup.find_by(id=backup_id)
         LOG.info("Setting task state to %s for instance %s",
@@ -63,8 +120,19 @@ class BackupAgent(object):
         backup.save()
 
         try:
-            with runner(filename=backup_id, user=user, password=password)\
-                    as bkup:
+            from_lsn = None
+            if backup.parent_id:
+                parent = DBBackup.find_by(id=backup.parent_id, deleted=False)
+                if parent.to_lsn is None:
+                    raise BackupError("Backup %s has no LSN to start an "
+                                      "incremental backup from." % parent.id)
+                LOG.info("Backup %s is incremental from LSN %s of backup %s",
+                         backup_id, parent.to_lsn, parent.id)
+                runner = incremental_runner
+                from_lsn = parent.to_lsn
+
+            with runner(filename=backup_id, user=user, password=password,
+                        lsn=from_lsn) as bkup:
                 LOG.info("Starting Backup %s", backup_id)
                 success, note, checksum, location = swiftStorage.save(
                     BACKUP_CONTAINER,
@@ -78,6 +146,9 @@ class BackupAgent(object):
             if not success:
                 raise BackupError(backup.note)
 
+            # Read here so a backup whose end LSN is unknown is FAILED.
+            to_lsn = bkup.metadata().get('lsn')
+
         except Exception as e:
             LOG.error(e)
             LOG.error("Error saving %s Backup", backup_id)
@@ -92,6 +163,11 @@ class BackupAgent(object):
             backup.location = location
             backup.note = note
             backup.backup_type = bkup.backup_type
+            backup.size = float(bkup.content_length) / BYTES_PER_GB
+            backup.compression = bkup.compression
+            backup.encryption = bkup.encryption
+            backup.from_lsn = from_lsn
+            backup.to_lsn = to_lsn
             backup.save()
 
     def execute_restore(self, context, backup_id, restore_location):
@@ -104,6 +180,8 @@ class BackupAgent(object):
 
             LOG.debug("Finding backup %s to restore", backup_id)
             backup = DBBackup.find_by(id=backup_id)
+            chain = backup.chain()
+            full_backup = chain[0]
 
             LOG.debug("Getting Restore Runner of type %s", backup.backup_type)
             restore_runner = self._get_restore_runner(backup.backup_type)
@@ -115,14 +193,36 @@ class BackupAgent(object):
 
             LOG.debug("Preparing storage to download stream.")
             download_stream = storage_strategy.load(context,
-                                                    backup.location,
+                                                    full_backup.location,
                                                     restore_runner.is_zipped)
+            kwargs = {}
+            if len(chain) > 1:
+                LOG.info("Restoring incremental backups %s on top of %s",
+                         [b.id for b in chain[1:]], full_backup.id)
+                kwargs['incrementals'] = [
+                    {'restore_stream': storage_strategy.load(
+                        context, incremental.location,
+                        restore_runner.is_zipped),
+                     'compression': incremental.compression,
+                     'encryption': incremental.encryption}
+                    for incremental in chain[1:]]
+
+            total_bytes = None
+            if all(link.size is not None for link in chain):
+                total_bytes = int(sum(link.size for link in chain) *
+                                  BYTES_PER_GB)
+            self.restore_progress = RestoreProgress(backup_id, total_bytes)
 
             with restore_runner(restore_stream=download_stream,
-                                restore_location=restore_location) as runner:
+                                restore_location=restore_location,
+                                compression=full_backup.compression,
+                                encryption=full_backup.encryption,
+                                progress=self.restore_progress,
+                                **kwargs) as runner:
                 LOG.debug("Restoring instance from backup %s to %s",
                           backup_id, restore_location)
                 content_size = runner.restore()
+                self.restore_progress.finish()
                 LOG.info("Restore from backup %s completed successfully to %s",
                          backup_id, restore_location)
                 LOG.info("Restore size: %s", content_size)
@@ -26,6 +26,7 @@ handles RPC calls relating to Platform specific operations.
 """
 
 
+from trove import version
 from trove.common import utils
 from trove.openstack.common import log as logging
 
@@ -55,3 +56,19 @@ class Interrogator(object):
                   'free': int(stats[7]) * int(stats[4])}
         output['used'] = int(output['total']) - int(output['free'])
         return output
+
+    def get_process_stats(self, status_path='/proc/self/status'):
+        """Returns the thread and memory usage of the agent process."""
+        fields = {'FDSize': 'fd_size',
+                  'VmSize': 'vm_size',
+                  'VmPeak': 'vm_peak',
+                  'VmRSS': 'vm_rss',
+                  'VmHWM': 'vm_hwm',
+                  'Threads': 'threads'}
+        output = {'version': version.version_string()}
+        with open(status_path) as status_file:
+            for line in status_file:
+                key, sep, value = line.partition(':')
+                if key in fields:
+                    output[fields[key]] = int(value.split()[0])
+        return output
@@ -140,6 +140,16 @@ class Manager(periodic_task.PeriodicTasks):
         """ Gets the filesystem stats for the path given """
         return dbaas.Interrogator().get_filesystem_volume_stats(fs_path)
 
+    def get_diagnostics(self, context):
+        """Gets the stats of the agent process and its status reports."""
+        diagnostics = dbaas.Interrogator().get_process_stats()
+        diagnostics.update(MySqlAppStatus.get().get_stats())
+        return diagnostics
+
+    def get_restore_progress(self, context):
+        """Gets the progress of the restore from a backup, if any."""
+        return backup.restore_progress()
+
     def create_backup(self, context, backup_id):
         """
         Entry point for initiating a backup for this guest agents db instance.
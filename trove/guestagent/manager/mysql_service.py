@@ -12,6 +12,8 @@ from sqlalchemy.sql.expression import text
 from trove.common import cfg
 from trove.common import utils as utils
 from trove.common import exception
+from trove.common.context import TroveContext
+from trove.conductor import api as conductor_api
 from trove.guestagent import query
 from trove.guestagent.db import models
 from trove.guestagent import pkg
@@ -117,8 +119,14 @@ class MySqlAppStatus(object):
     def __init__(self):
         if self._instance is not None:
             raise RuntimeError("Cannot instantiate twice.")
-        self.status = self._load_status()
+        self._db_status = self._load_status()
+        self.status = self._db_status.status
         self.restart_mode = False
+        self._last_write = None
+        self.status_writes = 0
+        self.status_writes_skipped = 0
+        self.probe_latency = None
+        self.probe_fallbacks = 0
 
     def begin_mysql_install(self):
         """Called right before MySQL is prepared."""
@@ -147,6 +155,11 @@ class MySqlAppStatus(object):
 
     def _get_actual_db_status(self):
         global MYSQLD_ARGS
+        if CONF.mysql_status_probe == 'connection':
+            if self._ping_mysql():
+                LOG.info("Service Status is RUNNING.")
+                return rd_models.ServiceStatuses.RUNNING
+            self.probe_fallbacks += 1
         try:
             out, err = utils.execute_with_timeout(
                 "/usr/bin/mysqladmin",
@@ -175,6 +188,24 @@ class MySqlAppStatus(object):
                     LOG.info("Service Status is SHUTDOWN.")
                     return rd_models.ServiceStatuses.SHUTDOWN
 
+    def _ping_mysql(self):
+        """Pings MySQL over a pooled connection to its local socket.
+
+        Returns False if no connection could be made, in which case the
+        caller falls back to checking the mysqld process.
+        """
+        start = time.time()
+        try:
+            with LocalSqlClient(get_engine(), use_flush=False) as client:
+                client.execute(text("SELECT 1"))
+            return True
+        except (exc.SQLAlchemyError, RuntimeError,
+                exception.ProcessExecutionError) as e:
+            LOG.info("Could not ping MySQL over its socket: %s" % e)
+            return False
+        finally:
+            self.probe_latency = time.time() - start
+
     @property
     def is_mysql_installed(self):
         """
@@ -202,12 +233,52 @@ class MySqlAppStatus(object):
         return rd_models.InstanceServiceStatus.find_by(instance_id=inst_id)
 
     def set_status(self, status):
-        """Changes the status of the MySQL app in the database."""
-        db_status = self._load_status()
-        db_status.set_status(status)
-        db_status.save()
+        """Changes the status of the MySQL app in the database.
+
+        The taskmanager also writes the status, setting it to PAUSED and
+        waiting for the guest to report the real one, so the stored status
+        is read back first. The write is only skipped when the row already
+        holds the status and was written less than status_refresh_interval
+        seconds ago.
+
+        Through the conductor the status is always reported; the conductor
+        leaves rows which already hold it untouched.
+        """
+        if CONF.guest_use_conductor:
+            self._send_heartbeat(status)
+            self.status_writes += 1
+            self.status = status
+            return
+        self._db_status = self._load_status()
+        if (self._db_status.status == status and
+                self._last_write is not None and
+                time.time() - self._last_write <
+                CONF.status_refresh_interval):
+            self.status_writes_skipped += 1
+            LOG.debug("Status is still %s, skipping the write." % status)
+            self.status = status
+            return
+        self._db_status.set_status(status)
+        # Changes even when the status does not, so a refresh still writes.
+        self._db_status['updated_at'] = utils.utcnow()
+        self._db_status = self._db_status.save()
+        self._last_write = time.time()
+        self.status_writes += 1
         self.status = status
 
+    def get_stats(self):
+        return {'status_writes': self.status_writes,
+                'status_writes_skipped': self.status_writes_skipped,
+                'status_probe_latency': self.probe_latency,
+                'status_probe_fallbacks': self.probe_fallbacks}
+
+    @staticmethod
+    def _send_heartbeat(status=None):
+        """Reports to the conductor, which writes the database in batches."""
+        status_code = status.code if status is not None else None
+        conductor_api.API(TroveContext()).heartbeat(CONF.guest_id,
+                                                    status_code=status_code)
+
     def update(self):
         """Find and report status of MySQL on this machine.
 
@@ -221,6 +292,8 @@ class MySqlAppStatus(object):
             LOG.info("MySQL is not installed or is in restart mode, so for "
                      "now we'll skip determining the status of MySQL on this "
                      "box.")
+            if CONF.guest_use_conductor:
+                self._send_heartbeat()
 
     def wait_for_real_status_to_change_to(self, status, max_time,
                                           update_db=False):
@@ -59,6 +59,38 @@ class AgentHeartBeat(dbmodels.DatabaseModelBase):
                   (self.__class__.__name__, self.__dict__))
         return get_db_api().save(self)
 
+    # Keeps IN clauses below the bound variable limits of the backends.
+    MAX_IDS_PER_QUERY = 500
+
+    @classmethod
+    def touch_all(cls, instance_ids):
+        """Refreshes the heartbeats of many agents at once.
+
+        Existing heartbeats are updated with one UPDATE per
+        MAX_IDS_PER_QUERY instances; only when some of them are missing
+        are the rows looked up and the missing ones inserted together.
+
+        """
+        instance_ids = list(instance_ids)
+        now = utils.utcnow()
+        missing = []
+        for start in range(0, len(instance_ids), cls.MAX_IDS_PER_QUERY):
+            chunk = instance_ids[start:start + cls.MAX_IDS_PER_QUERY]
+            query = cls.query().filter(cls.instance_id.in_(chunk))
+            updated = query.update({'updated_at': now},
+                                   synchronize_session=False)
+            if updated < len(chunk):
+                found = set(row.instance_id for row in query)
+                missing.extend(instance_id for instance_id in chunk
+                               if instance_id not in found)
+        if missing:
+            get_db_api().save_all([cls(id=utils.generate_uuid(),
+                                       instance_id=instance_id,
+                                       updated_at=now)
+                                   for instance_id in missing])
+        LOG.debug(_("Refreshed %(count)s heartbeats, %(new)s of them new.")
+                  % {'count': len(instance_ids), 'new': len(missing)})
+
     @staticmethod
     def is_active(agent):
         return (datetime.now() - agent.updated_at <
@@ -17,6 +17,7 @@
 import hashlib
 
 from trove.guestagent.strategy import Strategy
+from trove.guestagent.strategies import stages
 from trove.openstack.common import log as logging
 from trove.common import cfg, utils
 from eventlet.green import subprocess
@@ -32,6 +33,7 @@ BACKUP_CONTAINER = CONF.backup_swift_container
 BACKUP_USE_GZIP = CONF.backup_use_gzip_compression
 BACKUP_USE_OPENSSL = CONF.backup_use_openssl_encryption
 BACKUP_ENCRYPT_KEY = CONF.backup_aes_cbc_key
+BACKUP_STREAM_STAGES = CONF.backup_stream_stages
 
 LOG = logging.getLogger(__name__)
 
@@ -54,6 +56,7 @@ class BackupRunner(Strategy):
     is_zipped = BACKUP_USE_GZIP
     is_encrypted = BACKUP_USE_OPENSSL
     encrypt_key = BACKUP_ENCRYPT_KEY
+    use_stages = BACKUP_STREAM_STAGES
 
     def __init__(self, filename, **kwargs):
         self.filename = filename
@@ -70,6 +73,11 @@ class BackupRunner(Strategy):
         self.end_of_segment = False
         self.checksum = hashlib.md5()
         self.schecksum = hashlib.md5()
+        self.stages = None
+        if self.use_stages:
+            self.stages = stages.encoder(self.compression, self.encryption,
+                                         self.encrypt_key)
+        self.stages_flushed = False
         self.command = self.cmd % kwargs
         super(BackupRunner, self).__init__()
 
@@ -103,6 +111,14 @@ class BackupRunner(Strategy):
 
         return True
 
+    def metadata(self):
+        """Subclasses may overwrite this to describe the finished backup.
+
+        An 'lsn' key holds the log sequence number the backup ends at,
+        which incremental backups built on this one start from.
+        """
+        return {}
+
     @property
     def segment(self):
         return '%s_%08d' % (self.filename, self.file_number)
@@ -116,8 +132,20 @@ class BackupRunner(Strategy):
     def prefix(self):
         return '%s/%s_' % (self.container, self.filename)
 
+    @property
+    def compression(self):
+        """The codec compressing the backup, recorded for restores."""
+        return stages.GZIP if self.is_zipped else stages.NONE
+
+    @property
+    def encryption(self):
+        """The codec encrypting the backup, recorded for restores."""
+        return stages.AES_256_CBC if self.is_encrypted else stages.NONE
+
     @property
     def zip_cmd(self):
+        if self.use_stages:
+            return ''
         return ' | gzip' if self.is_zipped else ''
 
     @property
@@ -126,6 +154,8 @@ class BackupRunner(Strategy):
 
     @property
     def encrypt_cmd(self):
+        if self.use_stages:
+            return ''
         return (' | openssl enc -aes-256-cbc -salt -pass pass:%s' %
                 self.encrypt_key) if self.is_encrypted else ''
 
@@ -146,7 +176,7 @@ class BackupRunner(Strategy):
             self.end_of_segment = True
             return ''
 
-        chunk = self.process.stdout.read(CHUNK_SIZE)
+        chunk = self._read_output()
         if not chunk:
             self.end_of_file = True
             return ''
@@ -156,3 +186,19 @@ class BackupRunner(Strategy):
         self.content_length += len(chunk)
         self.segment_length += len(chunk)
         return chunk
+
+    def _read_output(self):
+        """Reads the command output, run through the stages if any."""
+        chunk = self.process.stdout.read(CHUNK_SIZE)
+        if self.stages is None:
+            return chunk
+        # The stages may hold data back, so read on until they give some.
+        while chunk:
+            chunk = self.stages.process(chunk)
+            if chunk:
+                return chunk
+            chunk = self.process.stdout.read(CHUNK_SIZE)
+        if self.stages_flushed:
+            return ''
+        self.stages_flushed = True
+        return self.stages.flush()
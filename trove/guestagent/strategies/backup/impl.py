@@ -14,11 +14,14 @@
 #    under the License.
 #
 
+import re
+
 from trove.guestagent.strategies.backup import base
 from trove.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
+INNOBACKUPEX_LOG = '/tmp/innobackupex.log'
 
 
 class MySQLDump(base.BackupRunner):
@@ -48,10 +51,34 @@ class InnoBackupEx(base.BackupRunner):
     def cmd(self):
         cmd = 'sudo innobackupex'\
             ' --stream=xbstream'\
-            ' /var/lib/mysql 2>/tmp/innobackupex.log'
+            ' /var/lib/mysql 2>' + INNOBACKUPEX_LOG
         return cmd + self.zip_cmd + self.encrypt_cmd
 
     @property
     def manifest(self):
         manifest = '%s.xbstream' % self.filename
         return manifest + self.zip_manifest + self.encrypt_manifest
+
+    def metadata(self):
+        """Reads the LSN the backup ends at from the innobackupex log."""
+        lsn = re.compile(r"The latest check point \(for incremental\): "
+                         r"'(\d+)'")
+        with open(INNOBACKUPEX_LOG, 'r') as backup_log:
+            match = lsn.search(backup_log.read())
+        if match:
+            return {'lsn': int(match.group(1))}
+        return {}
+
+
+class InnoBackupExIncremental(InnoBackupEx):
+    """ Copies the pages changed since the LSN of a parent backup """
+    __strategy_name__ = 'innobackupexincremental'
+
+    @property
+    def cmd(self):
+        cmd = 'sudo innobackupex'\
+            ' --stream=xbstream'\
+            ' --incremental'\
+            ' --incremental-lsn=%(lsn)s'\
+            ' /var/lib/mysql 2>' + INNOBACKUPEX_LOG
+        return cmd + self.zip_cmd + self.encrypt_cmd
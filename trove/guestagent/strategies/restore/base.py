@@ -14,10 +14,13 @@
 #    under the License.
 #
 from trove.guestagent.strategy import Strategy
+from trove.guestagent.strategies import stages
 from trove.common import cfg
 from trove.common import exception
 from trove.common import utils
 from trove.openstack.common import log as logging
+import eventlet
+from eventlet import queue
 from eventlet.green import subprocess
 import tempfile
 import pexpect
@@ -30,6 +33,8 @@ CHUNK_SIZE = CONF.backup_chunk_size
 BACKUP_USE_GZIP = CONF.backup_use_gzip_compression
 BACKUP_USE_OPENSSL = CONF.backup_use_openssl_encryption
 BACKUP_DECRYPT_KEY = CONF.backup_aes_cbc_key
+BACKUP_STREAM_STAGES = CONF.backup_stream_stages
+RESTORE_READ_AHEAD = CONF.backup_restore_read_ahead
 RESET_ROOT_RETRY_TIMEOUT = 100
 RESET_ROOT_SLEEP_INTERVAL = 10
 RESET_ROOT_MYSQL_COMMAND = """
@@ -96,11 +101,21 @@ class RestoreRunner(Strategy):
     is_zipped = BACKUP_USE_GZIP
     is_encrypted = BACKUP_USE_OPENSSL
     decrypt_key = BACKUP_DECRYPT_KEY
+    use_stages = BACKUP_STREAM_STAGES
+    read_ahead = RESTORE_READ_AHEAD
 
     def __init__(self, restore_stream, **kwargs):
         self.restore_stream = restore_stream
+        self.progress = kwargs.get('progress')
         self.restore_location = kwargs.get('restore_location',
                                            '/var/lib/mysql')
+        # Backups taken before the codecs were recorded follow the config.
+        self.compression = (kwargs.get('compression') or
+                            (stages.GZIP if self.is_zipped else stages.NONE))
+        self.encryption = (kwargs.get('encryption') or
+                           (stages.AES_256_CBC if self.is_encrypted
+                            else stages.NONE))
+        self.stages = self._get_stages(self.compression, self.encryption)
         self.restore_cmd = (self.decrypt_cmd +
                             self.unzip_cmd +
                             (self.base_restore_cmd % kwargs))
@@ -134,24 +149,81 @@ class RestoreRunner(Strategy):
         self._post_restore()
         return content_length
 
+    def _get_stages(self, compression, encryption):
+        """Returns the stages decoding a backup, or None to use commands."""
+        if (self.use_stages or
+                compression not in (stages.NONE, stages.GZIP) or
+                encryption not in (stages.NONE, stages.AES_256_CBC)):
+            return stages.decoder(compression, encryption, self.decrypt_key)
+        return None
+
     def _run_restore(self):
-        with self.restore_stream as stream:
-            self.process = subprocess.Popen(self.restore_cmd, shell=True,
+        return self._unpack(self.restore_stream, self.restore_cmd,
+                            self.stages)
+
+    def _unpack(self, restore_stream, restore_cmd, decoder):
+        """Pipes the stream into the command, through the decoder if any."""
+        with restore_stream as stream:
+            self.process = subprocess.Popen(restore_cmd, shell=True,
                                             stdin=subprocess.PIPE,
                                             stderr=subprocess.PIPE)
             self.pid = self.process.pid
             content_length = 0
-            chunk = stream.read(CHUNK_SIZE)
-            while chunk:
-                self.process.stdin.write(chunk)
-                content_length += len(chunk)
-                chunk = stream.read(CHUNK_SIZE)
+            chunks = self._read_chunks(stream)
+            try:
+                for chunk in chunks:
+                    content_length += len(chunk)
+                    if self.progress is not None:
+                        self.progress.update(len(chunk))
+                    if decoder is not None:
+                        chunk = decoder.process(chunk)
+                    self.process.stdin.write(chunk)
+            finally:
+                chunks.close()
+            if decoder is not None:
+                self.process.stdin.write(decoder.flush())
             self.process.stdin.close()
             LOG.info("Restored %s bytes from swift via xbstream."
                      % content_length)
 
         return content_length
 
+    def _read_chunks(self, stream):
+        """Yields the chunks of the downloaded stream.
+
+        With read_ahead set, a separate greenthread keeps downloading up to
+        that many chunks while the ones before are decoded and extracted.
+        """
+        if self.read_ahead <= 0:
+            chunk = stream.read(CHUNK_SIZE)
+            while chunk:
+                yield chunk
+                chunk = stream.read(CHUNK_SIZE)
+            return
+
+        chunks = queue.Queue(self.read_ahead)
+
+        def download():
+            try:
+                chunk = stream.read(CHUNK_SIZE)
+                while chunk:
+                    chunks.put(chunk)
+                    chunk = stream.read(CHUNK_SIZE)
+                chunks.put('')
+            except Exception as e:
+                chunks.put(e)
+
+        downloader = eventlet.spawn(download)
+        try:
+            chunk = chunks.get()
+            while chunk:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+                chunk = chunks.get()
+        finally:
+            downloader.kill()
+
     def _run_prepare(self):
         if hasattr(self, 'prepare_cmd'):
             LOG.info("Running innobackupex prepare...")
@@ -197,14 +269,22 @@ class RestoreRunner(Strategy):
         for f in filelist:
             os.unlink(f)
 
-    @property
-    def decrypt_cmd(self):
-        if self.is_encrypted:
+    def _decrypt_cmd(self, encryption, decoder):
+        if decoder is None and encryption == stages.AES_256_CBC:
             return ('openssl enc -d -aes-256-cbc -salt -pass pass:%s | '
                     % self.decrypt_key)
         else:
             return ''
 
+    def _unzip_cmd(self, compression, decoder):
+        if decoder is None and compression == stages.GZIP:
+            return 'gzip -d -c | '
+        return ''
+
+    @property
+    def decrypt_cmd(self):
+        return self._decrypt_cmd(self.encryption, self.stages)
+
     @property
     def unzip_cmd(self):
-        return 'gzip -d -c | ' if self.is_zipped else ''
+        return self._unzip_cmd(self.compression, self.stages)
@@ -14,6 +14,8 @@
 #    under the License.
 #
 
+import os
+
 from trove.guestagent.strategies.restore import base
 from trove.openstack.common import log as logging
 from trove.common import utils
@@ -55,3 +57,63 @@ class InnoBackupEx(base.RestoreRunner):
         self._reset_root_password()
         app = dbaas.MySqlApp(dbaas.MySqlAppStatus.get())
         app.start_mysql()
+
+
+class InnoBackupExIncremental(InnoBackupEx):
+    """ Restores a full InnoBackupEx backup and the increments on top """
+    __strategy_name__ = 'innobackupexincremental'
+    base_incremental_prepare_cmd = (
+        'sudo innobackupex --apply-log --redo-only %(restore_location)s'
+        ' --defaults-file=%(restore_location)s/backup-my.cnf'
+        ' --ibbackup xtrabackup%(incremental_args)s'
+        ' 2>/tmp/innoprepare.log')
+
+    def __init__(self, restore_stream, **kwargs):
+        super(InnoBackupExIncremental, self).__init__(restore_stream,
+                                                      **kwargs)
+        # Each increment is a dict of restore_stream, compression and
+        # encryption, oldest first; restore_stream holds the full backup.
+        self.incrementals = kwargs.get('incrementals', [])
+        self.incremental_dir = os.path.join(self.restore_location,
+                                            'incremental')
+
+    def _run_restore(self):
+        content_length = super(InnoBackupExIncremental, self)._run_restore()
+        self._wait_for_unpack()
+        self._incremental_prepare()
+        for incremental in self.incrementals:
+            utils.execute_with_timeout("sudo", "mkdir", "-p",
+                                       self.incremental_dir)
+            compression = incremental['compression']
+            encryption = incremental['encryption']
+            decoder = self._get_stages(compression, encryption)
+            restore_cmd = (self._decrypt_cmd(encryption, decoder) +
+                           self._unzip_cmd(compression, decoder) +
+                           self.base_restore_cmd %
+                           {'restore_location': self.incremental_dir})
+            content_length += self._unpack(incremental['restore_stream'],
+                                           restore_cmd, decoder)
+            self._wait_for_unpack()
+            self._incremental_prepare(self.incremental_dir)
+            utils.execute_with_timeout("sudo", "rm", "-rf",
+                                       self.incremental_dir)
+        return content_length
+
+    def _wait_for_unpack(self):
+        self.process.wait()
+        utils.raise_if_process_errored(self.process, base.RestoreError)
+
+    def _incremental_prepare(self, incremental_dir=None):
+        """Replays the redo log, leaving the backup open to more increments.
+
+        The final prepare rolls back uncommitted transactions once every
+        increment has been applied.
+        """
+        incremental_args = ''
+        if incremental_dir is not None:
+            incremental_args = ' --incremental-dir=%s' % incremental_dir
+        prepare_cmd = self.base_incremental_prepare_cmd % {
+            'restore_location': self.restore_location,
+            'incremental_args': incremental_args}
+        LOG.info("Running innobackupex incremental prepare...")
+        utils.execute(prepare_cmd, shell=True)
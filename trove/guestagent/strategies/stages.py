@@ -0,0 +1,277 @@
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Stages compressing and encrypting backup streams inside the agent.
+
+The stages produce the same formats as the gzip and openssl commands
+they replace, so a backup written by either can be restored by the
+other. Codecs are registered by name; the names are recorded with the
+backup so a restore knows which decoders to use.
+"""
+
+import hashlib
+import os
+import zlib
+
+from Crypto.Cipher import AES
+import eventlet
+from eventlet import tpool
+
+from trove.common import cfg
+
+CONF = cfg.CONF
+
+NONE = 'none'
+GZIP = 'gzip'
+AES_256_CBC = 'aes-256-cbc'
+
+# Amount of data compressed by each parallel gzip task.
+GZIP_BLOCK_SIZE = 2 ** 20
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class StageError(Exception):
+    """Error transforming a backup stream."""
+
+
+class Stage(object):
+    """Transforms a stream of bytes one chunk at a time.
+
+    A stage may hold data back between calls; whatever is left is
+    returned by flush() once the stream ends.
+    """
+
+    def process(self, data):
+        return data
+
+    def flush(self):
+        return ''
+
+
+class Pipeline(Stage):
+    """Runs data through several stages in order."""
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def process(self, data):
+        for stage in self.stages:
+            data = stage.process(data)
+        return data
+
+    def flush(self):
+        data = ''
+        for stage in self.stages:
+            data = (stage.process(data) if data else '') + stage.flush()
+        return data
+
+
+class GzipCompressor(Stage):
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+
+    def process(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+def _gzip_block(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipCompressor(Stage):
+    """Compresses blocks of the stream on several native threads.
+
+    Each block becomes a gzip member of its own; concatenated, they are
+    still a valid gzip file. zlib releases the GIL while compressing, so
+    the blocks are compressed on as many cores as there are workers.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = eventlet.GreenPool(workers)
+        self.pending = []
+        self.block = []
+        self.block_size = 0
+
+    def _compress_block(self):
+        data = ''.join(self.block)
+        self.block = []
+        self.block_size = 0
+        self.pending.append(self.pool.spawn(tpool.execute, _gzip_block,
+                                            data))
+
+    def _collect(self, wait_all=False):
+        output = []
+        while self.pending and (wait_all or self.pending[0].dead or
+                                len(self.pending) > self.workers):
+            output.append(self.pending.pop(0).wait())
+        return ''.join(output)
+
+    def process(self, data):
+        self.block.append(data)
+        self.block_size += len(data)
+        if self.block_size >= GZIP_BLOCK_SIZE:
+            self._compress_block()
+        return self._collect()
+
+    def flush(self):
+        if self.block_size:
+            self._compress_block()
+        return self._collect(wait_all=True)
+
+
+class GzipDecompressor(Stage):
+    """Decompresses gzip data, including files of several members."""
+
+    def __init__(self):
+        self.decompressor = zlib.decompressobj(GZIP_WBITS)
+
+    def process(self, data):
+        output = []
+        while data:
+            output.append(self.decompressor.decompress(data))
+            data = self.decompressor.unused_data
+            if data:
+                self.decompressor = zlib.decompressobj(GZIP_WBITS)
+        return ''.join(output)
+
+    def flush(self):
+        return self.decompressor.flush()
+
+
+def _openssl_key_and_iv(password, salt):
+    """Derives the key and IV like openssl enc does (EVP_BytesToKey)."""
+    derived = digest = ''
+    while len(derived) < 48:
+        digest = hashlib.md5(digest + password + salt).digest()
+        derived += digest
+    return derived[:32], derived[32:48]
+
+
+class AESEncryptor(Stage):
+    """Encrypts like openssl enc -aes-256-cbc -salt -pass pass:KEY."""
+
+    def __init__(self, password):
+        salt = os.urandom(8)
+        key, iv = _openssl_key_and_iv(password, salt)
+        self.cipher = AES.new(key, AES.MODE_CBC, iv)
+        self.header = 'Salted__' + salt
+        self.remainder = ''
+
+    def process(self, data):
+        data = self.remainder + data
+        usable = len(data) - len(data) % AES.block_size
+        self.remainder = data[usable:]
+        output = self.header + self.cipher.encrypt(data[:usable])
+        self.header = ''
+        return output
+
+    def flush(self):
+        padding = AES.block_size - len(self.remainder) % AES.block_size
+        data = self.remainder + chr(padding) * padding
+        self.remainder = ''
+        output = self.header + self.cipher.encrypt(data)
+        self.header = ''
+        return output
+
+
+class AESDecryptor(Stage):
+    """Decrypts the output of AESEncryptor or of openssl enc."""
+
+    def __init__(self, password):
+        self.password = password
+        self.cipher = None
+        self.remainder = ''
+
+    def process(self, data):
+        data = self.remainder + data
+        if self.cipher is None:
+            if len(data) < 16:
+                self.remainder = data
+                return ''
+            if not data.startswith('Salted__'):
+                raise StageError("Encrypted backup has no salt header.")
+            key, iv = _openssl_key_and_iv(self.password, data[8:16])
+            self.cipher = AES.new(key, AES.MODE_CBC, iv)
+            data = data[16:]
+        # The last block holds the padding, so keep it for flush().
+        usable = len(data) - len(data) % AES.block_size - AES.block_size
+        usable = max(usable, 0)
+        self.remainder = data[usable:]
+        return self.cipher.decrypt(data[:usable])
+
+    def flush(self):
+        if self.cipher is None or len(self.remainder) != AES.block_size:
+            raise StageError("Encrypted backup is truncated.")
+        data = self.cipher.decrypt(self.remainder)
+        padding = ord(data[-1])
+        if (not 0 < padding <= AES.block_size or
+                data[-padding:] != chr(padding) * padding):
+            raise StageError("Encrypted backup has a bad padding; is the "
+                             "key right?")
+        return data[:-padding]
+
+
+def _gzip_compressor(workers):
+    if workers > 1:
+        return ParallelGzipCompressor(workers)
+    return GzipCompressor()
+
+
+COMPRESSION_CODECS = {GZIP: (_gzip_compressor, GzipDecompressor)}
+ENCRYPTION_CODECS = {AES_256_CBC: (AESEncryptor, AESDecryptor)}
+
+
+def register_compression_codec(name, compressor, decompressor):
+    """Registers a codec; compressor is called with the worker count."""
+    COMPRESSION_CODECS[name] = (compressor, decompressor)
+
+
+def register_encryption_codec(name, encryptor, decryptor):
+    """Registers a codec; both are called with the key."""
+    ENCRYPTION_CODECS[name] = (encryptor, decryptor)
+
+
+def _codec(codecs, name):
+    try:
+        return codecs[name]
+    except KeyError:
+        raise StageError("Unknown backup codec %s." % name)
+
+
+def encoder(compression, encryption, key):
+    """Returns the stages that compress then encrypt a backup."""
+    stages = []
+    if compression != NONE:
+        compressor = _codec(COMPRESSION_CODECS, compression)[0]
+        stages.append(compressor(CONF.backup_compression_workers))
+    if encryption != NONE:
+        stages.append(_codec(ENCRYPTION_CODECS, encryption)[0](key))
+    return Pipeline(stages)
+
+
+def decoder(compression, encryption, key):
+    """Returns the stages that decrypt then decompress a backup."""
+    stages = []
+    if encryption != NONE:
+        stages.append(_codec(ENCRYPTION_CODECS, encryption)[1](key))
+    if compression != NONE:
+        stages.append(_codec(COMPRESSION_CODECS, compression)[1]())
+    return Pipeline(stages)
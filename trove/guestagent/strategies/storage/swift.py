@@ -17,12 +17,19 @@
 from trove.guestagent.strategies.storage import base
 from trove.openstack.common import log as logging
 from trove.common.remote import create_swift_client
+from trove.common import cfg
 from trove.common import utils
+import eventlet
+import hashlib
 from eventlet.green import subprocess
+from eventlet import pools
 import zlib
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+CHUNK_SIZE = CONF.backup_chunk_size
+
 
 class DownloadError(Exception):
     """Error running the Swift Download Command."""
@@ -34,6 +41,7 @@ class SwiftStorage(base.Storage):
 
     def __init__(self, context):
         super(SwiftStorage, self).__init__()
+        self.context = context
         self.connection = create_swift_client(context)
 
     def set_container(self, ):
@@ -50,6 +58,31 @@ class SwiftStorage(base.Storage):
         self.connection.put_container(self.segments_container_name)
 
         # Read from the stream and write to the container in swift
+        if CONF.backup_upload_workers > 1:
+            saved = self._save_segments_concurrently(stream)
+        else:
+            saved = self._save_segments(stream)
+        if not saved:
+            return (False, "Error saving data to Swift!", None, None)
+
+        checksum = stream.checksum.hexdigest()
+        url = self.connection.url
+        location = "%s/%s/%s" % (url, self.container_name, stream.manifest)
+
+        # Create the manifest file
+        headers = {
+            'X-Object-Manifest':
+            self.segments_container_name + "/" + stream.filename}
+        self.connection.put_object(self.container_name,
+                                   stream.manifest,
+                                   contents='',
+                                   headers=headers)
+
+        return (True, "Successfully saved data to Swift!",
+                checksum, location)
+
+    def _save_segments(self, stream):
+        """Streams each segment to Swift before reading the next one."""
         while not stream.end_of_file:
             segment = stream.segment
             etag = self.connection.put_object(self.segments_container_name,
@@ -58,25 +91,50 @@ class SwiftStorage(base.Storage):
 
             # Check each segment MD5 hash against swift etag
             # Raise an error and mark backup as failed
-            if etag != stream.schecksum.hexdigest():
-                print("%s %s" % (etag, stream.schecksum.hexdigest()))
-                return (False, "Error saving data to Swift!", None, None)
-
-            checksum = stream.checksum.hexdigest()
-            url = self.connection.url
-            location = "%s/%s/%s" % (url, self.container_name, stream.manifest)
-
-            # Create the manifest file
-            headers = {
-                'X-Object-Manifest':
-                self.segments_container_name + "/" + stream.filename}
-            self.connection.put_object(self.container_name,
-                                       stream.manifest,
-                                       contents='',
-                                       headers=headers)
-
-            return (True, "Successfully saved data to Swift!",
-                    checksum, location)
+            if not self._verify_segment(segment, etag,
+                                        stream.schecksum.hexdigest()):
+                return False
+        return True
+
+    def _save_segments_concurrently(self, stream):
+        """Reads segments into memory and uploads several at once.
+
+        Up to backup_upload_workers segments are uploaded at the same
+        time, each over its own connection, while the next one is read
+        from the stream. Reading stops as soon as an upload fails.
+        """
+        connections = pools.Pool(
+            max_size=CONF.backup_upload_workers,
+            create=lambda: create_swift_client(self.context))
+        pool = eventlet.GreenPool(CONF.backup_upload_workers)
+        uploads = []
+        while not stream.end_of_file:
+            if any(upload.dead and not upload.wait() for upload in uploads):
+                break
+            segment = stream.segment
+            chunks = []
+            chunk = stream.read(CHUNK_SIZE)
+            while chunk:
+                chunks.append(chunk)
+                chunk = stream.read(CHUNK_SIZE)
+            uploads.append(pool.spawn(self._put_segment, connections,
+                                      segment, ''.join(chunks),
+                                      stream.schecksum.hexdigest()))
+        return all([upload.wait() for upload in uploads])
+
+    def _put_segment(self, connections, segment, contents, checksum):
+        with connections.item() as connection:
+            etag = connection.put_object(self.segments_container_name,
+                                         segment,
+                                         contents)
+        return self._verify_segment(segment, etag, checksum)
+
+    def _verify_segment(self, segment, etag, checksum):
+        if etag != checksum:
+            LOG.error("Segment %s is corrupt: Swift etag %s does not match "
+                      "checksum %s." % (segment, etag, checksum))
+            return False
+        return True
 
     def _explodeLocation(self, location):
         storage_url = "/".join(location.split('/')[:-2])
@@ -89,6 +147,9 @@ class SwiftStorage(base.Storage):
 
         storage_url, container, filename = self._explodeLocation(location)
 
+        if CONF.backup_download_workers > 1:
+            return SwiftSegmentedDownloadStream(context, container, filename)
+
         return SwiftDownloadStream(auth_token=context.auth_token,
                                    storage_url=storage_url,
                                    container=container,
@@ -133,3 +194,86 @@ class SwiftDownloadStream(object):
                                         stdout=subprocess.PIPE,
                                         stderr=subprocess.PIPE)
         self.pid = self.process.pid
+
+
+class SwiftSegmentedDownloadStream(object):
+    """Downloads the segments of a backup over several connections.
+
+    The segments listed by the manifest are fetched by a pool of
+    backup_download_workers green threads, each with its own Swift
+    connection, and read back in order. Only as many segments as there
+    are workers are fetched ahead, which bounds the memory used. Every
+    segment is checked against the MD5 hash Swift lists for it.
+    """
+
+    def __init__(self, context, container, filename):
+        self.context = context
+        self.container = container
+        self.filename = filename
+        self.workers = CONF.backup_download_workers
+        self.connections = None
+        self.pool = None
+        self.pending = []
+        self.segments = []
+        self.buffer = ''
+        self.offset = 0
+
+    def __enter__(self):
+        """List the segments and start fetching the first ones."""
+        self.run()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop any download still running."""
+        for fetch in self.pending:
+            fetch.kill()
+        self.pending = []
+
+    def run(self):
+        self.connections = pools.Pool(
+            max_size=self.workers,
+            create=lambda: create_swift_client(self.context))
+        self.pool = eventlet.GreenPool(self.workers)
+        self.segments = self._list_segments()
+        LOG.debug("Downloading %s segments of %s/%s."
+                  % (len(self.segments), self.container, self.filename))
+        self._fetch_ahead()
+
+    def _list_segments(self):
+        """Returns the container, name and MD5 hash of each segment."""
+        with self.connections.item() as connection:
+            headers = connection.head_object(self.container, self.filename)
+            manifest = headers.get('x-object-manifest')
+            if not manifest:
+                return [(self.container, self.filename, headers.get('etag'))]
+            container, prefix = manifest.split('/', 1)
+            headers, segments = connection.get_container(container,
+                                                         prefix=prefix,
+                                                         full_listing=True)
+        return [(container, segment['name'], segment['hash'])
+                for segment in segments]
+
+    def _fetch_ahead(self):
+        while self.segments and len(self.pending) < self.workers:
+            self.pending.append(self.pool.spawn(self._fetch,
+                                                *self.segments.pop(0)))
+
+    def _fetch(self, container, name, checksum):
+        with self.connections.item() as connection:
+            headers, contents = connection.get_object(container, name)
+        return container, name, checksum, contents
+
+    def read(self, chunk_size):
+        while self.offset >= len(self.buffer):
+            if not self.pending:
+                return ''
+            container, name, checksum, self.buffer = self.pending.pop(0).wait()
+            self.offset = 0
+            if checksum and hashlib.md5(self.buffer).hexdigest() != checksum:
+                raise DownloadError("Segment %s/%s is corrupt: its MD5 does "
+                                    "not match %s." % (container, name,
+                                                       checksum))
+            self._fetch_ahead()
+        chunk = self.buffer[self.offset:self.offset + chunk_size]
+        self.offset += len(chunk)
+        return chunk
@@ -17,6 +17,8 @@
 
 """Model classes that form the core of instances functionality."""
 
+import eventlet
+
 from datetime import datetime
 from novaclient import exceptions as nova_exceptions
 from trove.common import cfg
@@ -25,7 +27,10 @@ from trove.common.remote import create_dns_client
 from trove.common.remote import create_guest_client
 from trove.common.remote import create_nova_client
 from trove.common.remote import create_nova_volume_client
+from trove.common import server_cache
+from trove.common import utils
 from trove.extensions.security_group.models import SecurityGroup
+from trove.db import get_db_api
 from trove.db import models as dbmodels
 from trove.backup.models import Backup
 from trove.quota.quota import run_with_quotas
@@ -78,6 +83,49 @@ def validate_volume_size(size):
         raise exception.VolumeQuotaExceeded(msg)
 
 
+def _get_flavor(client, flavor_id):
+    try:
+        return client.flavors.get(flavor_id)
+    except nova_exceptions.NotFound:
+        raise exception.FlavorNotFound(uuid=flavor_id)
+
+
+def _validate_storage(flavor_id, flavor, volume_size):
+    if CONF.trove_volume_support:
+        validate_volume_size(volume_size)
+    else:
+        if volume_size is not None:
+            raise exception.VolumeNotSupported()
+        ephemeral_support = CONF.device_path
+        if ephemeral_support and flavor.ephemeral == 0:
+            raise exception.LocalStorageNotSpecified(flavor=flavor_id)
+
+
+def _validate_backup(context, backup_id):
+    if backup_id is None:
+        return
+    backup_info = Backup.get_by_id(context, backup_id)
+    if backup_info.is_running:
+        raise exception.BackupNotCompleteError(backup_id=backup_id)
+
+    location = backup_info.location
+    LOG.info(_("Checking if backup exist in '%s'") % location)
+    if not Backup.check_object_exist(context, location):
+        raise exception.BackupFileNotFound(location=location)
+
+
+def get_server_state(client, db_info):
+    """Gets the server of an instance in order to read its state.
+
+    The server cache is only used for instances without a running task; while
+    a task changes the server, Nova is asked directly and nothing is cached.
+
+    """
+    if InstanceTasks.NONE == db_info.task_status:
+        return server_cache.SERVERS.get(client, db_info.compute_instance_id)
+    return client.servers.get(db_info.compute_instance_id)
+
+
 def load_simple_instance_server_status(context, db_info):
     """Loads a server or raises an exception."""
     if 'BUILDING' == db_info.task_status.action:
@@ -86,7 +134,7 @@ def load_simple_instance_server_status(context, db_info):
     else:
         client = create_nova_client(context)
         try:
-            server = client.servers.get(db_info.compute_instance_id)
+            server = get_server_state(client, db_info)
             db_info.server_status = server.status
             db_info.addresses = server.addresses
         except nova_exceptions.NotFound:
@@ -378,6 +426,8 @@ class BaseInstance(SimpleInstance):
         for key in values:
             setattr(self.db_info, key, values[key])
         self.db_info.save()
+        if 'task_status' in values:
+            server_cache.SERVERS.invalidate(self.db_info.compute_instance_id)
 
     @property
     def volume_client(self):
@@ -416,34 +466,19 @@ class Instance(BuiltInstance):
                databases, users, service_type, volume_size, backup_id):
 
         client = create_nova_client(context)
-        try:
-            flavor = client.flavors.get(flavor_id)
-        except nova_exceptions.NotFound:
-            raise exception.FlavorNotFound(uuid=flavor_id)
+        flavor = _get_flavor(client, flavor_id)
 
         deltas = {'instances': 1}
+        _validate_storage(flavor_id, flavor, volume_size)
         if CONF.trove_volume_support:
-            validate_volume_size(volume_size)
             deltas['volumes'] = volume_size
-        else:
-            if volume_size is not None:
-                raise exception.VolumeNotSupported()
-            ephemeral_support = CONF.device_path
-            if ephemeral_support and flavor.ephemeral == 0:
-                raise exception.LocalStorageNotSpecified(flavor=flavor_id)
 
         def _create_resources():
+            # The task manager creates the security group along with
+            # the volume.
             security_groups = None
 
-            if backup_id is not None:
-                backup_info = Backup.get_by_id(context, backup_id)
-                if backup_info.is_running:
-                    raise exception.BackupNotCompleteError(backup_id=backup_id)
-
-                location = backup_info.location
-                LOG.info(_("Checking if backup exist in '%s'") % location)
-                if not Backup.check_object_exist(context, location):
-                    raise exception.BackupFileNotFound(location=location)
+            _validate_backup(context, backup_id)
 
             db_info = DBInstance.create(name=name, flavor_id=flavor_id,
                                         tenant_id=context.tenant,
@@ -462,12 +497,6 @@ class Instance(BuiltInstance):
                 db_info.hostname = hostname
                 db_info.save()
 
-            if CONF.trove_security_groups_support:
-                security_group = SecurityGroup.create_for_instance(
-                    db_info.id,
-                    context)
-                security_groups = [security_group["name"]]
-
             task_api.API(context).create_instance(db_info.id, name, flavor_id,
                                                   flavor.ram, image_id,
                                                   databases, users,
@@ -480,6 +509,74 @@ class Instance(BuiltInstance):
                                deltas,
                                _create_resources)
 
+    @classmethod
+    def create_batch(cls, context, instances):
+        """Creates several instances under a single quota reservation.
+
+        Takes a list of dicts of the arguments of create(). The instances
+        are inserted in one transaction and their builds are cast to the
+        task manager in chunks of instance_batch_chunk_size.
+
+        """
+        client = create_nova_client(context)
+        flavors = {}
+        deltas = {'instances': len(instances)}
+        if CONF.trove_volume_support:
+            deltas['volumes'] = 0
+        for args in instances:
+            flavor_id = args['flavor_id']
+            if flavor_id not in flavors:
+                flavors[flavor_id] = _get_flavor(client, flavor_id)
+            _validate_storage(flavor_id, flavors[flavor_id],
+                              args['volume_size'])
+            if CONF.trove_volume_support:
+                deltas['volumes'] += args['volume_size']
+
+        def _create_resources():
+            for backup_id in set(args['backup_id'] for args in instances):
+                _validate_backup(context, backup_id)
+
+            dns_client = None
+            if CONF.trove_dns_support:
+                dns_client = create_dns_client(context)
+            db_infos = []
+            statuses = []
+            for args in instances:
+                db_info = DBInstance.new(name=args['name'],
+                                         flavor_id=args['flavor_id'],
+                                         tenant_id=context.tenant,
+                                         volume_size=args['volume_size'],
+                                         task_status=InstanceTasks.BUILDING)
+                if dns_client:
+                    db_info.hostname = dns_client.determine_hostname(
+                        db_info.id)
+                db_infos.append(db_info)
+                statuses.append(InstanceServiceStatus.new(
+                    instance_id=db_info.id,
+                    status=ServiceStatuses.NEW))
+            get_db_api().save_all(db_infos + statuses)
+            LOG.debug(_("Tenant %(tenant)s created %(count)s new Trove "
+                        "instances.") % {'tenant': context.tenant,
+                                         'count': len(db_infos)})
+
+            builds = []
+            for db_info, args in zip(db_infos, instances):
+                build = dict(args, instance_id=db_info.id,
+                             flavor_ram=flavors[args['flavor_id']].ram,
+                             security_groups=None)
+                builds.append(build)
+            chunk_size = CONF.instance_batch_chunk_size
+            for start in range(0, len(builds), chunk_size):
+                task_api.API(context).create_instances(
+                    builds[start:start + chunk_size])
+
+            return [SimpleInstance(context, db_info, status)
+                    for db_info, status in zip(db_infos, statuses)]
+
+        return run_with_quotas(context.tenant,
+                               deltas,
+                               _create_resources)
+
     def resize_flavor(self, new_flavor_id):
         self.validate_can_perform_action()
         LOG.debug("resizing instance %s flavor to %s"
@@ -584,6 +681,28 @@ class Instance(BuiltInstance):
         raise exception.UnprocessableEntity(msg)
 
 
+def load_servers(context, db_infos):
+    """Loads the servers of the given instances, skipping missing ones.
+
+    Servers missing from the cache are fetched from Nova up to
+    server_load_workers at a time, so a page takes about as long to load
+    as its slowest server rather than as all of them together.
+    """
+    client = create_nova_client(context)
+
+    def load_server(db_info):
+        try:
+            return get_server_state(client, db_info)
+        except nova_exceptions.NotFound:
+            LOG.debug("Could not find nova server_id(%s)" %
+                      db_info.compute_instance_id)
+            return None
+
+    pool = eventlet.GreenPool(CONF.server_load_workers)
+    return [server for server in pool.imap(load_server, db_infos)
+            if server is not None]
+
+
 def create_server_list_matcher(server_list):
     # Returns a method which finds a server from the given list.
     def find_server(instance_id, server_id):
@@ -616,56 +735,52 @@ class Instances(object):
 
         if context is None:
             raise TypeError("Argument context not defined.")
-        client = create_nova_client(context)
-        servers = client.servers.list()
-
-        db_infos = DBInstance.find_all(tenant_id=context.tenant, deleted=False)
         limit = int(context.limit or Instances.DEFAULT_LIMIT)
         if limit > Instances.DEFAULT_LIMIT:
             limit = Instances.DEFAULT_LIMIT
-        data_view = DBInstance.find_by_pagination('instances', db_infos, "foo",
-                                                  limit=limit,
-                                                  marker=context.marker)
-        next_marker = data_view.next_page_marker
-
+        db_infos, statuses, next_marker = DBInstance.find_page_with_status(
+            limit, context.marker, tenant_id=context.tenant, deleted=False)
+
+        # Only ask Nova about the servers on this page; building instances
+        # are reported as BUILD anyway so there's no need to look them up.
+        servers = load_servers(context, [db for db in db_infos
+                                         if InstanceTasks.BUILDING !=
+                                         db.task_status])
         find_server = create_server_list_matcher(servers)
-        for db in db_infos:
-            LOG.debug("checking for db [id=%s, compute_instance_id=%s]" %
-                      (db.id, db.compute_instance_id))
         ret = Instances._load_servers_status(load_simple_instance, context,
-                                             data_view.collection,
-                                             find_server)
+                                             db_infos, find_server,
+                                             statuses=statuses)
         return ret, next_marker
 
     @staticmethod
-    def _load_servers_status(load_instance, context, db_items, find_server):
+    def _load_servers_status(load_instance, context, db_items, find_server,
+                             statuses=None):
+        db_items = list(db_items)
+        if statuses is None:
+            statuses = InstanceServiceStatus.find_all_by_instance_ids(
+                [db.id for db in db_items])
         ret = []
         for db in db_items:
             server = None
-            try:
-                #TODO(tim.simpson): Delete when we get notifications working!
-                if InstanceTasks.BUILDING == db.task_status:
-                    db.server_status = "BUILD"
-                else:
-                    try:
-                        server = find_server(db.id, db.compute_instance_id)
-                        db.server_status = server.status
-                    except exception.ComputeInstanceNotFound:
-                        db.server_status = "SHUTDOWN"  # Fake it...
-                #TODO(tim.simpson): End of hack.
-
-                #volumes = find_volumes(server.id)
-                status = InstanceServiceStatus.find_by(instance_id=db.id)
-                LOG.info(_("Server api_status(%s)") %
-                         status.status.api_status)
-                if not status.status:  # This should never happen.
-                    LOG.error(_("Server status could not be read for "
-                                "instance id(%s)") % db.id)
-                    continue
-            except exception.ModelNotFoundError:
+            #TODO(tim.simpson): Delete when we get notifications working!
+            if InstanceTasks.BUILDING == db.task_status:
+                db.server_status = "BUILD"
+            else:
+                try:
+                    server = find_server(db.id, db.compute_instance_id)
+                    db.server_status = server.status
+                except exception.ComputeInstanceNotFound:
+                    db.server_status = "SHUTDOWN"  # Fake it...
+            #TODO(tim.simpson): End of hack.
+
+            #volumes = find_volumes(server.id)
+            status = statuses.get(db.id)
+            if status is None or not status.status:
+                # This should never happen.
                 LOG.error(_("Server status could not be read for "
                             "instance id(%s)") % db.id)
                 continue
+            LOG.info(_("Server api_status(%s)") % status.status.api_status)
             ret.append(load_instance(context, db, status, server=server))
         return ret
 
@@ -677,7 +792,7 @@ class DBInstance(dbmodels.DatabaseModelBase):
 
     _data_fields = ['name', 'created', 'compute_instance_id',
                     'task_id', 'task_description', 'task_start_time',
-                    'volume_id', 'deleted', 'tenant_id']
+                    'volume_id', 'deleted', 'tenant_id', 'build_timings']
 
     def __init__(self, task_status, **kwargs):
         kwargs["task_id"] = task_status.code
@@ -701,6 +816,55 @@ class DBInstance(dbmodels.DatabaseModelBase):
 
     task_status = property(get_task_status, set_task_status)
 
+    @classmethod
+    def find_page_with_status(cls, limit, marker=None, **conditions):
+        """Loads a page of instances joined with their service statuses.
+
+        Returns the instances on the page, a dict of their service statuses
+        keyed by instance id and the marker of the next page (or None).
+        Instances without a service status are left out, just as
+        Instances._load_servers_status would skip them.
+
+        """
+        query = cls.query().add_entity(InstanceServiceStatus)
+        query = query.filter(cls.id == InstanceServiceStatus.instance_id)
+        query = query.filter_by(**conditions)
+        if marker:
+            query = query.filter(cls.id > marker)
+        rows = query.order_by(cls.id).limit(limit + 1).all()
+        next_marker = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_marker = rows[-1][0].id
+        db_infos = [db_info for db_info, status in rows]
+        statuses = dict((db_info.id, status) for db_info, status in rows)
+        return db_infos, statuses, next_marker
+
+    @classmethod
+    def find_all_by_compute_ids(cls, compute_instance_ids):
+        """Loads the instances of the given servers with their statuses.
+
+        Returns (instance, service status) tuples keyed by compute instance
+        id; the status is None for an instance without one. Servers without
+        an instance are left out, and a live instance is preferred over a
+        deleted one of the same server.
+
+        """
+        found = {}
+        max_ids = InstanceServiceStatus.MAX_IDS_PER_QUERY
+        for start in range(0, len(compute_instance_ids), max_ids):
+            chunk = compute_instance_ids[start:start + max_ids]
+            query = cls.query().add_entity(InstanceServiceStatus)
+            query = query.outerjoin(
+                InstanceServiceStatus,
+                cls.id == InstanceServiceStatus.instance_id)
+            query = query.filter(cls.compute_instance_id.in_(chunk))
+            for db_info, status in query:
+                server_id = db_info.compute_instance_id
+                if server_id not in found or not db_info.deleted:
+                    found[server_id] = (db_info, status)
+        return found
+
 
 class ServiceImage(dbmodels.DatabaseModelBase):
     """Defines the status of the service being run."""
@@ -733,6 +897,50 @@ class InstanceServiceStatus(dbmodels.DatabaseModelBase):
 
     status = property(get_status, set_status)
 
+    # Keeps IN clauses below the bound variable limits of the backends.
+    MAX_IDS_PER_QUERY = 500
+
+    @classmethod
+    def find_all_by_instance_ids(cls, instance_ids):
+        """Returns the statuses of the given instances keyed by instance id.
+
+        The statuses are fetched with one query per MAX_IDS_PER_QUERY ids
+        rather than one query per instance.
+
+        """
+        statuses = {}
+        for start in range(0, len(instance_ids), cls.MAX_IDS_PER_QUERY):
+            chunk = instance_ids[start:start + cls.MAX_IDS_PER_QUERY]
+            query = cls.query().filter(cls.instance_id.in_(chunk))
+            statuses.update((status.instance_id, status) for status in query)
+        return statuses
+
+    @classmethod
+    def update_all_statuses(cls, statuses):
+        """Sets the status of many instances at once.
+
+        Takes a dict of ServiceStatus keyed by instance id and issues one
+        UPDATE per distinct status and MAX_IDS_PER_QUERY instances. Rows
+        which already hold the status are left untouched. Returns the
+        number of rows changed.
+
+        """
+        by_code = {}
+        for instance_id, status in statuses.items():
+            by_code.setdefault(status.code, []).append(instance_id)
+        changed = 0
+        for code, instance_ids in by_code.items():
+            status = ServiceStatus.from_code(code)
+            values = {'status_id': status.code,
+                      'status_description': status.description,
+                      'updated_at': utils.utcnow()}
+            for start in range(0, len(instance_ids), cls.MAX_IDS_PER_QUERY):
+                chunk = instance_ids[start:start + cls.MAX_IDS_PER_QUERY]
+                query = cls.query().filter(cls.instance_id.in_(chunk))
+                query = query.filter(cls.status_id != status.code)
+                changed += query.update(values, synchronize_session=False)
+        return changed
+
 
 def persisted_models():
     return {
@@ -141,8 +141,12 @@ class InstanceController(wsgi.Controller):
         LOG.info(_("Indexing backups for instance '%s'") %
                  id)
 
-        backups = backup_model.list_for_instance(id)
-        return wsgi.Result(backup_views.BackupViews(backups).data(), 200)
+        context = req.environ[wsgi.CONTEXT_KEY]
+        backups, marker = backup_model.list_for_instance(context, id)
+        view = backup_views.BackupViews(backups)
+        paged = pagination.SimplePaginatedDataView(req.url, 'backups', view,
+                                                   marker)
+        return wsgi.Result(paged.data(), 200)
 
     def show(self, req, tenant_id, id):
         """Return a single instance."""
@@ -174,37 +178,62 @@ class InstanceController(wsgi.Controller):
         LOG.info(_("req : '%s'\n\n") % req)
         LOG.info(_("body : '%s'\n\n") % body)
         context = req.environ[wsgi.CONTEXT_KEY]
+        instance = models.Instance.create(
+            context, **self._create_args(body['instance']))
+
+        view = views.InstanceDetailView(instance, req=req)
+        return wsgi.Result(view.data(), 200)
+
+    def batch(self, req, body, tenant_id):
+        """Creates several instances at once, under a single quota check."""
+        LOG.info(_("Creating %(count)s database instances for tenant "
+                   "'%(tenant_id)s'") % {'count': len(body['instances']),
+                                         'tenant_id': tenant_id})
+        LOG.info(_("req : '%s'\n\n") % req)
+        context = req.environ[wsgi.CONTEXT_KEY]
+        if len(body['instances']) > CONF.instance_batch_max_size:
+            raise exception.BadRequest(
+                msg=_("At most %s instances can be created at once.")
+                % CONF.instance_batch_max_size)
+        instances = models.Instance.create_batch(
+            context, [self._create_args(instance_body)
+                      for instance_body in body['instances']])
+
+        data = [views.InstanceDetailView(instance, req=req).data()['instance']
+                for instance in instances]
+        return wsgi.Result({'instances': data}, 200)
+
+    @staticmethod
+    def _create_args(instance_body):
+        """Returns the arguments of Instance.create for a request body."""
         # Set the service type to mysql if its not in the request
-        service_type = (body['instance'].get('service_type') or
+        service_type = (instance_body.get('service_type') or
                         CONF.service_type)
         service = models.ServiceImage.find_by(service_name=service_type)
         image_id = service['image_id']
-        name = body['instance']['name']
-        flavor_ref = body['instance']['flavorRef']
+        name = instance_body['name']
+        flavor_ref = instance_body['flavorRef']
         flavor_id = utils.get_id_from_href(flavor_ref)
         databases = populate_validated_databases(
-            body['instance'].get('databases', []))
+            instance_body.get('databases', []))
         users = None
         try:
-            users = populate_users(body['instance'].get('users', []))
+            users = populate_users(instance_body.get('users', []))
         except ValueError as ve:
             raise exception.BadRequest(msg=ve)
 
-        if 'volume' in body['instance']:
-            volume_size = int(body['instance']['volume']['size'])
+        if 'volume' in instance_body:
+            volume_size = int(instance_body['volume']['size'])
         else:
             volume_size = None
 
-        if 'restorePoint' in body['instance']:
-            backupRef = body['instance']['restorePoint']['backupRef']
+        if 'restorePoint' in instance_body:
+            backupRef = instance_body['restorePoint']['backupRef']
             backup_id = utils.get_id_from_href(backupRef)
         else:
             backup_id = None
 
-        instance = models.Instance.create(context, name, flavor_id,
-                                          image_id, databases, users,
-                                          service_type, volume_size,
-                                          backup_id)
-
-        view = views.InstanceDetailView(instance, req=req)
-        return wsgi.Result(view.data(), 200)
+        return {'name': name, 'flavor_id': flavor_id, 'image_id': image_id,
+                'databases': databases, 'users': users,
+                'service_type': service_type, 'volume_size': volume_size,
+                'backup_id': backup_id}
@@ -79,6 +79,9 @@ class InstanceTasks(object):
     BUILDING_ERROR_VOLUME = InstanceTask(0x52, 'BUILDING',
                                          'Build error: Volume.',
                                          is_error=True)
+    BUILDING_ERROR_SEC_GROUP = InstanceTask(0x53, 'BUILDING',
+                                            'Build error: Security group.',
+                                            is_error=True)
 
 
 # Dissuade further additions at run-time.
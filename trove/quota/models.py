@@ -60,7 +60,8 @@ class Reservation(dbmodels.DatabaseModelBase):
     Statuses = enum(NEW='New',
                     RESERVED='Reserved',
                     COMMITTED='Committed',
-                    ROLLEDBACK='Rolled Back')
+                    ROLLEDBACK='Rolled Back',
+                    EXPIRED='Expired')
 
 
 def persisted_models():
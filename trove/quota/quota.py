@@ -17,10 +17,15 @@
 
 """Quotas for DB instances and resources."""
 
+import datetime
+import time
+
 from trove.openstack.common import log as logging
 from trove.openstack.common.gettextutils import _
 from oslo.config import cfg
 from trove.common import exception
+from trove.common import utils
+from trove.db import get_db_api
 from trove.openstack.common import importutils
 from trove.quota.models import Quota
 from trove.quota.models import QuotaUsage
@@ -30,6 +35,47 @@ from trove.quota.models import Resource
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
+QUOTA_CACHE_SIZE = 10000
+EXPIRE_BATCH_SIZE = 500
+
+
+class QuotaCache(object):
+    """Keeps the quotas of the tenants seen lately for ttl seconds.
+
+    The quotas of a tenant carry a version, bumped when they are
+    invalidated, so quotas loaded while they were being updated are
+    not kept. Other processes see an update once their copy expires.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._versions = {}
+
+    def get(self, tenant_id, load):
+        now = time.time()
+        entry = self._entries.get(tenant_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        version = self._versions.get(tenant_id, 0)
+        quotas = load(tenant_id)
+        if self.ttl > 0 and self._versions.get(tenant_id, 0) == version:
+            if len(self._entries) >= QUOTA_CACHE_SIZE:
+                self._prune(now)
+            self._entries[tenant_id] = (now + self.ttl, quotas)
+        return quotas
+
+    def invalidate(self, tenant_id):
+        self._entries.pop(tenant_id, None)
+        self._versions[tenant_id] = self._versions.get(tenant_id, 0) + 1
+
+    def _prune(self, now):
+        for tenant_id, entry in self._entries.items():
+            if entry[0] <= now:
+                del self._entries[tenant_id]
+        if len(self._entries) >= QUOTA_CACHE_SIZE:
+            self._entries.clear()
+
 
 class DbQuotaDriver(object):
     """
@@ -40,6 +86,7 @@ class DbQuotaDriver(object):
 
     def __init__(self, resources):
         self.resources = resources
+        self.cache = QuotaCache(CONF.quota_cache_ttl)
 
     def get_quota_by_tenant(self, tenant_id, resource):
         """Get a specific quota by tenant."""
@@ -58,10 +105,10 @@ class DbQuotaDriver(object):
         :param tenant_id: The ID of the tenant to return quotas for.
         """
 
-        all_quotas = Quota.find_all(tenant_id=tenant_id).all()
-        result_quotas = dict((quota.resource, quota)
-                             for quota in all_quotas
-                             if quota.resource in resources)
+        all_quotas = self.cache.get(tenant_id, self._load_quotas)
+        result_quotas = dict((resource, quota)
+                             for resource, quota in all_quotas.items()
+                             if resource in resources)
 
         if len(result_quotas) != len(resources):
             for resource in resources:
@@ -74,6 +121,14 @@ class DbQuotaDriver(object):
 
         return result_quotas
 
+    def _load_quotas(self, tenant_id):
+        return dict((quota.resource, quota)
+                    for quota in Quota.find_all(tenant_id=tenant_id).all())
+
+    def invalidate_quotas(self, tenant_id):
+        """Forgets the cached quotas of a tenant after they changed."""
+        self.cache.invalidate(tenant_id)
+
     def get_quota_usage_by_tenant(self, tenant_id, resource):
         """Get a specific quota usage by tenant."""
 
@@ -145,9 +200,22 @@ class DbQuotaDriver(object):
                                                  unregistered_resources)
 
         quotas = self.get_all_quotas_by_tenant(tenant_id, deltas.keys())
-        quota_usages = self.get_all_quota_usages_by_tenant(tenant_id,
-                                                           deltas.keys())
 
+        # The usage rows stay locked until the reservations are saved,
+        # so concurrent requests of the tenant cannot both pass the check.
+        db_api = get_db_api()
+        while True:
+            with db_api.transaction() as db_session:
+                quota_usages = self._lock_quota_usages(
+                    db_session, tenant_id=tenant_id, resource=deltas.keys())
+                missing = [resource for resource in deltas
+                           if resource not in quota_usages]
+                if not missing:
+                    return self._reserve(db_session, quotas, quota_usages,
+                                         deltas)
+            self._create_quota_usages(tenant_id, missing)
+
+    def _reserve(self, db_session, quotas, quota_usages, deltas):
         overs = [resource for resource in deltas
                  if (int(deltas[resource]) > 0 and
                     (quota_usages[resource].in_use +
@@ -159,17 +227,33 @@ class DbQuotaDriver(object):
 
         reservations = []
         for resource in deltas:
-            reserved = deltas[resource]
+            delta = int(deltas[resource])
             usage = quota_usages[resource]
-            usage.reserved = reserved
-            usage.save()
+            if delta > 0:
+                usage.reserved += delta
+                usage.updated = utils.utcnow()
+            reservations.append(Reservation.new(
+                usage_id=usage.id,
+                delta=delta,
+                status=Reservation.Statuses.RESERVED))
+        db_session.add_all(reservations)
+        return reservations
 
-            resv = Reservation.create(usage_id=usage.id,
-                                      delta=usage.reserved,
-                                      status=Reservation.Statuses.RESERVED)
-            reservations.append(resv)
+    def _lock_quota_usages(self, db_session, **conditions):
+        usages = get_db_api().find_all_for_update(db_session, QuotaUsage,
+                                                  **conditions)
+        return dict((usage.resource, usage) for usage in usages)
 
-        return reservations
+    def _create_quota_usages(self, tenant_id, resources):
+        for resource in resources:
+            try:
+                QuotaUsage.create(tenant_id=tenant_id,
+                                  in_use=0,
+                                  reserved=0,
+                                  resource=resource)
+            except exception.DBConstraintError:
+                # A concurrent request of the tenant created it first.
+                pass
 
     def commit(self, reservations):
         """Commit reservations.
@@ -178,13 +262,7 @@ class DbQuotaDriver(object):
                              returned by the reserve() method.
         """
 
-        for reservation in reservations:
-            usage = QuotaUsage.find_by(id=reservation.usage_id)
-            usage.in_use += reservation.delta
-            usage.reserved -= reservation.delta
-            reservation.status = Reservation.Statuses.COMMITTED
-            usage.save()
-            reservation.save()
+        self._finish(reservations, Reservation.Statuses.COMMITTED)
 
     def rollback(self, reservations):
         """Roll back reservations.
@@ -193,12 +271,65 @@ class DbQuotaDriver(object):
                              returned by the reserve() method.
         """
 
-        for reservation in reservations:
-            usage = QuotaUsage.find_by(id=reservation.usage_id)
-            usage.reserved -= reservation.delta
-            reservation.status = Reservation.Statuses.ROLLEDBACK
-            usage.save()
-            reservation.save()
+        self._finish(reservations, Reservation.Statuses.ROLLEDBACK)
+
+    def _finish(self, reservations, status):
+        """Moves the reservations out of the usages in one transaction.
+
+        Reservations which are no longer reserved, because they expired
+        in the meantime, are left alone. Returns how many were finished.
+        """
+        if not reservations:
+            return 0
+        db_api = get_db_api()
+        with db_api.transaction() as db_session:
+            usage_ids = set(reservation.usage_id
+                            for reservation in reservations)
+            usages = dict((usage.id, usage) for usage in
+                          db_api.find_all_for_update(db_session, QuotaUsage,
+                                                     id=usage_ids))
+            reserved = set(reservation.id for reservation in
+                           db_api.find_all_for_update(
+                               db_session, Reservation,
+                               id=[r.id for r in reservations],
+                               status=Reservation.Statuses.RESERVED))
+            now = utils.utcnow()
+            for reservation in reservations:
+                if reservation.id not in reserved:
+                    LOG.warn(_("Reservation %(id)s is no longer reserved, "
+                               "it cannot be %(status)s.")
+                             % {'id': reservation.id, 'status': status})
+                    continue
+                usage = usages[reservation.usage_id]
+                if reservation.delta > 0:
+                    usage.reserved -= reservation.delta
+                if status == Reservation.Statuses.COMMITTED:
+                    usage.in_use += reservation.delta
+                usage.updated = now
+                reservation.status = status
+                reservation.updated = now
+            if reserved:
+                db_api.update_all_in(db_session, Reservation,
+                                     {'id': list(reserved)},
+                                     {'status': status, 'updated': now})
+        return len(reserved)
+
+    def expire_reservations(self, before):
+        """Expires the reservations made before the given time.
+
+        They are left behind by requests which failed before committing
+        or rolling back their reservations.
+        """
+        expired = 0
+        while True:
+            reservations = (Reservation.query().
+                            filter_by(status=Reservation.Statuses.RESERVED).
+                            filter(Reservation.created < before).
+                            limit(EXPIRE_BATCH_SIZE).all())
+            expired += self._finish(reservations,
+                                    Reservation.Statuses.EXPIRED)
+            if len(reservations) < EXPIRE_BATCH_SIZE:
+                return expired
 
 
 class QuotaEngine(object):
@@ -302,6 +433,21 @@ class QuotaEngine(object):
             LOG.exception(_("Failed to roll back reservations "
                             "%(reservations)s") % locals())
 
+    def invalidate_quotas(self, tenant_id):
+        """Forgets the cached quotas of a tenant after they changed."""
+
+        self._driver.invalidate_quotas(tenant_id)
+
+    def expire_reservations(self):
+        """Expires the reservations older than reservation_expire."""
+
+        before = utils.utcnow() - datetime.timedelta(
+            seconds=CONF.reservation_expire)
+        expired = self._driver.expire_reservations(before)
+        if expired:
+            LOG.info(_("Expired %d quota reservations.") % expired)
+        return expired
+
     @property
     def resources(self):
         return sorted(self._resources.keys())
@@ -99,6 +99,16 @@ class API(ManagerAPI):
         LOG.debug("Making async call to delete backup: %s" % backup_id)
         self._cast("delete_backup", backup_id=backup_id)
 
+    def create_instances(self, instances):
+        LOG.debug("Making async call to create %s instances" % len(instances))
+        self._cast("create_instances", instances=instances)
+
+    def instance_status_changed(self, instance_ids):
+        LOG.debug("Telling the task managers about status changes of %s "
+                  "instances." % len(instance_ids))
+        self._fanout_cast("instance_status_changed",
+                          instance_ids=instance_ids)
+
     def create_instance(self, instance_id, name, flavor_id, flavor_ram,
                         image_id, databases, users, service_type,
                         volume_size, security_groups, backup_id=None):
@@ -0,0 +1,112 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Wakes up the tasks waiting on an instance when something reports a change.
+
+Tasks wait on the trove instance id for guest status changes and on the
+compute server id for compute notifications. A task is woken up as soon
+as one of its ids is notified; polling only remains as a slow fallback
+for the sources which are enabled in task_event_sources.
+"""
+
+import time
+
+from eventlet import queue
+
+from trove.common import cfg
+from trove.common.exception import PollTimeOut
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+GUEST = 'guest'
+COMPUTE = 'compute'
+
+_waiters = {}
+
+
+def notify(key):
+    """Wakes up every task waiting on the given id."""
+    for waiter in _waiters.get(key, ()):
+        waiter.put(key)
+
+
+def notify_all(keys):
+    for key in keys:
+        notify(key)
+
+
+def waiting():
+    """Returns the number of ids tasks are waiting on."""
+    return len(_waiters)
+
+
+def _register(keys, waiter):
+    for key in keys:
+        _waiters.setdefault(key, set()).add(waiter)
+
+
+def _unregister(keys, waiter):
+    for key in keys:
+        waiters = _waiters.get(key)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del _waiters[key]
+
+
+def wait_until(retriever, condition=lambda value: value, instance_id=None,
+               server_id=None, sleep_time=1, time_out=None):
+    """Retrieves object until it passes condition, then returns it.
+
+    Works like utils.poll_until, but the object is retrieved again as
+    soon as the instance or server is notified. When either will be,
+    the object is only polled every task_wait_fallback_interval seconds
+    in between.
+
+    """
+    keys = []
+    if instance_id and GUEST in CONF.task_event_sources:
+        keys.append(instance_id)
+    if server_id and COMPUTE in CONF.task_event_sources:
+        keys.append(server_id)
+    if keys:
+        sleep_time = max(sleep_time, CONF.task_wait_fallback_interval)
+
+    waiter = queue.LightQueue()
+    _register(keys, waiter)
+    try:
+        start_time = time.time()
+        while True:
+            obj = retriever()
+            if condition(obj):
+                return obj
+            timeout = sleep_time
+            if time_out is not None:
+                remaining = start_time + time_out - time.time()
+                if remaining <= 0:
+                    raise PollTimeOut
+                timeout = min(timeout, remaining)
+            try:
+                key = waiter.get(timeout=timeout)
+                LOG.debug("Woken up by a change of %s." % key)
+            except queue.Empty:
+                pass
+            # Changes reported meanwhile are covered by the next retrieve.
+            while not waiter.empty():
+                waiter.get_nowait()
+    finally:
+        _unregister(keys, waiter)
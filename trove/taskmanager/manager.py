@@ -14,6 +14,8 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import eventlet
+
 from trove.common.context import TroveContext
 
 import trove.extensions.mgmt.instances.models as mgmtmodels
@@ -22,8 +24,13 @@ from trove.common import exception
 from trove.openstack.common import log as logging
 from trove.openstack.common import importutils
 from trove.openstack.common import periodic_task
+from trove.openstack.common.gettextutils import _
+from trove.quota.quota import QUOTAS
+from trove.taskmanager import events
 from trove.taskmanager import models
+from trove.taskmanager import scheduler
 from trove.taskmanager.models import FreshInstanceTasks
+from trove.taskmanager.scheduler import scheduled
 
 LOG = logging.getLogger(__name__)
 RPC_API_VERSION = "1.0"
@@ -43,28 +50,58 @@ class Manager(periodic_task.PeriodicTasks):
                 CONF.exists_notification_transformer,
                 context=self.admin_context)
 
+    def initialize_service_hook(self, service):
+        if events.COMPUTE in CONF.task_event_sources:
+            # Each task manager needs every notification, so each one
+            # gets a pool of its own.
+            service.conn.join_consumer_pool(
+                self._compute_notification,
+                self._notification_pool(service.host),
+                CONF.nova_notification_topic,
+                CONF.nova_notification_exchange)
+
+    @staticmethod
+    def _notification_pool(host):
+        # Must differ from the '<topic>.<host>' queue of the RPC service.
+        return '%s.notifications.%s' % (CONF.taskmanager_queue, host)
+
+    def _compute_notification(self, message):
+        if message.get('event_type', '').startswith('compute.instance.'):
+            server_id = message.get('payload', {}).get('instance_id')
+            if server_id:
+                events.notify(server_id)
+
+    def instance_status_changed(self, context, instance_ids):
+        events.notify_all(instance_ids)
+
+    @scheduled
     def resize_volume(self, context, instance_id, new_size):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
         instance_tasks.resize_volume(new_size)
 
+    @scheduled
     def resize_flavor(self, context, instance_id, new_flavor_id,
                       old_memory_size, new_memory_size):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
         instance_tasks.resize_flavor(new_flavor_id, old_memory_size,
                                      new_memory_size)
 
+    @scheduled
     def reboot(self, context, instance_id):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
         instance_tasks.reboot()
 
+    @scheduled
     def restart(self, context, instance_id):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
         instance_tasks.restart()
 
+    @scheduled
     def migrate(self, context, instance_id):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
         instance_tasks.migrate()
 
+    @scheduled
     def delete_instance(self, context, instance_id):
         try:
             instance_tasks = models.BuiltInstanceTasks.load(context,
@@ -75,13 +112,16 @@ class Manager(periodic_task.PeriodicTasks):
                                                             instance_id)
             instance_tasks.delete_async()
 
+    @scheduled
     def delete_backup(self, context, backup_id):
         models.BackupTasks.delete_backup(context, backup_id)
 
+    @scheduled
     def create_backup(self, context, backup_id, instance_id):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
         instance_tasks.create_backup(backup_id)
 
+    @scheduled
     def create_instance(self, context, instance_id, name, flavor_id,
                         flavor_ram, image_id, databases, users, service_type,
                         volume_size, security_groups, backup_id):
@@ -91,6 +131,34 @@ class Manager(periodic_task.PeriodicTasks):
                                        volume_size, security_groups,
                                        backup_id)
 
+    def create_instances(self, context, instances):
+        """Starts the builds of a batch of instances side by side."""
+        for instance in instances:
+            eventlet.spawn_n(self._create_instance_in_batch, context,
+                             instance)
+
+    def _create_instance_in_batch(self, context, instance):
+        try:
+            self.create_instance(context, **instance)
+        except Exception:
+            LOG.exception(_("Error creating instance %s.")
+                          % instance['instance_id'])
+
+    def get_task_stats(self, context):
+        task_scheduler = scheduler.get_scheduler()
+        return task_scheduler.stats() if task_scheduler else {}
+
+    @periodic_task.periodic_task(ticks_between_runs=CONF.task_stats_ticks)
+    def log_task_stats(self, context):
+        task_scheduler = scheduler.get_scheduler()
+        if task_scheduler is not None:
+            LOG.info(_("Task queues: %s") % task_scheduler.stats())
+
+    @periodic_task.periodic_task(
+        ticks_between_runs=CONF.reservation_expire_ticks)
+    def expire_quota_reservations(self, context):
+        QUOTAS.expire_reservations()
+
     if CONF.exists_notification_transformer:
         @periodic_task.periodic_task(
             ticks_between_runs=CONF.exists_notification_ticks)
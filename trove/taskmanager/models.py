@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
 import traceback
 
 from eventlet import greenthread
@@ -26,8 +27,8 @@ from trove.common.exception import TroveError
 from trove.common.remote import create_dns_client
 from trove.common.remote import create_nova_client
 from trove.common.remote import create_nova_volume_client
+from trove.extensions.security_group.models import SecurityGroup
 from swiftclient.client import ClientException
-from trove.common.utils import poll_until
 from trove.instance import models as inst_models
 from trove.instance.models import BuiltInstance
 from trove.instance.models import FreshInstance
@@ -35,8 +36,11 @@ from trove.instance.models import InstanceStatus
 from trove.instance.models import InstanceServiceStatus
 from trove.instance.models import ServiceStatuses
 from trove.instance.views import get_ip_address
+from trove.taskmanager import events
+from trove.taskmanager.steps import StepGraph
 from trove.openstack.common import log as logging
 from trove.openstack.common.gettextutils import _
+from trove.openstack.common import jsonutils
 from trove.openstack.common.notifier import api as notifier
 from trove.openstack.common import timeutils
 import trove.common.remote as remote
@@ -115,30 +119,43 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin):
     def create_instance(self, flavor_id, flavor_ram, image_id,
                         databases, users, service_type, volume_size,
                         security_groups, backup_id):
+        # The security group and the volume do not depend on each other.
+        # The guest is only prepared once the DNS entry exists, so a DNS
+        # failure stops the build as it always has.
+        steps = StepGraph()
+        steps.add('security_groups',
+                  lambda done: self._create_security_groups(security_groups))
         if use_nova_server_volume:
-            server, volume_info = self._create_server_volume(
-                flavor_id,
-                image_id,
-                security_groups,
-                service_type,
-                volume_size)
+            steps.add('server',
+                      lambda done: self._create_server_volume(
+                          flavor_id,
+                          image_id,
+                          done['security_groups'],
+                          service_type,
+                          volume_size),
+                      requires=['security_groups'])
         else:
-            server, volume_info = self._create_server_volume_individually(
-                flavor_id,
-                image_id,
-                security_groups,
-                service_type,
-                volume_size)
+            steps.add('volume',
+                      lambda done: self._build_volume_info(volume_size))
+            steps.add('server',
+                      lambda done: self._create_server_volume_individually(
+                          flavor_id,
+                          image_id,
+                          done['security_groups'],
+                          service_type,
+                          done['volume']),
+                      requires=['security_groups', 'volume'])
+        steps.add('dns', lambda done: self._create_dns_entry_or_fail(),
+                  requires=['server'])
+        steps.add('guest_prepare',
+                  lambda done: self._guest_prepare(
+                      done['server'][0], flavor_ram, done['server'][1],
+                      databases, users, backup_id),
+                  requires=['server', 'dns'])
         try:
-            self._create_dns_entry()
-        except Exception as e:
-            msg = "Error creating DNS entry for instance: %s" % self.id
-            err = inst_models.InstanceTasks.BUILDING_ERROR_DNS
-            self._log_and_raise(e, msg, err)
-
-        if server:
-            self._guest_prepare(server, flavor_ram, volume_info,
-                                databases, users, backup_id)
+            steps.run()
+        finally:
+            self._record_build_timings(steps.timings)
 
         if not self.db_info.task_status.is_error:
             self.update_db(task_status=inst_models.InstanceTasks.NONE)
@@ -146,10 +163,15 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin):
         # Make sure the service becomes active before sending a usage
         # record to avoid over billing a customer for an instance that
         # fails to build properly.
+        start = time.time()
         try:
-            utils.poll_until(self._service_is_active,
-                             sleep_time=USAGE_SLEEP_TIME,
-                             time_out=USAGE_TIMEOUT)
+            events.wait_until(self._service_is_active,
+                              instance_id=self.id,
+                              server_id=self.db_info.compute_instance_id,
+                              sleep_time=USAGE_SLEEP_TIME,
+                              time_out=USAGE_TIMEOUT)
+            steps.timings['service_active'] = round(time.time() - start, 3)
+            self._record_build_timings(steps.timings)
             self.send_usage_event('create', instance_size=flavor_ram)
         except PollTimeOut:
             LOG.error("Timeout for service changing to active. "
@@ -157,11 +179,39 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin):
         except Exception:
             LOG.exception("Error during create-event call.")
 
+    def _record_build_timings(self, timings):
+        """Saves the seconds each build step took on the instance."""
+        LOG.debug("Build steps of instance %s took %s." % (self.id, timings))
+        self.update_db(build_timings=jsonutils.dumps(timings))
+
+    def _create_security_groups(self, security_groups):
+        """Creates the security group of the instance unless given one."""
+        if security_groups is not None:
+            return security_groups
+        if not CONF.trove_security_groups_support:
+            return None
+        try:
+            security_group = SecurityGroup.create_for_instance(self.id,
+                                                               self.context)
+        except Exception as e:
+            msg = "Error creating security group for instance: %s" % self.id
+            err = inst_models.InstanceTasks.BUILDING_ERROR_SEC_GROUP
+            self._log_and_raise(e, msg, err)
+        return [security_group["name"]]
+
+    def _create_dns_entry_or_fail(self):
+        try:
+            self._create_dns_entry()
+        except Exception as e:
+            msg = "Error creating DNS entry for instance: %s" % self.id
+            err = inst_models.InstanceTasks.BUILDING_ERROR_DNS
+            self._log_and_raise(e, msg, err)
+
     def _service_is_active(self):
         """
         Check that the database guest is active.
 
-        This function is meant to be called with poll_until to check that
+        This function is meant to be called with wait_until to check that
         the guest is alive before sending a 'create' message. This prevents
         over billing a customer for a instance that they can never use.
 
@@ -224,9 +274,8 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin):
 
     def _create_server_volume_individually(self, flavor_id, image_id,
                                            security_groups, service_type,
-                                           volume_size):
+                                           volume_info):
         server = None
-        volume_info = self._build_volume_info(volume_size)
         block_device_mapping = volume_info['block_device']
         try:
             server = self._create_server(flavor_id, image_id, security_groups,
@@ -366,8 +415,9 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin):
                             "server had status (%s).")
                     LOG.error(msg % (self.id, server.status))
                     raise TroveError(status=server.status)
-            poll_until(get_server, ip_is_available,
-                       sleep_time=1, time_out=DNS_TIME_OUT)
+            events.wait_until(get_server, ip_is_available,
+                              server_id=self.db_info.compute_instance_id,
+                              sleep_time=1, time_out=DNS_TIME_OUT)
             server = nova_client.servers.get(self.db_info.compute_instance_id)
             LOG.info("Creating dns entry...")
             dns_client.create_instance_entry(self.id,
@@ -422,8 +472,9 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin):
             except nova_exceptions.NotFound:
                 return True
 
-        poll_until(server_is_finished, sleep_time=2,
-                   time_out=CONF.server_delete_time_out)
+        events.wait_until(server_is_finished, server_id=server_id,
+                          sleep_time=2,
+                          time_out=CONF.server_delete_time_out)
         self.send_usage_event('delete', deleted_at=timeutils.isotime(),
                               server=old_server)
 
@@ -487,8 +538,9 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin):
             def update_server_info():
                 self._refresh_compute_server_info()
                 return self.server.status == 'ACTIVE'
-            utils.poll_until(
+            events.wait_until(
                 update_server_info,
+                server_id=self.server.id,
                 sleep_time=2,
                 time_out=reboot_time_out)
 
@@ -576,8 +628,9 @@ class ResizeActionBase(object):
         self.instance._set_service_status_to_paused()
         # Now we wait until it sets it to anything at all,
         # so we know it's alive.
-        utils.poll_until(
+        events.wait_until(
             self._guest_is_awake,
+            instance_id=self.instance.id,
             sleep_time=2,
             time_out=RESIZE_TIME_OUT)
 
@@ -674,8 +727,9 @@ class ResizeActionBase(object):
         def update_server_info():
             self.instance._refresh_compute_server_info()
             return self.instance.server.status != 'RESIZE'
-        utils.poll_until(
+        events.wait_until(
             update_server_info,
+            server_id=self.instance.server.id,
             sleep_time=2,
             time_out=RESIZE_TIME_OUT)
 
@@ -684,8 +738,9 @@ class ResizeActionBase(object):
         def update_server_info():
             self.instance._refresh_compute_server_info()
             return self.instance.server.status == 'ACTIVE'
-        utils.poll_until(
+        events.wait_until(
             update_server_info,
+            server_id=self.instance.server.id,
             sleep_time=2,
             time_out=REVERT_TIME_OUT)
 
@@ -0,0 +1,218 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Limits how many tasks the task manager runs at once, fairly between tenants.
+
+Tasks are queued by operation type. The queues take turns in starting
+a task, and within a queue the tenants take turns, so neither a flood
+of one operation nor the instances of one tenant hold up the others.
+"""
+
+import collections
+import functools
+import time
+
+import eventlet
+
+from trove.common import cfg
+from trove.openstack.common import log as logging
+from trove.openstack.common.gettextutils import _
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+
+class Task(object):
+
+    def __init__(self, operation, tenant, func, args, kwargs):
+        self.operation = operation
+        self.tenant = tenant
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.queued_at = time.time()
+
+
+class OperationQueue(object):
+    """Queues the tasks of one operation, taken in turns by tenant."""
+
+    def __init__(self, name):
+        self.name = name
+        self.tenants = {}
+        # The tenants with queued tasks, in the order they take turns.
+        self.order = collections.deque()
+        self.depth = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def put(self, task):
+        if task.tenant not in self.tenants:
+            self.tenants[task.tenant] = collections.deque()
+            self.order.append(task.tenant)
+        self.tenants[task.tenant].append(task)
+        self.depth += 1
+
+    def take(self, can_run):
+        """Returns the next task of the first tenant allowed to run one.
+
+        The tenant then goes to the back of the line.
+        """
+        for tenant in self.order:
+            if can_run(tenant):
+                break
+        else:
+            return None
+        tasks = self.tenants[tenant]
+        task = tasks.popleft()
+        self.order.remove(tenant)
+        if tasks:
+            self.order.append(tenant)
+        else:
+            del self.tenants[tenant]
+        self.depth -= 1
+        return task
+
+    def stats(self):
+        finished = self.completed + self.failed
+        started = finished + self.running
+        return {'queued': self.depth,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'wait_seconds': self.total_wait / started if started else 0,
+                'max_wait_seconds': self.max_wait,
+                'run_seconds': self.total_run / finished if finished else 0}
+
+
+class TaskScheduler(object):
+    """Runs at most max_running tasks, max_per_tenant of them per tenant.
+
+    A limit of 0 means no limit.
+    """
+
+    def __init__(self, max_running=0, max_per_tenant=0):
+        self.max_running = max_running
+        self.max_per_tenant = max_per_tenant
+        self.queues = {}
+        # The operation names, in the order they take turns.
+        self.order = collections.deque()
+        self.running = 0
+        self.running_by_tenant = {}
+
+    def submit(self, operation, tenant, func, *args, **kwargs):
+        queue = self.queues.get(operation)
+        if queue is None:
+            queue = self.queues[operation] = OperationQueue(operation)
+            self.order.append(operation)
+        queue.put(Task(operation, tenant, func, args, kwargs))
+        LOG.debug("Queued %(operation)s for tenant %(tenant)s, %(depth)s "
+                  "waiting." % {'operation': operation, 'tenant': tenant,
+                                'depth': queue.depth})
+        self._dispatch()
+
+    def _can_run(self, tenant):
+        return (not self.max_per_tenant or
+                self.running_by_tenant.get(tenant, 0) < self.max_per_tenant)
+
+    def _next_task(self):
+        for name in self.order:
+            task = self.queues[name].take(self._can_run)
+            if task is not None:
+                break
+        else:
+            return None
+        # The other operations get the next turns.
+        self.order.remove(name)
+        self.order.append(name)
+        return task
+
+    def _dispatch(self):
+        while not self.max_running or self.running < self.max_running:
+            task = self._next_task()
+            if task is None:
+                return
+            self._start(task)
+
+    def _start(self, task):
+        queue = self.queues[task.operation]
+        wait = time.time() - task.queued_at
+        queue.total_wait += wait
+        queue.max_wait = max(queue.max_wait, wait)
+        queue.running += 1
+        self.running += 1
+        self.running_by_tenant[task.tenant] = (
+            self.running_by_tenant.get(task.tenant, 0) + 1)
+        eventlet.spawn_n(self._run, task, queue)
+
+    def _run(self, task, queue):
+        start = time.time()
+        try:
+            task.func(*task.args, **task.kwargs)
+            queue.completed += 1
+        except Exception:
+            LOG.exception(_("Task %(operation)s of tenant %(tenant)s "
+                            "failed.") % {'operation': task.operation,
+                                          'tenant': task.tenant})
+            queue.failed += 1
+        finally:
+            queue.total_run += time.time() - start
+            queue.running -= 1
+            self.running -= 1
+            self.running_by_tenant[task.tenant] -= 1
+            if not self.running_by_tenant[task.tenant]:
+                del self.running_by_tenant[task.tenant]
+            self._dispatch()
+
+    def stats(self):
+        operations = dict((name, queue.stats())
+                          for name, queue in self.queues.items())
+        return {'running': self.running,
+                'queued': sum(queue.depth for queue in self.queues.values()),
+                'tenants_running': len(self.running_by_tenant),
+                'operations': operations}
+
+
+_SCHEDULER = None
+
+
+def get_scheduler():
+    """Returns the scheduler, or None when no task limit is set."""
+    global _SCHEDULER
+    if _SCHEDULER is None and (CONF.task_max_running or
+                               CONF.task_max_running_per_tenant):
+        _SCHEDULER = TaskScheduler(CONF.task_max_running,
+                                   CONF.task_max_running_per_tenant)
+    return _SCHEDULER
+
+
+def scheduled(func):
+    """Runs a manager method through the scheduler, if there is one.
+
+    The method is queued under its own name for the tenant of the
+    context and the call returns at once.
+    """
+    @functools.wraps(func)
+    def wrapper(self, context, *args, **kwargs):
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return func(self, context, *args, **kwargs)
+        tenant = getattr(context, 'tenant', None)
+        scheduler.submit(func.__name__, tenant, func, self, context,
+                         *args, **kwargs)
+    return wrapper
@@ -0,0 +1,90 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Runs the steps of a task concurrently, as far as they depend on each other.
+"""
+
+import sys
+import time
+
+import eventlet
+from eventlet import queue
+
+from trove.common.exception import TroveError
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class Step(object):
+
+    def __init__(self, name, func, requires):
+        self.name = name
+        self.func = func
+        self.requires = requires
+
+
+class StepGraph(object):
+    """Starts each step as soon as the steps it requires are done.
+
+    A step is called with the dict of the results of the steps done so
+    far, keyed by step name. When a step fails, the steps still running
+    are allowed to finish, no other step is started and the first error
+    is raised. The seconds each step took are kept in timings.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.timings = {}
+
+    def add(self, name, func, requires=()):
+        self.steps.append(Step(name, func, requires))
+
+    def run(self):
+        results = {}
+        pending = list(self.steps)
+        running = set()
+        done = queue.LightQueue()
+        error = None
+        while pending or running:
+            if error is None:
+                for step in list(pending):
+                    if all(name in results for name in step.requires):
+                        pending.remove(step)
+                        running.add(step.name)
+                        eventlet.spawn_n(self._run_step, step, results, done)
+            if not running:
+                break
+            name, exc_info = done.get()
+            running.remove(name)
+            if exc_info is not None and error is None:
+                error = exc_info
+        if error is not None:
+            raise error[0], error[1], error[2]
+        if pending:
+            raise TroveError("Steps %s require steps which do not exist."
+                             % ", ".join(step.name for step in pending))
+        return results
+
+    def _run_step(self, step, results, done):
+        LOG.debug("Starting step %s." % step.name)
+        start = time.time()
+        try:
+            results[step.name] = step.func(results)
+            exc_info = None
+        except Exception:
+            exc_info = sys.exc_info()
+        self.timings[step.name] = round(time.time() - start, 3)
+        done.put((step.name, exc_info))
@@ -60,6 +60,9 @@ class FakeGuest(object):
             'threads': 2
         }
 
+    def get_restore_progress(self):
+        return None
+
     def update_guest(self):
         LOG.debug("Updating guest %s" % self.id)
         self.version += 1
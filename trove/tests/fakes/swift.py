@@ -20,6 +20,7 @@ import swiftclient
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import httplib
 import json
 import os
@@ -124,11 +125,19 @@ class FakeSwiftConnection(object):
         fake_object_body = os.urandom(1024 * 1024)
         return (fake_header, fake_object_body)
 
-    def put_object(self, container, name, reader):
+    def put_object(self, container, name, contents=None, **kwargs):
         LOG.debug("fake put_object(%s, %s)" % (container, name))
         if container == 'socket_error_on_put':
             raise socket.error(111, 'ECONNREFUSED')
-        return 'fake-md5-sum'
+        etag = hashlib.md5()
+        if hasattr(contents, 'read'):
+            chunk = contents.read(65536)
+            while chunk:
+                etag.update(chunk)
+                chunk = contents.read(65536)
+        elif contents:
+            etag.update(contents)
+        return etag.hexdigest()
 
     def delete_object(self, container, name):
         LOG.debug("fake delete_object(%s, %s)" % (container, name))
@@ -460,6 +460,22 @@ class LimiterTest(BaseLimitTestSuite):
         # Test user-specific limits.
         self.assertEqual(self.limiter.levels['user3'], [])
 
+    def test_limits_are_shared_by_users(self):
+        self.assertTrue(self.limiter.levels['user1'] is self.limiter.limits)
+        self.assertTrue('user1' not in self.limiter.levels)
+
+    def test_buckets_created_on_first_limited_request(self):
+        self.limiter.check_for_delay("GET", "/anything", "user1")
+        self.assertTrue('user1' not in self.limiter.buckets)
+        self.limiter.check_for_delay("PUT", "/anything", "user1")
+        self.assertEqual(len(TEST_LIMITS),
+                         len(self.limiter.buckets['user1']))
+
+    def test_limits_indexed_by_verb(self):
+        by_verb = self.limiter.limits.by_verb
+        self.assertEqual(['GET', 'POST', 'PUT'], sorted(by_verb))
+        self.assertEqual([(2, self.limiter.limits[2])], by_verb['PUT'])
+
     def test_multiple_users(self):
         # Tests involving multiple users.
         # User1
@@ -492,6 +508,96 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class SharedLimiterTest(LimiterTest):
+    """
+    Tests for the `limits.SharedLimiter` class with an in-memory store.
+    """
+
+    def update_limits(self, delay):
+        when(self.limiter)._get_time().thenReturn(delay)
+
+    def create_store(self):
+        return limits.MemoryLimiterStore()
+
+    def setUp(self):
+        """Run before each test."""
+        BaseLimitTestSuite.setUp(self)
+        self.store = self.create_store()
+        self.limiter = limits.SharedLimiter(TEST_LIMITS, store=self.store,
+                                            **{'user:user3': ''})
+        self.update_limits(0.0)
+
+    def test_workers_share_limits(self):
+        other = limits.SharedLimiter(TEST_LIMITS, store=self.store)
+        when(other)._get_time().thenReturn(0.0)
+        for limiter in [self.limiter, other] * 5:
+            self.assertEqual((None, None),
+                             limiter.check_for_delay("PUT", "/anything"))
+        self.assertEqual(6.0, other.check_for_delay("PUT", "/anything")[0])
+        self.assertEqual(6.0,
+                         self.limiter.check_for_delay("PUT", "/anything")[0])
+
+    def test_get_limits(self):
+        list(self._check(3, "PUT", "/anything"))
+        put = [l for l in self.limiter.get_limits() if l['verb'] == 'PUT']
+        self.assertEqual(7, put[0]['remaining'])
+
+
+class FakeRedisScript(object):
+    """Runs the limiter script of `RedisLimiterStore` like Redis would."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def __call__(self, keys, args):
+        self.redis.calls += 1
+        now = float(args[0])
+        results = []
+        for i, key in enumerate(keys):
+            capacity, request_value, hit = args[i * 3 + 1:i * 3 + 4]
+            water_level, last_request = self.redis.data.get(key, (0, None))
+            delay, water_level = limits.leak(water_level, last_request,
+                                             float(capacity),
+                                             float(request_value),
+                                             hit == '1', now)
+            if hit == '1' or last_request is not None:
+                self.redis.data[key] = (water_level, now)
+            results.append([repr(delay) if delay else '',
+                            repr(water_level)])
+        return results
+
+
+class FakeRedis(object):
+    """Local stand-in for a Redis client."""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = 0
+
+    def register_script(self, script):
+        return FakeRedisScript(self)
+
+
+class SharedRedisLimiterTest(SharedLimiterTest):
+    """
+    Tests for the `limits.SharedLimiter` class with a Redis store.
+    """
+
+    def create_store(self):
+        self.redis = FakeRedis()
+        return limits.RedisLimiterStore(self.redis)
+
+    def test_one_round_trip_per_check(self):
+        self.limiter.check_for_delay("PUT", "/anything")
+        self.limiter.get_limits()
+        self.assertEqual(1, self.redis.calls)
+
+    def test_keys_are_prefixed(self):
+        self.limiter.check_for_delay("PUT", "/anything", "user1")
+        self.assertTrue(all(key.startswith("trove:ratelimit:user1:")
+                            for key in self.redis.data))
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """
     Tests for `limits.WsgiLimiter` class.
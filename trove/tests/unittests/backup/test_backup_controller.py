@@ -41,3 +41,14 @@ class TestBackupController(TestCase):
         self.assertThat(errors[0].message,
                         Equals("'%s' does not match '%s'" %
                                (invalid_uuid, apischema.uuid['pattern'])))
+
+    def test_validate_create_incremental(self):
+        body = {"backup": {"instance": "d6338c9c-3cc8-4313-b98f-13cc0684cf15",
+                           "name": "testback-backup",
+                           "parent_id": "ead-edsa-e23-sdf-23"}}
+        controller = BackupController()
+        schema = controller.get_schema('create', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertFalse(validator.is_valid(body))
+        body['backup']['parent_id'] = "1e1b3f1a-c8a5-4c4b-8f7b-6a6d6d0f2d0b"
+        self.assertTrue(validator.is_valid(body))
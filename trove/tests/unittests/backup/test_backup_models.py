@@ -12,15 +12,20 @@
 #limitations under the License.
 
 
+import datetime
+
 import testtools
 from trove.backup import models
 from trove.tests.unittests.util import util
+from trove.common import cfg
 from trove.common import utils, exception
 from trove.common.context import TroveContext
 from trove.instance.models import BuiltInstance, InstanceTasks, Instance
 from mockito import mock, when, unstub, any
 from trove.taskmanager import api
 
+CONF = cfg.CONF
+
 
 def _prep_conf(current_time):
     current_time = str(current_time)
@@ -74,6 +79,73 @@ class BackupCreateTest(testtools.TestCase):
         self.assertEqual(self.instance_id, db_record['instance_id'])
         self.assertEqual(models.BackupState.NEW, db_record['state'])
 
+    def _create_parent(self, state=models.BackupState.COMPLETED,
+                       instance_id=None, to_lsn=1234):
+        return models.DBBackup.create(tenant_id=self.context.tenant,
+                                      name=BACKUP_NAME_2,
+                                      state=state,
+                                      instance_id=(instance_id or
+                                                   self.instance_id),
+                                      to_lsn=to_lsn,
+                                      deleted=False)
+
+    def test_create_incremental(self):
+        instance = mock(Instance)
+        when(BuiltInstance).load(any(), any()).thenReturn(instance)
+        when(instance).validate_can_perform_action().thenReturn(None)
+        when(models.Backup).verify_swift_auth_token(any()).thenReturn(
+            None)
+        when(api.API).create_backup(any()).thenReturn(None)
+        parent = self._create_parent()
+        self.created = True
+
+        bu = models.Backup.create(self.context, self.instance_id,
+                                  BACKUP_NAME, BACKUP_DESC,
+                                  parent_id=parent.id)
+
+        db_record = models.DBBackup.find_by(id=bu.id)
+        self.assertEqual(parent.id, db_record['parent_id'])
+        self.assertTrue(db_record.is_incremental)
+
+    def test_create_incremental_parent_not_completed(self):
+        instance = mock(Instance)
+        when(BuiltInstance).load(any(), any()).thenReturn(instance)
+        when(instance).validate_can_perform_action().thenReturn(None)
+        when(models.Backup).verify_swift_auth_token(any()).thenReturn(
+            None)
+        parent = self._create_parent(state=models.BackupState.BUILDING)
+        self.created = True
+
+        self.assertRaises(exception.UnprocessableEntity, models.Backup.create,
+                          self.context, self.instance_id,
+                          BACKUP_NAME, BACKUP_DESC, parent_id=parent.id)
+
+    def test_create_incremental_parent_of_other_instance(self):
+        instance = mock(Instance)
+        when(BuiltInstance).load(any(), any()).thenReturn(instance)
+        when(instance).validate_can_perform_action().thenReturn(None)
+        when(models.Backup).verify_swift_auth_token(any()).thenReturn(
+            None)
+        parent = self._create_parent(instance_id='OTHER-INSTANCE')
+        self.created = True
+
+        self.assertRaises(exception.UnprocessableEntity, models.Backup.create,
+                          self.context, self.instance_id,
+                          BACKUP_NAME, BACKUP_DESC, parent_id=parent.id)
+
+    def test_create_incremental_parent_without_lsn(self):
+        instance = mock(Instance)
+        when(BuiltInstance).load(any(), any()).thenReturn(instance)
+        when(instance).validate_can_perform_action().thenReturn(None)
+        when(models.Backup).verify_swift_auth_token(any()).thenReturn(
+            None)
+        parent = self._create_parent(to_lsn=None)
+        self.created = True
+
+        self.assertRaises(exception.UnprocessableEntity, models.Backup.create,
+                          self.context, self.instance_id,
+                          BACKUP_NAME, BACKUP_DESC, parent_id=parent.id)
+
     def test_create_instance_not_found(self):
         self.assertRaises(exception.NotFound, models.Backup.create,
                           self.context, self.instance_id,
@@ -150,8 +222,9 @@ class BackupORMTest(testtools.TestCase):
             models.DBBackup.find_by(tenant_id=self.context.tenant).delete()
 
     def test_list(self):
-        db_record = models.Backup.list(self.context)
-        self.assertEqual(1, db_record.count())
+        backups, marker = models.Backup.list(self.context)
+        self.assertEqual([self.backup.id], [b.id for b in backups])
+        self.assertEqual(None, marker)
 
     def test_list_for_instance(self):
         models.DBBackup.create(tenant_id=self.context.tenant,
@@ -159,8 +232,10 @@ class BackupORMTest(testtools.TestCase):
                                state=BACKUP_STATE,
                                instance_id=self.instance_id,
                                deleted=False)
-        db_record = models.Backup.list_for_instance(self.instance_id)
-        self.assertEqual(2, db_record.count())
+        backups, marker = models.Backup.list_for_instance(self.context,
+                                                          self.instance_id)
+        self.assertEqual(2, len(backups))
+        self.assertEqual(None, marker)
 
     def test_running(self):
         running = models.Backup.running(instance_id=self.instance_id)
@@ -194,8 +269,9 @@ class BackupORMTest(testtools.TestCase):
     def test_backup_delete(self):
         backup = models.DBBackup.find_by(id=self.backup.id)
         backup.delete()
-        query = models.Backup.list_for_instance(self.instance_id)
-        self.assertEqual(query.count(), 0)
+        backups, marker = models.Backup.list_for_instance(self.context,
+                                                          self.instance_id)
+        self.assertEqual([], backups)
 
     def test_delete(self):
         self.backup.delete()
@@ -208,3 +284,105 @@ class BackupORMTest(testtools.TestCase):
 
     def test_filename(self):
         self.assertEqual(BACKUP_FILENAME, self.backup.filename)
+
+    def test_chain(self):
+        incremental = models.DBBackup.create(tenant_id=self.context.tenant,
+                                             name=BACKUP_NAME_2,
+                                             state=BACKUP_STATE,
+                                             instance_id=self.instance_id,
+                                             parent_id=self.backup.id,
+                                             deleted=False)
+        second = models.DBBackup.create(tenant_id=self.context.tenant,
+                                        name=BACKUP_NAME_2,
+                                        state=BACKUP_STATE,
+                                        instance_id=self.instance_id,
+                                        parent_id=incremental.id,
+                                        deleted=False)
+        self.assertEqual([self.backup.id],
+                         [b.id for b in self.backup.chain()])
+        self.assertEqual([self.backup.id, incremental.id, second.id],
+                         [b.id for b in second.chain()])
+
+    def test_delete_parent_of_incremental(self):
+        self.backup.state = models.BackupState.COMPLETED
+        self.backup.save()
+        models.DBBackup.create(tenant_id=self.context.tenant,
+                               name=BACKUP_NAME_2,
+                               state=BACKUP_STATE,
+                               instance_id=self.instance_id,
+                               parent_id=self.backup.id,
+                               deleted=False)
+        self.assertRaises(exception.UnprocessableEntity,
+                          models.Backup.delete, self.context, self.backup.id)
+
+
+class BackupPaginationTest(testtools.TestCase):
+    def setUp(self):
+        super(BackupPaginationTest, self).setUp()
+        util.init_db()
+        self.context, self.instance_id = _prep_conf(utils.utcnow())
+        self.orig_page_size = CONF.backups_page_size
+        # Half of the backups share a creation time to check the id is
+        # used to order them.
+        created = utils.utcnow()
+        self.backups = []
+        for i in range(6):
+            backup = models.DBBackup.create(tenant_id=self.context.tenant,
+                                            name=BACKUP_NAME,
+                                            state=BACKUP_STATE,
+                                            instance_id=self.instance_id,
+                                            deleted=False)
+            backup.created = created - datetime.timedelta(seconds=i % 3)
+            backup.save()
+            self.backups.append(backup)
+        self.backups.sort(key=lambda b: (b.created, b.id), reverse=True)
+
+    def tearDown(self):
+        super(BackupPaginationTest, self).tearDown()
+        CONF.backups_page_size = self.orig_page_size
+
+    def _pages(self, list_page):
+        self.context.marker = None
+        pages = []
+        while True:
+            backups, marker = list_page()
+            pages.append([b.id for b in backups])
+            if marker is None:
+                return pages
+            self.assertEqual(pages[-1][-1], marker)
+            self.context.marker = marker
+
+    def _expected(self, size):
+        ids = [b.id for b in self.backups]
+        return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+    def test_list(self):
+        self.context.limit = 4
+        self.assertEqual(self._expected(4),
+                         self._pages(lambda: models.Backup.list(
+                             self.context)))
+
+    def test_list_for_instance(self):
+        self.context.limit = 2
+        self.assertEqual(self._expected(2),
+                         self._pages(lambda: models.Backup.list_for_instance(
+                             self.context, self.instance_id)))
+
+    def test_limit_is_capped_by_page_size(self):
+        CONF.backups_page_size = 3
+        self.context.limit = 10
+        backups, marker = models.Backup.list(self.context)
+        self.assertEqual(3, len(backups))
+
+    def test_deleted_marker(self):
+        self.context.limit = 2
+        backups, marker = models.Backup.list(self.context)
+        backups[-1].delete()
+        self.context.marker = marker
+        backups, marker = models.Backup.list(self.context)
+        self.assertEqual(self._expected(2)[1], [b.id for b in backups])
+
+    def test_marker_of_another_tenant(self):
+        other, instance_id = _prep_conf('other')
+        other.marker = self.backups[0].id
+        self.assertRaises(exception.BadRequest, models.Backup.list, other)
@@ -48,6 +48,24 @@ class MockBackup(BackupRunner):
         super(MockBackup, self).__init__(*args, **kwargs)
 
 
+class MockIncrementalBackup(MockBackup):
+    """Fake incremental backup ending at a known LSN."""
+
+    def __init__(self, *args, **kwargs):
+        self.lsn = kwargs['lsn']
+        super(MockIncrementalBackup, self).__init__(*args, **kwargs)
+
+    def metadata(self):
+        return {'lsn': 2000}
+
+
+class MockBrokenMetadataBackup(MockBackup):
+    """Fake backup whose log can't be read once it is saved."""
+
+    def metadata(self):
+        raise IOError("No such file or directory")
+
+
 class MockLossyBackup(MockBackup):
     """Fake Incomplete writes to swift"""
 
@@ -114,7 +132,7 @@ class MockStorage(Storage):
 
 class MockRestoreRunner(RestoreRunner):
 
-    def __init__(self, restore_stream, restore_location):
+    def __init__(self, restore_stream, **kwargs):
         pass
 
     def __enter__(self):
@@ -129,6 +147,14 @@ class MockRestoreRunner(RestoreRunner):
     def is_zipped(self):
         return False
 
+
+class MockChainRestoreRunner(MockRestoreRunner):
+
+    kwargs = None
+
+    def __init__(self, restore_stream, **kwargs):
+        MockChainRestoreRunner.kwargs = kwargs
+
 BACKUP_NS = 'trove.guestagent.strategies.backup'
 
 
@@ -143,6 +169,10 @@ class BackupAgentTest(testtools.TestCase):
     def tearDown(self):
         super(BackupAgentTest, self).tearDown()
         unstub()
+        # Stubbing save on a mock(DBBackup) stubs the DBBackup class, and
+        # unstub() then leaves the inherited save set to None on it.
+        if 'save' in DBBackup.__dict__:
+            del DBBackup.save
 
     def test_execute_backup(self):
         """This test should ensure backup agent
@@ -153,6 +183,7 @@ class BackupAgentTest(testtools.TestCase):
                 reports status
         """
         backup = mock(DBBackup)
+        backup.parent_id = None
         when(DatabaseModelBase).find_by(id='123').thenReturn(backup)
         when(backup).save().thenReturn(backup)
 
@@ -168,6 +199,7 @@ class BackupAgentTest(testtools.TestCase):
     def test_execute_lossy_backup(self):
         """This test verifies that incomplete writes to swift will fail."""
         backup = mock(DBBackup)
+        backup.parent_id = None
         when(backupagent).get_auth_password().thenReturn('secret')
         when(DatabaseModelBase).find_by(id='123').thenReturn(backup)
         when(backup).save().thenReturn(backup)
@@ -182,6 +214,54 @@ class BackupAgentTest(testtools.TestCase):
         self.assertThat(backup.state, Is(BackupState.FAILED))
         verify(backup, times=3).save()
 
+    def test_execute_incremental_backup(self):
+        backup = mock(DBBackup)
+        backup.parent_id = 'parent'
+        parent = mock(DBBackup)
+        parent.id = 'parent'
+        parent.to_lsn = 1234
+        when(DatabaseModelBase).find_by(id='123').thenReturn(backup)
+        when(DatabaseModelBase).find_by(id='parent',
+                                        deleted=False).thenReturn(parent)
+        when(backup).save().thenReturn(backup)
+
+        agent = backupagent.BackupAgent()
+        agent.execute_backup(context=None, backup_id='123', runner=MockBackup,
+                             incremental_runner=MockIncrementalBackup)
+
+        self.assertThat(backup.state, Is(BackupState.COMPLETED))
+        self.assertThat(backup.from_lsn, Equals(1234))
+        self.assertThat(backup.to_lsn, Equals(2000))
+
+    def test_execute_incremental_backup_parent_without_lsn(self):
+        backup = mock(DBBackup)
+        backup.parent_id = 'parent'
+        parent = mock(DBBackup)
+        parent.id = 'parent'
+        parent.to_lsn = None
+        when(DatabaseModelBase).find_by(id='123').thenReturn(backup)
+        when(DatabaseModelBase).find_by(id='parent',
+                                        deleted=False).thenReturn(parent)
+        when(backup).save().thenReturn(backup)
+
+        agent = backupagent.BackupAgent()
+        self.assertRaises(backupagent.BackupError, agent.execute_backup,
+                          context=None, backup_id='123', runner=MockBackup,
+                          incremental_runner=MockIncrementalBackup)
+        self.assertThat(backup.state, Is(BackupState.FAILED))
+
+    def test_execute_backup_metadata_error(self):
+        backup = mock(DBBackup)
+        backup.parent_id = None
+        when(DatabaseModelBase).find_by(id='123').thenReturn(backup)
+        when(backup).save().thenReturn(backup)
+
+        agent = backupagent.BackupAgent()
+        self.assertRaises(IOError, agent.execute_backup, context=None,
+                          backup_id='123', runner=MockBrokenMetadataBackup)
+        self.assertThat(backup.state, Is(BackupState.FAILED))
+        verify(backup, times=3).save()
+
     def test_execute_backup_model_exception(self):
         """This test should ensure backup agent
                 properly handles condition where backup model is not found
@@ -205,6 +285,8 @@ class BackupAgentTest(testtools.TestCase):
         backup = mock(DBBackup)
         backup.location = "/backup/location/123"
         backup.backup_type = 'InnoBackupEx'
+        backup.size = 0.5
+        when(backup).chain().thenReturn([backup])
 
         when(utils).execute(contains('sudo rm -rf')).thenReturn(None)
         when(utils).clean_out(any()).thenReturn(None)
@@ -220,10 +302,55 @@ class BackupAgentTest(testtools.TestCase):
 
         agent.execute_restore(TroveContext(), '123', '/var/lib/mysql')
 
+        progress = agent.restore_progress.stats()
+        self.assertThat(progress['backup_id'], Equals('123'))
+        self.assertThat(progress['total_bytes'], Equals(2 ** 29))
+        self.assertThat(progress['finished'], Is(True))
+
+    def test_execute_restore_chain(self):
+        full = mock(DBBackup)
+        full.location = "/backup/location/full"
+        full.compression = 'gzip'
+        full.encryption = 'none'
+        full.size = None
+        backup = mock(DBBackup)
+        backup.location = "/backup/location/123"
+        backup.backup_type = 'InnoBackupExIncremental'
+        backup.compression = 'gzip'
+        backup.encryption = 'aes-256-cbc'
+        backup.size = 0.5
+        when(backup).chain().thenReturn([full, backup])
+
+        storage = MockStorage(None)
+        when(storage).load(any(), full.location, any()).thenReturn('full')
+        when(storage).load(any(), backup.location, any()).thenReturn('incr')
+        when(utils).execute(contains('sudo rm -rf')).thenReturn(None)
+        when(utils).clean_out(any()).thenReturn(None)
+        when(backupagent).get_storage_strategy(any(), any()).thenReturn(
+            storage)
+        when(backupagent).get_restore_strategy(
+            'InnoBackupExIncremental', any()).thenReturn(
+                MockChainRestoreRunner)
+        when(DatabaseModelBase).find_by(id='123').thenReturn(backup)
+
+        agent = backupagent.BackupAgent()
+        agent.execute_restore(TroveContext(), '123', '/var/lib/mysql')
+
+        kwargs = MockChainRestoreRunner.kwargs
+        self.assertThat(kwargs['progress'], Is(agent.restore_progress))
+        self.assertThat(agent.restore_progress.total_bytes, Is(None))
+        self.assertThat(kwargs['compression'], Equals('gzip'))
+        self.assertThat(kwargs['encryption'], Equals('none'))
+        self.assertThat(kwargs['incrementals'],
+                        Equals([{'restore_stream': 'incr',
+                                 'compression': 'gzip',
+                                 'encryption': 'aes-256-cbc'}]))
+
     def test_restore_unknown(self):
         backup = mock(DBBackup)
         backup.location = "/backup/location/123"
         backup.backup_type = 'foo'
+        when(backup).chain().thenReturn([backup])
         when(utils).execute(contains('sudo rm -rf')).thenReturn(None)
         when(utils).clean_out(any()).thenReturn(None)
         when(DatabaseModelBase).find_by(id='123').thenReturn(backup)
@@ -235,3 +362,33 @@ class BackupAgentTest(testtools.TestCase):
         self.assertRaises(UnknownBackupType, agent.execute_restore,
                           context=None, backup_id='123',
                           restore_location='/var/lib/mysql')
+
+
+class RestoreProgressTest(testtools.TestCase):
+
+    def tearDown(self):
+        super(RestoreProgressTest, self).tearDown()
+        unstub()
+
+    def test_stats(self):
+        when(backupagent.time).time().thenReturn(100)
+        progress = backupagent.RestoreProgress('123', total_bytes=1000)
+        when(backupagent.time).time().thenReturn(110)
+        progress.update(250)
+
+        stats = progress.stats()
+        self.assertThat(stats['bytes_restored'], Equals(250))
+        self.assertThat(stats['bytes_per_second'], Equals(25))
+        self.assertThat(stats['percent'], Equals(25.0))
+        self.assertThat(stats['eta_seconds'], Equals(30))
+        self.assertThat(stats['finished'], Is(False))
+
+    def test_stats_without_total(self):
+        progress = backupagent.RestoreProgress('123')
+        progress.update(250)
+        progress.finish()
+
+        stats = progress.stats()
+        self.assertThat(stats['percent'], Is(None))
+        self.assertThat(stats['eta_seconds'], Is(None))
+        self.assertThat(stats['finished'], Is(True))
@@ -0,0 +1,227 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import os
+import StringIO
+import time
+
+import eventlet
+import testtools
+
+from trove.common import cfg
+from trove.common.context import TroveContext
+from trove.guestagent.strategies.backup import base as backup_base
+from trove.guestagent.strategies.backup.base import BackupRunner
+from trove.guestagent.strategies.storage import swift
+from trove.guestagent.strategies.storage.swift import SwiftStorage
+from trove.tests.fakes.swift import FakeSwiftConnection
+
+CONF = cfg.CONF
+CHUNK_SIZE = 1024
+SEGMENT_SIZE = 4 * CHUNK_SIZE
+
+
+class FakeProcess(object):
+
+    def __init__(self, data):
+        self.stdout = StringIO.StringIO(data)
+
+
+class FakeBackup(BackupRunner):
+    """Streams the given data instead of running a backup command."""
+
+    cmd = 'true'
+
+    def __init__(self, data):
+        super(FakeBackup, self).__init__('backup')
+        self.process = FakeProcess(data)
+
+
+class SlowSwiftConnection(FakeSwiftConnection):
+    """Takes a while to store objects and remembers them."""
+
+    url = 'http://mockswift/v1'
+    latency = 0.02
+    active = 0
+    max_active = 0
+    objects = {}
+    corrupt = False
+
+    headers = {}
+
+    def _start(self):
+        cls = SlowSwiftConnection
+        cls.active += 1
+        cls.max_active = max(cls.max_active, cls.active)
+        eventlet.sleep(self.latency)
+
+    def _stop(self):
+        SlowSwiftConnection.active -= 1
+
+    def put_object(self, container, name, contents=None, **kwargs):
+        cls = SlowSwiftConnection
+        self._start()
+        try:
+            if not hasattr(contents, 'read'):
+                cls.objects[(container, name)] = contents
+                cls.headers[(container, name)] = kwargs.get('headers', {})
+            etag = super(SlowSwiftConnection, self).put_object(
+                container, name, contents, **kwargs)
+            return 'corrupt' if cls.corrupt else etag
+        finally:
+            self._stop()
+
+    def head_object(self, container, name):
+        headers = dict((key.lower(), value) for key, value
+                       in self.headers[(container, name)].items())
+        headers['etag'] = hashlib.md5(
+            self.objects[(container, name)]).hexdigest()
+        return headers
+
+    def get_container(self, container, prefix=None, full_listing=False):
+        names = sorted(name for object_container, name in self.objects
+                       if object_container == container and
+                       name.startswith(prefix))
+        return None, [{'name': name,
+                       'hash': hashlib.md5(
+                           self.objects[(container, name)]).hexdigest()}
+                      for name in names]
+
+    def get_object(self, container, name):
+        self._start()
+        try:
+            contents = self.objects[(container, name)]
+            if SlowSwiftConnection.corrupt:
+                contents = contents[1:]
+            return None, contents
+        finally:
+            self._stop()
+
+
+class SwiftStorageTestBase(testtools.TestCase):
+
+    def setUp(self):
+        super(SwiftStorageTestBase, self).setUp()
+        for module, name, value in ((backup_base, 'CHUNK_SIZE', CHUNK_SIZE),
+                                    (backup_base, 'MAX_FILE_SIZE',
+                                     SEGMENT_SIZE),
+                                    (swift, 'CHUNK_SIZE', CHUNK_SIZE),
+                                    (swift, 'create_swift_client',
+                                     lambda context: SlowSwiftConnection())):
+            self.addCleanup(setattr, module, name, getattr(module, name))
+            setattr(module, name, value)
+        self.addCleanup(setattr, CONF, 'backup_upload_workers',
+                        CONF.backup_upload_workers)
+        SlowSwiftConnection.active = 0
+        SlowSwiftConnection.max_active = 0
+        SlowSwiftConnection.objects = {}
+        SlowSwiftConnection.headers = {}
+        SlowSwiftConnection.corrupt = False
+        self.data = os.urandom(8 * SEGMENT_SIZE)
+
+    def _save(self, workers):
+        CONF.backup_upload_workers = workers
+        stream = FakeBackup(self.data)
+        return SwiftStorage(None).save('backups', stream)
+
+    def _saved_data(self):
+        segments = sorted(name for container, name
+                          in SlowSwiftConnection.objects
+                          if container == 'backup_segments')
+        return ''.join(SlowSwiftConnection.objects[('backup_segments', name)]
+                       for name in segments)
+
+
+class SwiftStorageSaveTest(SwiftStorageTestBase):
+
+    def test_save_concurrently(self):
+        success, note, checksum, location = self._save(workers=3)
+
+        self.assertTrue(success)
+        self.assertEqual(hashlib.md5(self.data).hexdigest(), checksum)
+        self.assertEqual('http://mockswift/v1/backups/backup', location)
+        self.assertEqual(3, SlowSwiftConnection.max_active)
+        self.assertEqual(self.data, self._saved_data())
+        self.assertEqual('', SlowSwiftConnection.objects[('backups',
+                                                          'backup')])
+
+    def test_save_serially(self):
+        success, note, checksum, location = self._save(workers=1)
+
+        self.assertTrue(success)
+        self.assertEqual(hashlib.md5(self.data).hexdigest(), checksum)
+        self.assertEqual(1, SlowSwiftConnection.max_active)
+        self.assertIn(('backups', 'backup'), SlowSwiftConnection.objects)
+
+    def test_save_corrupt_segment(self):
+        SlowSwiftConnection.corrupt = True
+
+        success, note, checksum, location = self._save(workers=3)
+
+        self.assertFalse(success)
+        self.assertNotIn(('backups', 'backup'), SlowSwiftConnection.objects)
+
+    def test_concurrent_save_is_faster(self):
+        start = time.time()
+        self._save(workers=1)
+        serial = time.time() - start
+        start = time.time()
+        self._save(workers=4)
+        concurrent = time.time() - start
+
+        self.assertTrue(concurrent < serial / 2,
+                        "%.3fs concurrently, %.3fs serially"
+                        % (concurrent, serial))
+
+
+class SwiftStorageLoadTest(SwiftStorageTestBase):
+
+    def setUp(self):
+        super(SwiftStorageLoadTest, self).setUp()
+        self.addCleanup(setattr, CONF, 'backup_download_workers',
+                        CONF.backup_download_workers)
+        CONF.backup_download_workers = 3
+        self._save(workers=3)
+        SlowSwiftConnection.max_active = 0
+
+    def _load(self):
+        context = TroveContext(auth_token='token')
+        stream = SwiftStorage(context).load(
+            context, 'http://mockswift/v1/backups/backup', False)
+        chunks = []
+        with stream:
+            chunk = stream.read(1000)
+            while chunk:
+                chunks.append(chunk)
+                chunk = stream.read(1000)
+        return ''.join(chunks)
+
+    def test_load_segments_in_order(self):
+        self.assertEqual(self.data, self._load())
+        self.assertEqual(3, SlowSwiftConnection.max_active)
+
+    def test_load_corrupt_segment(self):
+        SlowSwiftConnection.corrupt = True
+
+        self.assertRaises(swift.DownloadError, self._load)
+
+    def test_load_with_swift_command(self):
+        CONF.backup_download_workers = 1
+        context = TroveContext(auth_token='token')
+
+        stream = SwiftStorage(context).load(
+            context, 'http://mockswift/v1/backups/backup', False)
+
+        self.assertIsInstance(stream, swift.SwiftDownloadStream)
@@ -0,0 +1,129 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from mockito import mock, when, verify, unstub, times, any
+import testtools
+from testtools.matchers import Equals, Is
+
+from trove.common import server_cache
+from trove.common.server_cache import LRUServerCacheDriver
+from trove.common.server_cache import ServerCache
+from trove.common.server_cache import ServerCacheDriver
+
+
+class LRUServerCacheDriverTest(testtools.TestCase):
+
+    def tearDown(self):
+        super(LRUServerCacheDriverTest, self).tearDown()
+        unstub()
+
+    def test_get_missing(self):
+        driver = LRUServerCacheDriver(max_size=2, ttl=10)
+        self.assertThat(driver.get('1'), Is(None))
+
+    def test_set_and_get(self):
+        driver = LRUServerCacheDriver(max_size=2, ttl=10)
+        driver.set('1', 'server-1')
+        self.assertThat(driver.get('1'), Equals('server-1'))
+        self.assertThat(driver.size(), Equals(1))
+
+    def test_evicts_least_recently_used(self):
+        driver = LRUServerCacheDriver(max_size=2, ttl=10)
+        driver.set('1', 'server-1')
+        driver.set('2', 'server-2')
+        driver.get('1')
+        driver.set('3', 'server-3')
+        self.assertThat(driver.get('2'), Is(None))
+        self.assertThat(driver.get('1'), Equals('server-1'))
+        self.assertThat(driver.get('3'), Equals('server-3'))
+        self.assertThat(driver.evictions, Equals(1))
+        self.assertThat(driver.size(), Equals(2))
+
+    def test_expired_entries_are_dropped(self):
+        driver = LRUServerCacheDriver(max_size=2, ttl=10)
+        now = time.time()
+        when(time).time().thenReturn(now)
+        driver.set('1', 'server-1')
+        when(time).time().thenReturn(now + 11)
+        self.assertThat(driver.get('1'), Is(None))
+        self.assertThat(driver.size(), Equals(0))
+
+    def test_zero_ttl_disables_caching(self):
+        driver = LRUServerCacheDriver(max_size=2, ttl=0)
+        driver.set('1', 'server-1')
+        self.assertThat(driver.get('1'), Is(None))
+
+    def test_delete(self):
+        driver = LRUServerCacheDriver(max_size=2, ttl=10)
+        driver.set('1', 'server-1')
+        driver.delete('1')
+        driver.delete('1')
+        self.assertThat(driver.get('1'), Is(None))
+
+
+class ServerCacheTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ServerCacheTest, self).setUp()
+        self.client = mock()
+        self.client.servers = mock()
+        when(self.client.servers).get('1').thenReturn('server-1')
+
+    def tearDown(self):
+        super(ServerCacheTest, self).tearDown()
+        unstub()
+
+    def test_read_through(self):
+        cache = ServerCache(LRUServerCacheDriver(max_size=2, ttl=10))
+        self.assertThat(cache.get(self.client, '1'), Equals('server-1'))
+        self.assertThat(cache.get(self.client, '1'), Equals('server-1'))
+        verify(self.client.servers, times(1)).get('1')
+        self.assertThat(cache.stats()['hits'], Equals(1))
+        self.assertThat(cache.stats()['misses'], Equals(1))
+        self.assertThat(cache.stats()['size'], Equals(1))
+
+    def test_invalidate(self):
+        cache = ServerCache(LRUServerCacheDriver(max_size=2, ttl=10))
+        cache.get(self.client, '1')
+        cache.invalidate('1')
+        cache.get(self.client, '1')
+        verify(self.client.servers, times(2)).get('1')
+        self.assertThat(cache.stats()['misses'], Equals(2))
+
+    def test_base_driver_caches_nothing(self):
+        cache = ServerCache(ServerCacheDriver())
+        cache.get(self.client, '1')
+        cache.get(self.client, '1')
+        verify(self.client.servers, times(2)).get('1')
+        self.assertThat(cache.stats()['hits'], Equals(0))
+
+    def test_logs_stats_periodically(self):
+        cache = ServerCache(LRUServerCacheDriver(max_size=2, ttl=10),
+                            stats_interval=60)
+        when(server_cache.LOG).info(any()).thenReturn(None)
+        cache.get(self.client, '1')
+        verify(server_cache.LOG, times(0)).info(any())
+        cache._stats_logged_at -= 60
+        cache.get(self.client, '1')
+        cache.get(self.client, '1')
+        verify(server_cache.LOG, times(1)).info(any())
+
+    def test_zero_stats_interval_disables_logging(self):
+        cache = ServerCache(ServerCacheDriver(), stats_interval=0)
+        when(server_cache.LOG).info(any()).thenReturn(None)
+        cache._stats_logged_at -= 3600
+        cache.get(self.client, '1')
+        verify(server_cache.LOG, times(0)).info(any())
@@ -0,0 +1,234 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sys
+from xml.dom import minidom
+
+import testtools
+
+from trove.common import exception
+from trove.common import wsgi
+from trove.openstack.common import exception as openstack_exception
+
+SCHEMA = {
+    "type": "object",
+    "required": ["thing"],
+    "properties": {
+        "thing": {"type": "object",
+                  "required": ["name"],
+                  "properties": {"name": {"type": "string",
+                                          "minLength": 1}}}
+    }
+}
+
+
+class ThingController(wsgi.Controller):
+    schemas = {'create': SCHEMA}
+
+
+class OtherController(wsgi.Controller):
+    schemas = {'create': SCHEMA}
+
+
+class ValidatorCacheTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ValidatorCacheTest, self).setUp()
+        ThingController._validators = {}
+
+    def test_validator_is_built_once(self):
+        validator = ThingController.get_validator(SCHEMA)
+        self.assertIs(validator, ThingController.get_validator(SCHEMA))
+
+    def test_validators_are_kept_per_controller(self):
+        self.assertIsNot(ThingController.get_validator(SCHEMA),
+                         OtherController.get_validator(SCHEMA))
+        self.assertFalse('_validators' in wsgi.Controller.__dict__)
+
+    def test_create_resource_builds_the_validators(self):
+        ThingController().create_resource()
+        validator = ThingController._validators[id(SCHEMA)][1]
+        self.assertIs(validator, ThingController.get_validator(SCHEMA))
+
+    def test_valid_request(self):
+        ThingController().validate_request(
+            'create', {'body': {'thing': {'name': 'a'}}})
+
+    def test_request_without_schema(self):
+        ThingController().validate_request('delete', {})
+
+    def test_invalid_request(self):
+        error = self.assertRaises(
+            exception.BadRequest,
+            ThingController().validate_request,
+            'create', {'body': {'thing': {'name': ''}}})
+        self.assertEqual("Validation error: '' is too short",
+                         error.message)
+
+
+class VersionStub(object):
+
+    def to_xml(self):
+        doc = minidom.Document()
+        node = doc.createElement("version")
+        node.setAttribute("id", "v1.0")
+        return node
+
+
+class XMLSerializerTest(testtools.TestCase):
+
+    def setUp(self):
+        super(XMLSerializerTest, self).setUp()
+        self.serializer = wsgi.TroveXMLDictSerializer()
+
+    def _assert_same_as_dom(self, data, root_key):
+        expected = self.serializer._dom_default(data, root_key,
+                                                'links' in data)
+        self.assertEqual(expected, self.serializer.default(data))
+
+    def test_instance(self):
+        self._assert_same_as_dom({
+            'instance': {
+                'id': '1234',
+                'name': 'a "quoted" <name> & more',
+                'status': 'ACTIVE',
+                'flavor': {'id': '7', 'links': [{'href': 'https://flavor',
+                                                 'rel': 'self'}]},
+                'volume': {'size': 2, 'used': 0.16},
+                'databases': [{'name': 'db1'}, {'name': 'db2'}],
+                'users': [],
+                'ip': ['10.0.0.1', '10.0.0.2'],
+                'hostname': '',
+                'root_enabled': None,
+                'deleted': False,
+                'description': '',
+            },
+            'links': [{'href': 'https://instance', 'rel': 'self'}],
+        }, 'instance')
+
+    def test_list(self):
+        instances = [{'id': str(i), 'name': 'instance%d' % i,
+                      'volume': {'size': i}, 'server': {'deleted': True}}
+                     for i in range(20)]
+        self._assert_same_as_dom({'instances': instances}, 'instances')
+
+    def test_empty_list(self):
+        self._assert_same_as_dom({'instances': []}, 'instances')
+
+    def test_unicode(self):
+        self._assert_same_as_dom({'database': {'name': u'cafe',
+                                               'collate': u'utf8_bin'}},
+                                 'database')
+        self.assertRaises(UnicodeEncodeError, self.serializer.default,
+                          {'database': {'name': u'caf\xe9'}})
+
+    def test_collections_and_namespaces(self):
+        self.serializer.metadata.update({
+            'xmlns': 'http://example.com',
+            'plurals': {'entries': 'entry'},
+            'list_collections': {'names': {'item_name': 'name',
+                                           'item_key': 'value'}},
+            'dict_collections': {'metadata': {'item_name': 'meta',
+                                              'item_key': 'key'}}})
+        self._assert_same_as_dom({
+            'thing': {'entries': [1, 2],
+                      'names': ['a', 'b'],
+                      'metadata': {'k1': 'v1', 'k2': '<v2>'}}}, 'thing')
+
+    def test_to_xml(self):
+        self._assert_same_as_dom({'versions': [VersionStub()]}, 'versions')
+        self._assert_same_as_dom({'version': VersionStub()}, 'version')
+
+    def test_output(self):
+        self.assertEqual(
+            '<user name="me" xmlns="%s">\n'
+            '    <databases>\n'
+            '        <database name="db1"/>\n'
+            '    </databases>\n'
+            '</user>\n' % wsgi.XMLNS,
+            self.serializer.default(
+                {'user': {'name': 'me', 'databases': [{'name': 'db1'}]}}))
+
+    def test_output_with_text_on_own_line(self):
+        # The format of toprettyxml before Python 2.7.3.
+        self.patch(wsgi, '_MINIDOM_INLINES_TEXT', False)
+        self.assertEqual(
+            '<thing xmlns="%s">\n'
+            '    <note>\n'
+            '        fish &amp; chips\n'
+            '    </note>\n'
+            '</thing>\n' % wsgi.XMLNS,
+            self.serializer.default({'thing': {'note': 'fish & chips'}}))
+
+    def test_minidom_version_detected(self):
+        self.assertEqual(sys.version_info >= (2, 7, 3),
+                         wsgi._MINIDOM_INLINES_TEXT)
+
+    def test_multiple_root_keys(self):
+        self.assertRaises(RuntimeError, self.serializer.default,
+                          {'instance': {}, 'user': {}})
+
+
+class XMLDeserializerTest(testtools.TestCase):
+
+    def setUp(self):
+        super(XMLDeserializerTest, self).setUp()
+        self.deserializer = wsgi.TroveXMLDeserializer()
+
+    def test_instance(self):
+        body = """<?xml version="1.0" encoding="UTF-8"?>
+            <instance xmlns="http://docs.openstack.org/database/api/v1.0"
+                      name="my_instance" flavorRef="7">
+                <volume size="2"/>
+                <databases>
+                    <database name="db1" character_set="utf8"/>
+                    <database name="db2"/>
+                </databases>
+                <users>
+                    <user name="me" password="secret">
+                        <databases>
+                            <database name="db1"/>
+                        </databases>
+                    </user>
+                </users>
+                <description>fish &amp; chips</description>
+                <empty></empty>
+            </instance>"""
+        self.assertEqual(
+            {'body': {'instance': {
+                'name': 'my_instance',
+                'flavorRef': '7',
+                'volume': {'size': '2'},
+                'databases': [{'name': 'db1', 'character_set': 'utf8'},
+                              {'name': 'db2'}],
+                'users': [{'name': 'me', 'password': 'secret',
+                           'databases': [{'name': 'db1'}]}],
+                'description': 'fish & chips',
+                'empty': {}}}},
+            self.deserializer.default(body))
+
+    def test_matches_serializer(self):
+        data = {'user': {'name': 'me', 'password': 'secret',
+                         'host': '%', 'databases': [{'name': 'db1'}]}}
+        body = wsgi.TroveXMLDictSerializer().default(data)
+        self.assertEqual({'body': data}, self.deserializer.default(body))
+
+    def test_malformed(self):
+        self.assertRaises(openstack_exception.MalformedRequestBody,
+                          self.deserializer.default, '<instance>')
+
+    def test_entities_are_forbidden(self):
+        body = ('<!DOCTYPE instance [<!ENTITY a "aaaa">]>'
+                '<instance name="&a;"/>')
+        self.assertRaises(ValueError, self.deserializer.default, body)
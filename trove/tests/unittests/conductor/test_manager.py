@@ -0,0 +1,173 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from mockito import when, unstub, any, verify, never
+from testtools import TestCase
+from testtools.matchers import Equals
+
+from trove.common import cfg
+from trove.common import utils
+from trove.conductor.manager import Manager
+from trove.guestagent.models import AgentHeartBeat
+from trove.instance.models import InstanceServiceStatus
+from trove.instance.models import ServiceStatuses
+from trove.taskmanager import api as task_api
+from trove.tests.unittests.util import util
+
+
+class ConductorManagerTest(TestCase):
+
+    def setUp(self):
+        super(ConductorManagerTest, self).setUp()
+        util.init_db()
+        self.manager = Manager()
+        self.instance_ids = [utils.generate_uuid() for i in range(3)]
+        for instance_id in self.instance_ids:
+            InstanceServiceStatus.create(instance_id=instance_id,
+                                         status=ServiceStatuses.NEW)
+
+    def tearDown(self):
+        super(ConductorManagerTest, self).tearDown()
+        unstub()
+        for instance_id in self.instance_ids:
+            for model in (AgentHeartBeat, InstanceServiceStatus):
+                for row in model.find_all(instance_id=instance_id).all():
+                    row.delete()
+
+    def _status(self, instance_id):
+        return InstanceServiceStatus.find_by(instance_id=instance_id).status
+
+    def _heartbeats(self, instance_id):
+        return AgentHeartBeat.find_all(instance_id=instance_id).all()
+
+    def test_flush_creates_missing_heartbeats(self):
+        for instance_id in self.instance_ids:
+            self.manager.heartbeat(None, instance_id)
+
+        self.manager.flush(None)
+
+        for instance_id in self.instance_ids:
+            self.assertThat(len(self._heartbeats(instance_id)), Equals(1))
+
+    def test_flush_refreshes_existing_heartbeats(self):
+        instance_id = self.instance_ids[0]
+        old = AgentHeartBeat.create(instance_id=instance_id)
+        when(utils).utcnow().thenReturn(old.updated_at.replace(year=2100))
+        self.manager.heartbeat(None, instance_id)
+        self.manager.heartbeat(None, self.instance_ids[1])
+
+        self.manager.flush(None)
+
+        heartbeats = self._heartbeats(instance_id)
+        self.assertThat(len(heartbeats), Equals(1))
+        self.assertThat(heartbeats[0].id, Equals(old.id))
+        self.assertThat(heartbeats[0].updated_at.year, Equals(2100))
+        self.assertThat(len(self._heartbeats(self.instance_ids[1])),
+                        Equals(1))
+
+    def test_flush_keeps_latest_status(self):
+        instance_id = self.instance_ids[0]
+        self.manager.heartbeat(None, instance_id,
+                               status_code=ServiceStatuses.BUILDING.code)
+        self.manager.heartbeat(None, instance_id,
+                               status_code=ServiceStatuses.RUNNING.code)
+        self.manager.heartbeat(None, instance_id)
+
+        self.manager.flush(None)
+
+        self.assertThat(self._status(instance_id),
+                        Equals(ServiceStatuses.RUNNING))
+        self.assertThat(self._status(self.instance_ids[1]),
+                        Equals(ServiceStatuses.NEW))
+
+    def test_flush_without_heartbeats(self):
+        when(AgentHeartBeat).touch_all(any()).thenRaise(Exception())
+        self.manager.flush(None)
+
+    def test_failed_flush_is_retried(self):
+        instance_id = self.instance_ids[0]
+        self.manager.heartbeat(None, instance_id,
+                               status_code=ServiceStatuses.RUNNING.code)
+        when(AgentHeartBeat).touch_all(any()).thenRaise(Exception())
+
+        self.manager.flush(None)
+        unstub()
+        self.manager.flush(None)
+
+        self.assertThat(len(self._heartbeats(instance_id)), Equals(1))
+        self.assertThat(self._status(instance_id),
+                        Equals(ServiceStatuses.RUNNING))
+
+    def test_unknown_status_is_ignored(self):
+        instance_id = self.instance_ids[0]
+        self.manager.heartbeat(None, instance_id, status_code=-1)
+
+        self.manager.flush(None)
+
+        self.assertThat(self._status(instance_id),
+                        Equals(ServiceStatuses.NEW))
+        self.assertThat(len(self._heartbeats(instance_id)), Equals(1))
+
+    def test_flush_notifies_taskmanagers_of_changes(self):
+        orig_sources = cfg.CONF.task_event_sources
+        self.addCleanup(setattr, cfg.CONF, 'task_event_sources',
+                        orig_sources)
+        cfg.CONF.task_event_sources = ['guest']
+        when(task_api.API).instance_status_changed(any()).thenReturn(None)
+        instance_id = self.instance_ids[0]
+        self.manager.heartbeat(None, instance_id,
+                               status_code=ServiceStatuses.RUNNING.code)
+        self.manager.flush(None)
+        self.manager.heartbeat(None, instance_id,
+                               status_code=ServiceStatuses.RUNNING.code)
+        self.manager.flush(None)
+
+        verify(task_api.API, times=1).instance_status_changed([instance_id])
+
+    def test_flush_does_not_notify_by_default(self):
+        when(task_api.API).instance_status_changed(any()).thenReturn(None)
+        self.manager.heartbeat(None, self.instance_ids[0],
+                               status_code=ServiceStatuses.RUNNING.code)
+        self.manager.flush(None)
+
+        verify(task_api.API, never).instance_status_changed(any())
+
+
+class UpdateAllStatusesTest(TestCase):
+
+    def setUp(self):
+        super(UpdateAllStatusesTest, self).setUp()
+        util.init_db()
+        self.statuses = [
+            InstanceServiceStatus.create(instance_id=utils.generate_uuid(),
+                                         status=ServiceStatuses.RUNNING)
+            for i in range(3)]
+
+    def tearDown(self):
+        super(UpdateAllStatusesTest, self).tearDown()
+        for status in self.statuses:
+            status.delete()
+
+    def test_unchanged_statuses_are_not_written(self):
+        statuses = dict((status.instance_id, ServiceStatuses.RUNNING)
+                        for status in self.statuses)
+        statuses[self.statuses[0].instance_id] = ServiceStatuses.SHUTDOWN
+
+        changed = InstanceServiceStatus.update_all_statuses(statuses)
+
+        self.assertThat(changed, Equals(1))
+        status = InstanceServiceStatus.find_by(
+            instance_id=self.statuses[0].instance_id)
+        self.assertThat(status.status, Equals(ServiceStatuses.SHUTDOWN))
+        self.assertIsNotNone(status.updated_at)
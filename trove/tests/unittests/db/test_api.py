@@ -0,0 +1,97 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import event
+import testtools
+
+from trove.common import utils
+from trove.db import get_db_api
+from trove.db.sqlalchemy import session
+from trove.quota.models import QuotaUsage
+from trove.tests.unittests.util import util
+
+
+class SaveTest(testtools.TestCase):
+
+    def setUp(self):
+        super(SaveTest, self).setUp()
+        util.init_db()
+        self.usage = QuotaUsage.create(tenant_id=utils.generate_uuid(),
+                                       resource='instances',
+                                       in_use=1,
+                                       reserved=0)
+        self.statements = []
+        event.listen(session._ENGINE, "before_cursor_execute",
+                     self._record)
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(statement.split()[0])
+
+    def _load(self):
+        return QuotaUsage.find_by(id=self.usage.id)
+
+    def test_changes(self):
+        usage = self._load()
+        self.assertEqual({}, get_db_api().changes(usage))
+        usage.in_use = 2
+        usage.reserved = 0
+        self.assertEqual({'in_use': 2}, get_db_api().changes(usage))
+
+    def test_new_model_has_no_changes(self):
+        usage = QuotaUsage(id=utils.generate_uuid(), in_use=0)
+        self.assertEqual(None, get_db_api().changes(usage))
+
+    def test_save_updates_the_changed_columns(self):
+        usage = self._load()
+        usage.in_use = 2
+        self.statements = []
+        usage.save()
+
+        self.assertEqual(['UPDATE'], self.statements)
+        self.assertEqual({}, get_db_api().changes(usage))
+        saved = self._load()
+        self.assertEqual(2, saved.in_use)
+        self.assertEqual(usage.updated, saved.updated)
+
+    def test_save_keeps_columns_changed_by_others(self):
+        usage = self._load()
+        other = self._load()
+        other.reserved = 3
+        other.save()
+        usage.in_use = 2
+        usage.save()
+
+        saved = self._load()
+        self.assertEqual(2, saved.in_use)
+        self.assertEqual(3, saved.reserved)
+
+    def test_unchanged_save_is_skipped(self):
+        usage = self._load()
+        self.statements = []
+        usage.save()
+        self.assertEqual([], self.statements)
+
+    def test_created_model_is_updated_on_save(self):
+        self.usage.reserved = 1
+        self.statements = []
+        self.usage.save()
+        self.assertEqual(['UPDATE'], self.statements)
+        self.assertEqual(1, self._load().reserved)
+
+    def test_deleted_row_is_inserted_again(self):
+        usage = self._load()
+        QuotaUsage.find_all(id=self.usage.id).delete()
+        usage.in_use = 2
+        usage.save()
+        self.assertEqual(2, self._load().in_use)
@@ -0,0 +1,151 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from mock import Mock
+import testtools
+
+from trove.backup import models as backup_models
+from trove.backup.service import BackupController
+from trove.common import utils
+from trove.common import wsgi
+from trove.common.context import TroveContext
+from trove.guestagent.models import AgentHeartBeat
+from trove.instance import models
+from trove.instance.service import InstanceController
+from trove.instance.tasks import InstanceTasks
+from trove.tests.unittests.util import util
+from trove.tests.unittests.util.query_audit import QueryAuditor
+
+
+class QueryAuditorTest(testtools.TestCase):
+
+    def setUp(self):
+        super(QueryAuditorTest, self).setUp()
+        util.init_db()
+
+    def test_records_statements_while_active(self):
+        instance_id = utils.generate_uuid()
+        AgentHeartBeat.get_by(instance_id=instance_id)
+        with QueryAuditor() as auditor:
+            AgentHeartBeat.get_by(instance_id=instance_id)
+            AgentHeartBeat.get_by(instance_id=instance_id)
+        AgentHeartBeat.get_by(instance_id=instance_id)
+
+        self.assertEqual(2, auditor.count())
+        self.assertEqual(2, auditor.count('SELECT'))
+        self.assertEqual(0, auditor.count('UPDATE'))
+        self.assertEqual([2], auditor.counts().values())
+        self.assertEqual(1, len(auditor.explain()))
+        self.assertTrue(auditor.report().startswith("2 statements:\n2x "))
+
+    def test_full_scans(self):
+        with QueryAuditor() as auditor:
+            AgentHeartBeat.get_by(updated_at=utils.utcnow())
+        self.assertEqual('agent_heartbeats', auditor.full_scans()[0][1])
+
+
+class QueryPlanTest(testtools.TestCase):
+    """Checks the lookups made on every request are served by indexes."""
+
+    def setUp(self):
+        super(QueryPlanTest, self).setUp()
+        util.init_db()
+        self.tenant_id = utils.generate_uuid()
+        self.context = TroveContext(tenant=self.tenant_id)
+        self.instance = self._create_instance()
+
+    def _create_instance(self):
+        instance = models.DBInstance.create(
+            name='audited', flavor_id=1, tenant_id=self.tenant_id,
+            volume_size=1, compute_instance_id=utils.generate_uuid(),
+            task_status=InstanceTasks.BUILDING)
+        models.InstanceServiceStatus.create(
+            instance_id=instance.id, status=models.ServiceStatuses.NEW)
+        return instance
+
+    def _create_backup(self):
+        return backup_models.DBBackup.create(
+            tenant_id=self.tenant_id, name='audited', state='NEW',
+            instance_id=self.instance.id, deleted=False)
+
+    def _request(self):
+        req = Mock()
+        req.url = 'https://localhost/v1.0/%s/' % self.tenant_id
+        req.environ = {wsgi.CONTEXT_KEY: self.context}
+        return req
+
+    def assertIndexed(self, lookup):
+        with QueryAuditor() as auditor:
+            lookup()
+        self.assertEqual([], auditor.full_scans(), auditor.report())
+        return auditor
+
+    def test_instances_of_tenant(self):
+        self.assertIndexed(lambda: models.DBInstance.find_all(
+            tenant_id=self.tenant_id, deleted=False).all())
+
+    def test_instance_of_server(self):
+        self.assertIndexed(lambda: models.DBInstance.find_by(
+            compute_instance_id=self.instance.compute_instance_id))
+
+    def test_service_status(self):
+        self.assertIndexed(lambda: models.InstanceServiceStatus.find_by(
+            instance_id=self.instance.id))
+
+    def test_heartbeat(self):
+        self.assertIndexed(lambda: AgentHeartBeat.get_by(
+            instance_id=self.instance.id))
+
+    def test_running_backup(self):
+        self._create_backup()
+        self.assertIndexed(lambda: backup_models.Backup.running(
+            self.instance.id))
+
+    def test_backup_pages(self):
+        self.context.limit = 1
+        self.context.marker = self._create_backup().id
+        self._create_backup()
+        self.assertIndexed(lambda: backup_models.Backup.list(self.context))
+        self.assertIndexed(lambda: backup_models.Backup.list_for_instance(
+            self.context, self.instance.id))
+
+    def test_instance_list(self):
+        auditor = self.assertIndexed(
+            lambda: InstanceController().index(self._request(),
+                                               self.tenant_id))
+        for i in range(4):
+            self._create_instance()
+        more = self.assertIndexed(
+            lambda: InstanceController().index(self._request(),
+                                               self.tenant_id))
+        self.assertEqual(auditor.count(), more.count(), more.report())
+
+    def test_instance_show(self):
+        auditor = self.assertIndexed(
+            lambda: InstanceController().show(self._request(),
+                                              self.tenant_id,
+                                              self.instance.id))
+        self.assertEqual(0, auditor.count('UPDATE'), auditor.report())
+
+    def test_backup_list(self):
+        self._create_backup()
+        auditor = self.assertIndexed(
+            lambda: BackupController().index(self._request(),
+                                             self.tenant_id))
+        for i in range(4):
+            self._create_backup()
+        more = self.assertIndexed(
+            lambda: BackupController().index(self._request(),
+                                             self.tenant_id))
+        self.assertEqual(auditor.count(), more.count(), more.report())
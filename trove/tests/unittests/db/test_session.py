@@ -0,0 +1,124 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from mock import Mock
+from sqlalchemy import event
+import testtools
+import webob
+import webob.dec
+
+from trove.common import cfg
+from trove.common import utils
+from trove.common import wsgi
+from trove.db import get_db_api
+from trove.db.sqlalchemy import session
+from trove.guestagent.models import AgentHeartBeat
+from trove.tests.unittests.util import util
+
+CONF = cfg.CONF
+
+
+class CreateEngineTest(testtools.TestCase):
+
+    def setUp(self):
+        super(CreateEngineTest, self).setUp()
+        self.orig_pool_size = CONF.sql_max_pool_size
+        self.orig_overflow = CONF.sql_max_overflow
+        self.orig_create_engine = session.create_engine
+        CONF.sql_max_pool_size = 20
+        CONF.sql_max_overflow = 5
+        session.create_engine = Mock(
+            return_value=self.orig_create_engine('sqlite://'))
+
+    def tearDown(self):
+        super(CreateEngineTest, self).tearDown()
+        CONF.sql_max_pool_size = self.orig_pool_size
+        CONF.sql_max_overflow = self.orig_overflow
+        session.create_engine = self.orig_create_engine
+
+    def test_pool_settings(self):
+        session._create_engine({'sql_connection': 'mysql://u:p@host/trove'})
+        _, kwargs = session.create_engine.call_args
+        self.assertEqual(20, kwargs['pool_size'])
+        self.assertEqual(5, kwargs['max_overflow'])
+        self.assertFalse('pool_timeout' in kwargs)
+
+    def test_no_pool_settings_for_sqlite(self):
+        session._create_engine({'sql_connection': 'sqlite://'})
+        _, kwargs = session.create_engine.call_args
+        self.assertFalse('pool_size' in kwargs)
+        self.assertFalse('max_overflow' in kwargs)
+
+
+class RequestScopeTest(testtools.TestCase):
+
+    def setUp(self):
+        super(RequestScopeTest, self).setUp()
+        util.init_db()
+        self.orig_per_request = CONF.sql_connection_per_request
+        self.checkouts = 0
+        event.listen(session._ENGINE, "checkout", self._checkout)
+
+    def tearDown(self):
+        super(RequestScopeTest, self).tearDown()
+        CONF.sql_connection_per_request = self.orig_per_request
+
+    def _checkout(self, *args):
+        self.checkouts += 1
+
+    def _queries(self):
+        for i in range(3):
+            AgentHeartBeat.get_by(instance_id=utils.generate_uuid())
+
+    def test_calls_share_one_connection(self):
+        with get_db_api().request_scope():
+            self._queries()
+        self.assertEqual(1, self.checkouts)
+
+    def test_connection_per_call_without_scope(self):
+        self._queries()
+        self.assertEqual(3, self.checkouts)
+
+    def test_scopes_do_not_nest(self):
+        with get_db_api().request_scope():
+            with get_db_api().request_scope():
+                self._queries()
+            self._queries()
+        self.assertEqual(1, self.checkouts)
+
+    def _get(self):
+        @webob.dec.wsgify
+        def app(req):
+            self._queries()
+            return webob.Response()
+
+        class ProcessingContextMiddleware(wsgi.ContextMiddleware):
+            def process_response(self, response):
+                response.headers['X-Processed'] = 'yes'
+                return response
+
+        req = webob.Request.blank('/', headers={'X-Auth-Token': 'token'})
+        return req.get_response(ProcessingContextMiddleware(app))
+
+    def test_context_middleware(self):
+        CONF.sql_connection_per_request = True
+        response = self._get()
+        self.assertEqual(1, self.checkouts)
+        self.assertEqual('yes', response.headers['X-Processed'])
+
+    def test_context_middleware_disabled(self):
+        CONF.sql_connection_per_request = False
+        response = self._get()
+        self.assertEqual(3, self.checkouts)
+        self.assertEqual('yes', response.headers['X-Processed'])
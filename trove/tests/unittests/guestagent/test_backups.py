@@ -12,13 +12,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import os
+import StringIO
+import tempfile
+
 import trove.guestagent.strategies.backup.base as backupBase
+import trove.guestagent.strategies.backup.impl as backupImpl
 import trove.guestagent.strategies.restore.base as restoreBase
 import testtools
+from mockito import when, verify, unstub, any
 from trove.common import utils
 
 BACKUP_XTRA_CLS = "trove.guestagent.strategies.backup.impl.InnoBackupEx"
 RESTORE_XTRA_CLS = "trove.guestagent.strategies.restore.impl.InnoBackupEx"
+BACKUP_XTRA_INCR_CLS = ("trove.guestagent.strategies.backup.impl."
+                        "InnoBackupExIncremental")
+RESTORE_XTRA_INCR_CLS = ("trove.guestagent.strategies.restore.impl."
+                         "InnoBackupExIncremental")
 BACKUP_SQLDUMP_CLS = "trove.guestagent.strategies.backup.impl.MySQLDump"
 RESTORE_SQLDUMP_CLS = "trove.guestagent.strategies.restore.impl.MySQLDump"
 PIPE = " | "
@@ -35,6 +46,12 @@ SQLDUMP_RESTORE = "mysql --password=password -u user"
 PREPARE = "sudo innobackupex --apply-log /var/lib/mysql " \
           "--defaults-file=/var/lib/mysql/backup-my.cnf " \
           "--ibbackup xtrabackup 2>/tmp/innoprepare.log"
+XTRA_INCR_BACKUP = "sudo innobackupex --stream=xbstream --incremental " \
+                   "--incremental-lsn=1234 /var/lib/mysql 2>" \
+                   "/tmp/innobackupex.log"
+INCR_PREPARE = "sudo innobackupex --apply-log --redo-only /var/lib/mysql " \
+               "--defaults-file=/var/lib/mysql/backup-my.cnf " \
+               "--ibbackup xtrabackup%s 2>/tmp/innoprepare.log"
 CRYPTO_KEY = "default_aes_cbc_key"
 
 
@@ -112,3 +129,115 @@ class GuestAgentBackupTest(testtools.TestCase):
         self.assertEqual(restr.restore_cmd,
                          DECRYPT + PIPE + UNZIP + PIPE + SQLDUMP_RESTORE)
         self.assertIsNone(restr.prepare_cmd)
+
+    def test_backup_incremental_xtrabackup_command(self):
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        RunnerClass = utils.import_class(BACKUP_XTRA_INCR_CLS)
+        bkup = RunnerClass(12345, user="user", password="password",
+                           lsn=1234)
+        self.assertEqual(bkup.command, XTRA_INCR_BACKUP + PIPE + ZIP)
+        self.assertEqual(bkup.manifest, "12345.xbstream.gz")
+
+    def test_backup_xtrabackup_metadata(self):
+        fd, log = tempfile.mkstemp()
+        self.addCleanup(os.remove, log)
+        with os.fdopen(fd, 'w') as log_file:
+            log_file.write("xtrabackup: The latest check point (for "
+                           "incremental): '1626007'\n")
+        self.addCleanup(setattr, backupImpl, 'INNOBACKUPEX_LOG',
+                        backupImpl.INNOBACKUPEX_LOG)
+        backupImpl.INNOBACKUPEX_LOG = log
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, user="user", password="password")
+        self.assertEqual({'lsn': 1626007}, bkup.metadata())
+
+
+class GuestAgentIncrementalRestoreTest(testtools.TestCase):
+
+    def setUp(self):
+        super(GuestAgentIncrementalRestoreTest, self).setUp()
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        when(utils).execute(any(), shell=True).thenReturn(('', ''))
+        when(utils).execute_with_timeout(any(), any(), any(),
+                                         any()).thenReturn(('', ''))
+
+    def tearDown(self):
+        super(GuestAgentIncrementalRestoreTest, self).tearDown()
+        unstub()
+
+    def test_restore_chain(self):
+        RunnerClass = utils.import_class(RESTORE_XTRA_INCR_CLS)
+        incrementals = [{'restore_stream': 'incr1', 'compression': 'gzip',
+                         'encryption': 'none'},
+                        {'restore_stream': 'incr2', 'compression': 'none',
+                         'encryption': 'none'}]
+        restr = RunnerClass('full', restore_location="/var/lib/mysql",
+                            incrementals=incrementals)
+        unpacked = []
+        restr._unpack = lambda stream, cmd, decoder: unpacked.append(
+            (stream, cmd)) or 10
+        restr._wait_for_unpack = lambda: None
+
+        self.assertEqual(30, restr._run_restore())
+
+        incremental_restore = "sudo xbstream -x -C /var/lib/mysql/incremental"
+        self.assertEqual([('full', UNZIP + PIPE + XTRA_RESTORE),
+                          ('incr1', UNZIP + PIPE + incremental_restore),
+                          ('incr2', incremental_restore)], unpacked)
+        verify(utils).execute(INCR_PREPARE % '', shell=True)
+        verify(utils, times=2).execute(
+            INCR_PREPARE % ' --incremental-dir=/var/lib/mysql/incremental',
+            shell=True)
+        verify(utils, times=2).execute_with_timeout(
+            "sudo", "rm", "-rf", "/var/lib/mysql/incremental")
+
+
+class FakeProgress(object):
+
+    def __init__(self):
+        self.bytes_restored = 0
+
+    def update(self, length):
+        self.bytes_restored += length
+
+
+class GuestAgentRestoreStreamTest(testtools.TestCase):
+
+    def setUp(self):
+        super(GuestAgentRestoreStreamTest, self).setUp()
+        self.addCleanup(setattr, restoreBase.RestoreRunner, 'read_ahead',
+                        restoreBase.RestoreRunner.read_ahead)
+        self.data = 'x' * (restoreBase.CHUNK_SIZE * 5 + 7)
+
+    def _unpack(self, read_ahead):
+        restoreBase.RestoreRunner.read_ahead = read_ahead
+        RunnerClass = utils.import_class(RESTORE_SQLDUMP_CLS)
+        progress = FakeProgress()
+        restr = RunnerClass(None, user="user", password="password",
+                            compression='none', encryption='none',
+                            progress=progress)
+        stream = contextlib.closing(StringIO.StringIO(self.data))
+        length = restr._unpack(stream, 'cat > /dev/null', None)
+        restr.process.wait()
+        self.assertEqual(len(self.data), progress.bytes_restored)
+        return length
+
+    def test_unpack(self):
+        self.assertEqual(len(self.data), self._unpack(0))
+
+    def test_unpack_with_read_ahead(self):
+        self.assertEqual(len(self.data), self._unpack(2))
+
+    def test_read_ahead_download_error(self):
+        restoreBase.RestoreRunner.read_ahead = 2
+        RunnerClass = utils.import_class(RESTORE_SQLDUMP_CLS)
+        restr = RunnerClass(None, user="user", password="password")
+
+        class BrokenStream(object):
+            def read(self, size):
+                raise IOError("Connection reset")
+
+        chunks = restr._read_chunks(BrokenStream())
+        self.assertRaises(IOError, list, chunks)
@@ -15,6 +15,7 @@
 import os
 import __builtin__
 from random import randint
+import tempfile
 import time
 
 from mock import Mock
@@ -68,6 +69,7 @@ class FakeAppStatus(MySqlAppStatus):
     def __init__(self, id, status):
         self.id = id
         self.next_fake_status = status
+        super(FakeAppStatus, self).__init__()
 
     def _get_actual_db_status(self):
         return self.next_fake_status
@@ -870,6 +872,29 @@ class InterrogatorTest(testtools.TestCase):
         dbaas.utils.execute_with_timeout = self.orig_utils_execute_with_timeout
         dbaas.LOG = self.orig_LOG_err
 
+    def test_get_process_stats(self):
+
+        fd, status_file = tempfile.mkstemp()
+        self.addCleanup(os.remove, status_file)
+        with os.fdopen(fd, 'w') as f:
+            f.write("Name:\tpython\n"
+                    "FDSize:\t64\n"
+                    "VmPeak:\t   29160 kB\n"
+                    "VmSize:\t   29096 kB\n"
+                    "VmHWM:\t    2872 kB\n"
+                    "VmRSS:\t    2800 kB\n"
+                    "Threads:\t2\n")
+
+        stats = Interrogator().get_process_stats(status_file)
+
+        self.assertEqual(2, stats['threads'])
+        self.assertEqual(64, stats['fd_size'])
+        self.assertEqual(29160, stats['vm_peak'])
+        self.assertEqual(29096, stats['vm_size'])
+        self.assertEqual(2872, stats['vm_hwm'])
+        self.assertEqual(2800, stats['vm_rss'])
+        self.assertIn('version', stats)
+
     def test_get_filesystem_volume_stats(self):
 
         path = 'aPath'
@@ -1022,6 +1047,81 @@ class MySqlAppStatusTest(testtools.TestCase):
         self.assertEqual(ServiceStatuses.SHUTDOWN, self.mySqlAppStatus.status)
         self.assertFalse(self.mySqlAppStatus.restart_mode)
 
+    def test_set_status_through_conductor(self):
+
+        dbaas.CONF.guest_use_conductor = True
+        self.addCleanup(setattr, dbaas.CONF, 'guest_use_conductor', False)
+        heartbeat = Mock()
+        self.addCleanup(setattr, dbaas.conductor_api.API, 'heartbeat',
+                        dbaas.conductor_api.API.heartbeat)
+        dbaas.conductor_api.API.heartbeat = heartbeat
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.set_status(ServiceStatuses.RUNNING)
+
+        heartbeat.assert_called_once_with(
+            self.FAKE_ID, status_code=ServiceStatuses.RUNNING.code)
+        self.assertEqual(ServiceStatuses.RUNNING, self.mySqlAppStatus.status)
+        db_status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertEqual(ServiceStatuses.NEW, db_status.status)
+
+    def test_set_status_skips_unchanged_status(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.set_status(ServiceStatuses.RUNNING)
+        updated = InstanceServiceStatus.find_by(
+            instance_id=self.FAKE_ID).updated_at
+        self.mySqlAppStatus.set_status(ServiceStatuses.RUNNING)
+
+        stats = self.mySqlAppStatus.get_stats()
+        self.assertEqual(1, stats['status_writes'])
+        self.assertEqual(1, stats['status_writes_skipped'])
+        db_status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertEqual(ServiceStatuses.RUNNING, db_status.status)
+        self.assertEqual(updated, db_status.updated_at)
+
+    def test_set_status_overwrites_status_set_elsewhere(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus._get_actual_db_status = \
+            Mock(return_value=ServiceStatuses.RUNNING)
+        self.mySqlAppStatus.update()
+        # The taskmanager pauses the instance and waits for the guest to
+        # report its real status.
+        paused = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        paused.set_status(ServiceStatuses.PAUSED)
+        paused.save()
+        self.mySqlAppStatus.update()
+
+        db_status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertEqual(ServiceStatuses.RUNNING, db_status.status)
+        self.assertEqual(2, self.mySqlAppStatus.status_writes)
+        self.assertEqual(0, self.mySqlAppStatus.status_writes_skipped)
+
+    def test_set_status_writes_changed_status(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.set_status(ServiceStatuses.RUNNING)
+        self.mySqlAppStatus.set_status(ServiceStatuses.SHUTDOWN)
+
+        self.assertEqual(2, self.mySqlAppStatus.status_writes)
+        db_status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertEqual(ServiceStatuses.SHUTDOWN, db_status.status)
+
+    def test_set_status_refreshes_old_status(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.set_status(ServiceStatuses.RUNNING)
+        updated = InstanceServiceStatus.find_by(
+            instance_id=self.FAKE_ID).updated_at
+        self.mySqlAppStatus._last_write -= dbaas.CONF.status_refresh_interval
+        self.mySqlAppStatus.set_status(ServiceStatuses.RUNNING)
+
+        self.assertEqual(2, self.mySqlAppStatus.status_writes)
+        self.assertEqual(0, self.mySqlAppStatus.status_writes_skipped)
+        db_status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertTrue(db_status.updated_at > updated)
+
     def test_get_actual_db_status(self):
 
         dbaas.utils.execute_with_timeout = Mock(return_value=(None, None))
@@ -1031,6 +1131,41 @@ class MySqlAppStatusTest(testtools.TestCase):
 
         self.assertEqual(ServiceStatuses.RUNNING, status)
 
+    def test_get_actual_db_status_over_connection(self):
+
+        dbaas.CONF.mysql_status_probe = 'connection'
+        self.addCleanup(setattr, dbaas.CONF, 'mysql_status_probe', 'process')
+        self.addCleanup(setattr, dbaas, 'get_engine', dbaas.get_engine)
+        engine = MagicMock()
+        dbaas.get_engine = Mock(return_value=engine)
+        dbaas.utils.execute_with_timeout = Mock()
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        status = self.mySqlAppStatus._get_actual_db_status()
+
+        self.assertEqual(ServiceStatuses.RUNNING, status)
+        self.assertTrue(engine.connect.return_value.execute.called)
+        self.assertFalse(dbaas.utils.execute_with_timeout.called)
+        stats = self.mySqlAppStatus.get_stats()
+        self.assertIsNotNone(stats['status_probe_latency'])
+        self.assertEqual(0, stats['status_probe_fallbacks'])
+
+    def test_get_actual_db_status_connection_fallback(self):
+
+        from trove.common.exception import ProcessExecutionError
+        dbaas.CONF.mysql_status_probe = 'connection'
+        self.addCleanup(setattr, dbaas.CONF, 'mysql_status_probe', 'process')
+        self.addCleanup(setattr, dbaas, 'get_engine', dbaas.get_engine)
+        dbaas.get_engine = Mock(side_effect=ProcessExecutionError())
+        dbaas.utils.execute_with_timeout = Mock(return_value=(None, None))
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        status = self.mySqlAppStatus._get_actual_db_status()
+
+        self.assertEqual(ServiceStatuses.RUNNING, status)
+        self.assertTrue(dbaas.utils.execute_with_timeout.called)
+        self.assertEqual(1, self.mySqlAppStatus.probe_fallbacks)
+
     def test_get_actual_db_status_error_shutdown(self):
 
         from trove.common.exception import ProcessExecutionError
@@ -25,6 +25,7 @@ from trove.common.context import TroveContext
 from trove.guestagent.manager.mysql import Manager
 import trove.guestagent.manager.mysql_service as dbaas
 from trove.guestagent import backup
+from trove.guestagent.dbaas import Interrogator
 from trove.guestagent.volume import VolumeDevice
 
 
@@ -64,6 +65,20 @@ class GuestAgentManagerTest(testtools.TestCase):
         verify(dbaas.MySqlAppStatus).get()
         verify(mock_status).update()
 
+    def test_get_diagnostics(self):
+        mock_status = mock()
+        when(dbaas.MySqlAppStatus).get().thenReturn(mock_status)
+        when(mock_status).get_stats().thenReturn({'status_writes': 1})
+        when(Interrogator).get_process_stats().thenReturn({'threads': 2})
+        diagnostics = self.manager.get_diagnostics(self.context)
+        self.assertThat(diagnostics,
+                        Equals({'threads': 2, 'status_writes': 1}))
+
+    def test_get_restore_progress(self):
+        when(backup).restore_progress().thenReturn({'bytes_restored': 10})
+        progress = self.manager.get_restore_progress(self.context)
+        self.assertThat(progress, Equals({'bytes_restored': 10}))
+
     def test_create_database(self):
         when(dbaas.MySqlAdmin).create_database(['db1']).thenReturn(None)
         self.manager.create_database(self.context, ['db1'])
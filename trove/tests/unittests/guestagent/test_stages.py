@@ -0,0 +1,177 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gzip
+import hashlib
+import os
+import StringIO
+import subprocess
+
+import testtools
+
+import trove.guestagent.strategies.backup.base as backupBase
+import trove.guestagent.strategies.restore.base as restoreBase
+from trove.common import utils
+from trove.guestagent.strategies import stages
+
+BACKUP_SQLDUMP_CLS = "trove.guestagent.strategies.backup.impl.MySQLDump"
+RESTORE_SQLDUMP_CLS = "trove.guestagent.strategies.restore.impl.MySQLDump"
+KEY = "default_aes_cbc_key"
+
+
+def run_stage(stage, data, chunk_size=1000):
+    output = [stage.process(data[start:start + chunk_size])
+              for start in range(0, len(data), chunk_size)]
+    output.append(stage.flush())
+    return ''.join(output)
+
+
+def openssl(*args, **kwargs):
+    process = subprocess.Popen(('openssl', 'enc', '-aes-256-cbc', '-md',
+                                'md5', '-pass', 'pass:%s' % KEY) + args,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    out, err = process.communicate(kwargs['data'])
+    if process.returncode:
+        raise RuntimeError(err)
+    return out
+
+
+class StagesTest(testtools.TestCase):
+
+    def setUp(self):
+        super(StagesTest, self).setUp()
+        self.data = os.urandom(5000) + 'a' * 100000 + os.urandom(3)
+
+    def test_gzip(self):
+        compressed = run_stage(stages.GzipCompressor(), self.data)
+
+        self.assertTrue(len(compressed) < len(self.data))
+        self.assertEqual(self.data, gzip.GzipFile(
+            fileobj=StringIO.StringIO(compressed)).read())
+        self.assertEqual(self.data,
+                         run_stage(stages.GzipDecompressor(), compressed))
+
+    def test_parallel_gzip_writes_gzip_members(self):
+        self.addCleanup(setattr, stages, 'GZIP_BLOCK_SIZE',
+                        stages.GZIP_BLOCK_SIZE)
+        stages.GZIP_BLOCK_SIZE = 10000
+
+        compressed = run_stage(stages.ParallelGzipCompressor(3), self.data)
+
+        self.assertEqual(self.data, gzip.GzipFile(
+            fileobj=StringIO.StringIO(compressed)).read())
+        self.assertEqual(self.data,
+                         run_stage(stages.GzipDecompressor(), compressed,
+                                   chunk_size=777))
+
+    def test_aes(self):
+        encrypted = run_stage(stages.AESEncryptor(KEY), self.data)
+
+        self.assertTrue(encrypted.startswith('Salted__'))
+        self.assertEqual(self.data,
+                         run_stage(stages.AESDecryptor(KEY), encrypted,
+                                   chunk_size=7))
+
+    def test_aes_wrong_key(self):
+        # A random salt would let the wrong key yield a valid padding now
+        # and then.
+        self.patch(stages.os, 'urandom', lambda size: 'NaCl' * 2)
+        encrypted = run_stage(stages.AESEncryptor(KEY), 'data')
+
+        self.assertRaises(stages.StageError, run_stage,
+                          stages.AESDecryptor('wrong'), encrypted)
+
+    def test_aes_matches_openssl(self):
+        try:
+            from_openssl = openssl(data=self.data)
+        except OSError:
+            self.skipTest("openssl is not installed.")
+        encrypted = run_stage(stages.AESEncryptor(KEY), self.data)
+
+        self.assertEqual(self.data, openssl('-d', data=encrypted))
+        self.assertEqual(self.data,
+                         run_stage(stages.AESDecryptor(KEY), from_openssl))
+
+    def test_encoder_and_decoder(self):
+        encoder = stages.encoder(stages.GZIP, stages.AES_256_CBC, KEY)
+        decoder = stages.decoder(stages.GZIP, stages.AES_256_CBC, KEY)
+
+        self.assertEqual(self.data,
+                         run_stage(decoder, run_stage(encoder, self.data)))
+
+    def test_no_codecs(self):
+        encoder = stages.encoder(stages.NONE, stages.NONE, KEY)
+
+        self.assertEqual(self.data, run_stage(encoder, self.data))
+
+    def test_unknown_codec(self):
+        self.assertRaises(stages.StageError, stages.decoder, 'lzma',
+                          stages.NONE, KEY)
+
+
+class RunnerStagesTest(testtools.TestCase):
+
+    def setUp(self):
+        super(RunnerStagesTest, self).setUp()
+        for cls in (backupBase.BackupRunner, restoreBase.RestoreRunner):
+            for name in ('is_zipped', 'is_encrypted', 'use_stages'):
+                self.addCleanup(setattr, cls, name, getattr(cls, name))
+                setattr(cls, name, True)
+        backupBase.BackupRunner.encrypt_key = KEY
+        restoreBase.RestoreRunner.decrypt_key = KEY
+
+    def test_backup_runs_stages_in_process(self):
+        RunnerClass = utils.import_class(BACKUP_SQLDUMP_CLS)
+        bkup = RunnerClass(12345, user="user", password="password")
+        bkup.process = type('Process', (object,), {})()
+        data = 'x' * 300000
+        bkup.process.stdout = StringIO.StringIO(data)
+
+        chunks = []
+        while not bkup.end_of_file:
+            chunks.append(bkup.read(backupBase.CHUNK_SIZE))
+        stored = ''.join(chunks)
+
+        self.assertNotIn('gzip', bkup.command)
+        self.assertNotIn(KEY, bkup.command)
+        self.assertEqual(stages.GZIP, bkup.compression)
+        self.assertEqual(stages.AES_256_CBC, bkup.encryption)
+        self.assertEqual(hashlib.md5(stored).hexdigest(),
+                         bkup.checksum.hexdigest())
+        decoder = stages.decoder(stages.GZIP, stages.AES_256_CBC, KEY)
+        self.assertEqual(data, run_stage(decoder, stored))
+
+    def test_restore_decodes_in_process(self):
+        RunnerClass = utils.import_class(RESTORE_SQLDUMP_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            user="user", password="password",
+                            compression=stages.GZIP,
+                            encryption=stages.NONE)
+
+        self.assertEqual("mysql --password=password -u user",
+                         restr.restore_cmd)
+        self.assertEqual(1, len(restr.stages.stages))
+
+    def test_restore_follows_recorded_codecs(self):
+        restoreBase.RestoreRunner.use_stages = False
+        RunnerClass = utils.import_class(RESTORE_SQLDUMP_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            user="user", password="password",
+                            compression=stages.NONE,
+                            encryption=stages.AES_256_CBC)
+
+        self.assertIsNone(restr.stages)
+        self.assertTrue(restr.restore_cmd.startswith("openssl enc -d"))
+        self.assertNotIn("gzip", restr.restore_cmd)
@@ -99,6 +99,25 @@ class TestInstanceController(TestCase):
         validator = jsonschema.Draft4Validator(schema)
         self.assertTrue(validator.is_valid(body))
 
+    def test_validate_batch(self):
+        body = {"instances": [self.instance['instance'],
+                              self.instance['instance']]}
+        schema = self.controller.get_schema('batch', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertTrue(validator.is_valid(body))
+
+    def test_validate_batch_empty(self):
+        body = {"instances": []}
+        schema = self.controller.get_schema('batch', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertFalse(validator.is_valid(body))
+
+    def test_validate_batch_invalid_instance(self):
+        body = {"instances": [{"name": "no flavor"}]}
+        schema = self.controller.get_schema('batch', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertFalse(validator.is_valid(body))
+
     def test_validate_create_complete_with_restore(self):
         body = self.instance
         body['instance']['restorePoint'] = {
@@ -108,6 +127,25 @@ class TestInstanceController(TestCase):
         validator = jsonschema.Draft4Validator(schema)
         self.assertTrue(validator.is_valid(body))
 
+    def test_validate_batch(self):
+        body = {"instances": [self.instance['instance'],
+                              self.instance['instance']]}
+        schema = self.controller.get_schema('batch', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertTrue(validator.is_valid(body))
+
+    def test_validate_batch_empty(self):
+        body = {"instances": []}
+        schema = self.controller.get_schema('batch', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertFalse(validator.is_valid(body))
+
+    def test_validate_batch_invalid_instance(self):
+        body = {"instances": [{"name": "no flavor"}]}
+        schema = self.controller.get_schema('batch', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertFalse(validator.is_valid(body))
+
     def test_validate_create_complete_with_restore(self):
         body = self.instance
         backup_id_ref = "invalid-backup-id-ref"
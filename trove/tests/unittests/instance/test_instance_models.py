@@ -0,0 +1,257 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+
+from mockito import mock, when, verify, unstub, any, never
+from novaclient import exceptions as nova_exceptions
+from testtools import TestCase
+from testtools.matchers import Equals, Is
+
+from trove.common import cfg
+from trove.common import exception
+from trove.common import utils
+from trove.common.context import TroveContext
+from trove.instance import models
+from trove.instance.models import DBInstance
+from trove.instance.models import InstanceServiceStatus
+from trove.instance.models import Instances
+from trove.instance.models import ServiceStatuses
+from trove.instance.tasks import InstanceTasks
+from trove.quota.quota import QUOTAS
+from trove.taskmanager import api as task_api
+from trove.tests.unittests.util import util
+
+
+class FakeServer(object):
+
+    def __init__(self, id, status='ACTIVE'):
+        self.id = id
+        self.status = status
+
+
+class SlowServers(object):
+    """Fake Nova servers API counting the calls in flight."""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    def get(self, server_id):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        eventlet.sleep(0)
+        self.running -= 1
+        return FakeServer(server_id)
+
+
+class InstancesLoadTest(TestCase):
+
+    def setUp(self):
+        super(InstancesLoadTest, self).setUp()
+        util.init_db()
+        self.context = TroveContext(tenant='TENANT-%s' % utils.utcnow())
+        self.db_infos = []
+        self.statuses = []
+        self.client = mock()
+        self.client.servers = mock()
+        when(models).create_nova_client(any()).thenReturn(self.client)
+
+    def tearDown(self):
+        super(InstancesLoadTest, self).tearDown()
+        unstub()
+        for status in self.statuses:
+            status.delete()
+        for db_info in self.db_infos:
+            db_info.delete()
+
+    def _create_instance(self, task_status=InstanceTasks.NONE,
+                         with_status=True):
+        db_info = DBInstance.create(name='instance',
+                                    flavor_id=1,
+                                    tenant_id=self.context.tenant,
+                                    task_status=task_status)
+        db_info.compute_instance_id = 'server-%s' % db_info.id
+        db_info.save()
+        self.db_infos.append(db_info)
+        if with_status:
+            self.statuses.append(InstanceServiceStatus.create(
+                instance_id=db_info.id, status=ServiceStatuses.RUNNING))
+        when(self.client.servers).get(db_info.compute_instance_id).thenReturn(
+            FakeServer(db_info.compute_instance_id))
+        return db_info
+
+    def test_load_only_fetches_servers_on_page(self):
+        db_infos = sorted([self._create_instance() for i in range(3)],
+                          key=lambda db_info: db_info.id)
+        self.context.limit = 2
+
+        instances, marker = Instances.load(self.context)
+
+        self.assertThat([instance.id for instance in instances],
+                        Equals([db_info.id for db_info in db_infos[:2]]))
+        self.assertThat(marker, Equals(db_infos[1].id))
+        self.assertThat(instances[0].status, Equals('ACTIVE'))
+        verify(self.client.servers).get(db_infos[0].compute_instance_id)
+        verify(self.client.servers).get(db_infos[1].compute_instance_id)
+        verify(self.client.servers, never).get(
+            db_infos[2].compute_instance_id)
+        verify(self.client.servers, never).list()
+
+    def test_load_fetches_servers_concurrently(self):
+        for i in range(3):
+            self._create_instance()
+        self.client.servers = SlowServers()
+
+        instances, marker = Instances.load(self.context)
+
+        self.assertThat(len(instances), Equals(3))
+        self.assertThat(self.client.servers.max_running, Equals(3))
+
+    def test_load_limits_concurrent_server_fetches(self):
+        for i in range(3):
+            self._create_instance()
+        self.client.servers = SlowServers()
+        self.addCleanup(setattr, cfg.CONF, 'server_load_workers',
+                        cfg.CONF.server_load_workers)
+        cfg.CONF.server_load_workers = 2
+
+        instances, marker = Instances.load(self.context)
+
+        self.assertThat(len(instances), Equals(3))
+        self.assertThat(self.client.servers.max_running, Equals(2))
+
+    def test_load_next_page(self):
+        db_infos = sorted([self._create_instance() for i in range(3)],
+                          key=lambda db_info: db_info.id)
+        self.context.limit = 2
+        self.context.marker = db_infos[1].id
+
+        instances, marker = Instances.load(self.context)
+
+        self.assertThat([instance.id for instance in instances],
+                        Equals([db_infos[2].id]))
+        self.assertThat(marker, Is(None))
+
+    def test_load_skips_building_and_missing_servers(self):
+        building = self._create_instance(task_status=InstanceTasks.BUILDING)
+        missing = self._create_instance()
+        when(self.client.servers).get(missing.compute_instance_id).thenRaise(
+            nova_exceptions.NotFound(404))
+
+        instances, marker = Instances.load(self.context)
+
+        statuses = dict((instance.id, instance.db_info.server_status)
+                        for instance in instances)
+        self.assertThat(statuses[building.id], Equals('BUILD'))
+        self.assertThat(statuses[missing.id], Equals('SHUTDOWN'))
+        verify(self.client.servers, never).get(building.compute_instance_id)
+
+    def test_load_skips_instances_without_service_status(self):
+        db_info = self._create_instance()
+        self._create_instance(with_status=False)
+
+        instances, marker = Instances.load(self.context)
+
+        self.assertThat([instance.id for instance in instances],
+                        Equals([db_info.id]))
+
+    def test_find_all_by_instance_ids(self):
+        db_infos = [self._create_instance() for i in range(3)]
+        ids = [db_info.id for db_info in db_infos[:2]]
+
+        statuses = InstanceServiceStatus.find_all_by_instance_ids(ids)
+
+        self.assertThat(sorted(statuses.keys()), Equals(sorted(ids)))
+        self.assertThat(statuses[ids[0]].status,
+                        Equals(ServiceStatuses.RUNNING))
+
+
+class FakeFlavor(object):
+
+    def __init__(self, id, ram=512, ephemeral=0):
+        self.id = id
+        self.ram = ram
+        self.ephemeral = ephemeral
+
+
+class CreateBatchTest(TestCase):
+
+    def setUp(self):
+        super(CreateBatchTest, self).setUp()
+        util.init_db()
+        self.context = TroveContext(tenant='TENANT-%s' % utils.utcnow())
+        self.client = mock()
+        self.client.flavors = mock()
+        when(models).create_nova_client(any()).thenReturn(self.client)
+        when(self.client.flavors).get('1').thenReturn(FakeFlavor('1'))
+        when(self.client.flavors).get('2').thenReturn(FakeFlavor('2', 1024))
+        when(QUOTAS).reserve(any(), instances=any(),
+                             volumes=any()).thenReturn(['reservation'])
+        when(QUOTAS).commit(any()).thenReturn(None)
+        when(QUOTAS).rollback(any()).thenReturn(None)
+        when(task_api.API).create_instances(any()).thenReturn(None)
+        self.orig_chunk_size = cfg.CONF.instance_batch_chunk_size
+        cfg.CONF.instance_batch_chunk_size = 2
+
+    def tearDown(self):
+        super(CreateBatchTest, self).tearDown()
+        cfg.CONF.instance_batch_chunk_size = self.orig_chunk_size
+        unstub()
+        for db_info in DBInstance.find_all(tenant_id=self.context.tenant):
+            for status in InstanceServiceStatus.find_all(
+                    instance_id=db_info.id):
+                status.delete()
+            db_info.delete()
+
+    def _args(self, name, flavor_id='1', volume_size=1):
+        return {'name': name, 'flavor_id': flavor_id, 'image_id': 'image',
+                'databases': [], 'users': [], 'service_type': 'mysql',
+                'volume_size': volume_size, 'backup_id': None}
+
+    def test_create_batch(self):
+        instances = models.Instance.create_batch(
+            self.context, [self._args('a'), self._args('b', '2', 2),
+                           self._args('c', volume_size=3)])
+
+        self.assertThat([instance.name for instance in instances],
+                        Equals(['a', 'b', 'c']))
+        verify(QUOTAS, times=1).reserve(self.context.tenant, instances=3,
+                                        volumes=6)
+        verify(QUOTAS).commit(['reservation'])
+        verify(task_api.API, times=2).create_instances(any())
+        for instance in instances:
+            db_info = DBInstance.find_by(id=instance.id)
+            self.assertThat(db_info.task_status,
+                            Equals(InstanceTasks.BUILDING))
+            status = InstanceServiceStatus.find_by(instance_id=instance.id)
+            self.assertThat(status.status, Equals(ServiceStatuses.NEW))
+
+    def test_create_batch_checks_every_flavor_once(self):
+        models.Instance.create_batch(
+            self.context, [self._args('a'), self._args('b')])
+        verify(self.client.flavors, times=1).get('1')
+
+    def test_invalid_instance_fails_the_batch(self):
+        when(self.client.flavors).get('3').thenRaise(
+            nova_exceptions.NotFound(404))
+
+        self.assertRaises(exception.FlavorNotFound,
+                          models.Instance.create_batch, self.context,
+                          [self._args('a'), self._args('b', '3')])
+        verify(QUOTAS, never).reserve(any(), instances=any(),
+                                      volumes=any())
+        self.assertThat(
+            DBInstance.find_all(tenant_id=self.context.tenant).count(),
+            Equals(0))
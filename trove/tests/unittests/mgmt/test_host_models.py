@@ -0,0 +1,145 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from mock import Mock
+import testtools
+
+from trove.common import cfg
+from trove.common import exception
+from trove.common import utils
+from trove.extensions.mgmt.host import models
+from trove.instance.models import DBInstance
+from trove.instance.models import InstanceServiceStatus
+from trove.instance.models import ServiceStatuses
+from trove.instance.tasks import InstanceTasks
+from trove.tests.unittests.util import util
+from trove.tests.unittests.util.query_audit import QueryAuditor
+
+CONF = cfg.CONF
+
+
+def _host_info(server_ids):
+    host_info = Mock()
+    host_info.instances = [{'uuid': server_id, 'name': 'guest'}
+                           for server_id in server_ids]
+    return host_info
+
+
+class DetailedHostTest(testtools.TestCase):
+
+    def setUp(self):
+        super(DetailedHostTest, self).setUp()
+        util.init_db()
+        self.tenant_id = utils.generate_uuid()
+
+    def _create_instance(self, with_status=True, deleted=False):
+        instance = DBInstance.create(
+            name='guest', flavor_id=1, tenant_id=self.tenant_id,
+            volume_size=1, compute_instance_id=utils.generate_uuid(),
+            task_status=InstanceTasks.BUILDING)
+        if deleted:
+            instance.deleted = True
+            instance.save()
+        if with_status:
+            InstanceServiceStatus.create(instance_id=instance.id,
+                                         status=ServiceStatuses.NEW)
+        return instance
+
+    def test_instances(self):
+        instance = self._create_instance()
+        orphan_id = utils.generate_uuid()
+        host = models.DetailedHost(_host_info([instance.compute_instance_id,
+                                               orphan_id]))
+        self.assertEqual([{'server_id': instance.compute_instance_id,
+                           'name': 'guest',
+                           'id': instance.id,
+                           'tenant_id': self.tenant_id,
+                           'status': 'BUILD'},
+                          {'server_id': orphan_id,
+                           'name': 'guest',
+                           'id': None}],
+                         host.instances)
+
+    def test_instance_without_status(self):
+        instance = self._create_instance(with_status=False)
+        host = models.DetailedHost(_host_info([instance.compute_instance_id]))
+        self.assertEqual(None, host.instances[0]['id'])
+
+    def test_live_instance_is_preferred(self):
+        deleted = self._create_instance(deleted=True)
+        live = self._create_instance()
+        live.compute_instance_id = deleted.compute_instance_id
+        live.save()
+        host = models.DetailedHost(_host_info([live.compute_instance_id]))
+        self.assertEqual(live.id, host.instances[0]['id'])
+
+    def test_one_query_for_all_instances(self):
+        server_ids = [self._create_instance().compute_instance_id
+                      for i in range(10)]
+        with QueryAuditor() as auditor:
+            host = models.DetailedHost(_host_info(server_ids))
+        self.assertEqual(1, auditor.count(), auditor.report())
+        self.assertEqual([], auditor.full_scans(), auditor.report())
+        self.assertEqual(10, len([instance for instance in host.instances
+                                  if instance['id']]))
+
+
+class UpdateAllTest(testtools.TestCase):
+
+    def setUp(self):
+        super(UpdateAllTest, self).setUp()
+        self.orig_workers = CONF.host_update_workers
+        self.orig_create_guest_client = models.create_guest_client
+        self.running = 0
+        self.most_running = 0
+        self.updated = []
+        models.create_guest_client = self._create_guest_client
+        self.host = models.DetailedHost.__new__(models.DetailedHost)
+        self.host.name = 'host'
+        self.host.instances = [{'id': 'instance%d' % i} for i in range(10)]
+
+    def tearDown(self):
+        super(UpdateAllTest, self).tearDown()
+        CONF.host_update_workers = self.orig_workers
+        models.create_guest_client = self.orig_create_guest_client
+
+    def _create_guest_client(self, context, instance_id):
+        def update_guest():
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+            eventlet.sleep(0)
+            self.running -= 1
+            if instance_id in ('instance3', 'instance7'):
+                raise exception.GuestError(original_message='failed')
+            self.updated.append(instance_id)
+        client = Mock()
+        client.update_guest = update_guest
+        return client
+
+    def test_update_all(self):
+        CONF.host_update_workers = 4
+        error = self.assertRaises(exception.UpdateGuestError,
+                                  self.host.update_all, None)
+        self.assertTrue("['instance3', 'instance7']" in str(error))
+        self.assertEqual(8, len(self.updated))
+        self.assertEqual(4, self.most_running)
+
+    def test_one_at_a_time(self):
+        CONF.host_update_workers = 1
+        del self.host.instances[3:]
+        self.host.update_all(None)
+        self.assertEqual(['instance0', 'instance1', 'instance2'],
+                         self.updated)
+        self.assertEqual(1, self.most_running)
@@ -11,10 +11,14 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import datetime
+import time
+
 import testtools
 from mockito import mock, when, unstub, any, verify, never, times
 from mock import Mock
 from trove.quota.quota import DbQuotaDriver
+from trove.quota.quota import QuotaCache
 from trove.quota.models import Resource
 from trove.quota.models import Quota
 from trove.quota.models import QuotaUsage
@@ -23,8 +27,10 @@ from trove.db.models import DatabaseModelBase
 from trove.extensions.mgmt.quota.service import QuotaController
 from trove.common import exception
 from trove.common import cfg
+from trove.common import utils
 from trove.quota.quota import run_with_quotas
 from trove.quota.quota import QUOTAS
+from trove.tests.unittests.util import util
 """
 Unit tests for the classes and functions in DbQuotaDriver.py.
 """
@@ -123,6 +129,17 @@ class QuotaControllerTest(testtools.TestCase):
         self.assertEquals(200, result.status)
         self.assertEquals(2, result._data['quotas']['instances'])
 
+    def test_update_invalidates_cached_quotas(self):
+        instance_quota = mock(Quota)
+        when(DatabaseModelBase).find_by(
+            tenant_id=FAKE_TENANT2,
+            resource='instances').thenReturn(instance_quota)
+        QUOTAS.invalidate_quotas = Mock()
+        self.addCleanup(delattr, QUOTAS, 'invalidate_quotas')
+        body = {'quotas': {'instances': 2}}
+        self.controller.update(self.req, body, FAKE_TENANT1, FAKE_TENANT2)
+        QUOTAS.invalidate_quotas.assert_called_once_with(FAKE_TENANT2)
+
     @testtools.skipIf(not CONF.trove_volume_support,
                       'Volume support is not enabled')
     def test_update_resource_volume(self):
@@ -144,6 +161,55 @@ class QuotaControllerTest(testtools.TestCase):
         self.assertEquals(10, result._data['quotas']['volumes'])
 
 
+class QuotaCacheTest(testtools.TestCase):
+
+    def setUp(self):
+        super(QuotaCacheTest, self).setUp()
+        self.loads = []
+
+    def _load(self, tenant_id):
+        self.loads.append(tenant_id)
+        return {'instances': len(self.loads)}
+
+    def test_keeps_quotas_for_ttl(self):
+        cache = QuotaCache(60)
+        cache.get(FAKE_TENANT1, self._load)
+        self.assertEquals({'instances': 1}, cache.get(FAKE_TENANT1,
+                                                      self._load))
+        cache.get(FAKE_TENANT2, self._load)
+        self.assertEquals([FAKE_TENANT1, FAKE_TENANT2], self.loads)
+
+    def test_expired_quotas_are_loaded_again(self):
+        cache = QuotaCache(60)
+        cache.get(FAKE_TENANT1, self._load)
+        cache._entries[FAKE_TENANT1] = (time.time() - 1, {})
+        self.assertEquals({'instances': 2}, cache.get(FAKE_TENANT1,
+                                                      self._load))
+
+    def test_disabled(self):
+        cache = QuotaCache(0)
+        cache.get(FAKE_TENANT1, self._load)
+        cache.get(FAKE_TENANT1, self._load)
+        self.assertEquals(2, len(self.loads))
+
+    def test_invalidate(self):
+        cache = QuotaCache(60)
+        cache.get(FAKE_TENANT1, self._load)
+        cache.invalidate(FAKE_TENANT1)
+        self.assertEquals({'instances': 2}, cache.get(FAKE_TENANT1,
+                                                      self._load))
+
+    def test_quotas_loaded_during_an_update_are_not_kept(self):
+        cache = QuotaCache(60)
+
+        def load_while_updated(tenant_id):
+            cache.invalidate(tenant_id)
+            return self._load(tenant_id)
+        cache.get(FAKE_TENANT1, load_while_updated)
+        self.assertEquals({'instances': 2}, cache.get(FAKE_TENANT1,
+                                                      self._load))
+
+
 class DbQuotaDriverTest(testtools.TestCase):
 
     def setUp(self):
@@ -194,6 +260,22 @@ class DbQuotaDriverTest(testtools.TestCase):
         self.assertEquals(Resource.INSTANCES, quota.resource)
         self.assertEquals(12, quota.hard_limit)
 
+    def test_get_all_quotas_by_tenant_is_cached(self):
+        FAKE_QUOTAS = [Quota(tenant_id=FAKE_TENANT1,
+                             resource=Resource.INSTANCES,
+                             hard_limit=22)]
+        self.mock_quota_result.all = Mock(return_value=FAKE_QUOTAS)
+
+        self.driver.get_all_quotas_by_tenant(FAKE_TENANT1, resources.keys())
+        quotas = self.driver.get_all_quotas_by_tenant(FAKE_TENANT1,
+                                                      resources.keys())
+        self.assertEquals(1, Quota.find_all.call_count)
+        self.assertEquals(22, quotas[Resource.INSTANCES].hard_limit)
+
+        self.driver.invalidate_quotas(FAKE_TENANT1)
+        self.driver.get_all_quotas_by_tenant(FAKE_TENANT1, resources.keys())
+        self.assertEquals(2, Quota.find_all.call_count)
+
     def test_get_quota_by_tenant_default(self):
 
         self.mock_quota_result.all = Mock(return_value=[])
@@ -379,35 +461,6 @@ class DbQuotaDriverTest(testtools.TestCase):
         self.assertEquals(0, usages[Resource.VOLUMES].in_use)
         self.assertEquals(0, usages[Resource.VOLUMES].reserved)
 
-    def test_reserve(self):
-
-        FAKE_QUOTAS = [QuotaUsage(id=1,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.INSTANCES,
-                                  in_use=1,
-                                  reserved=2),
-                       QuotaUsage(id=2,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.VOLUMES,
-                                  in_use=1,
-                                  reserved=1)]
-
-        self.mock_quota_result.all = Mock(return_value=[])
-        self.mock_usage_result.all = Mock(return_value=FAKE_QUOTAS)
-        QuotaUsage.save = Mock()
-        Reservation.create = Mock()
-
-        delta = {'instances': 2, 'volumes': 3}
-        self.driver.reserve(FAKE_TENANT1, resources, delta)
-        _, kw = Reservation.create.call_args_list[0]
-        self.assertEquals(1, kw['usage_id'])
-        self.assertEquals(2, kw['delta'])
-        self.assertEquals(Reservation.Statuses.RESERVED, kw['status'])
-        _, kw = Reservation.create.call_args_list[1]
-        self.assertEquals(2, kw['usage_id'])
-        self.assertEquals(3, kw['delta'])
-        self.assertEquals(Reservation.Statuses.RESERVED, kw['status'])
-
     def test_reserve_resource_unknown(self):
 
         delta = {'instances': 10, 'volumes': 2000, 'Fake_resource': 123}
@@ -417,173 +470,201 @@ class DbQuotaDriverTest(testtools.TestCase):
                           resources,
                           delta)
 
-    def test_reserve_over_quota(self):
 
-        FAKE_QUOTAS = [QuotaUsage(id=1,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.INSTANCES,
-                                  in_use=0,
-                                  reserved=0),
-                       QuotaUsage(id=2,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.VOLUMES,
-                                  in_use=0,
-                                  reserved=0)]
+class DbQuotaDriverReservationTest(testtools.TestCase):
 
-        self.mock_quota_result.all = Mock(return_value=[])
-        self.mock_usage_result.all = Mock(return_value=FAKE_QUOTAS)
+    def setUp(self):
+        super(DbQuotaDriverReservationTest, self).setUp()
+        util.init_db()
+        self.driver = DbQuotaDriver(resources)
+        self.tenant_id = utils.generate_uuid()
+
+    def _create_usage(self, resource, in_use, reserved):
+        return QuotaUsage.create(tenant_id=self.tenant_id,
+                                 resource=resource,
+                                 in_use=in_use,
+                                 reserved=reserved)
+
+    def _usage(self, resource):
+        return QuotaUsage.find_by(tenant_id=self.tenant_id, resource=resource)
+
+    def test_reserve(self):
+        instances = self._create_usage(Resource.INSTANCES, 1, 2)
+        volumes = self._create_usage(Resource.VOLUMES, 1, 1)
+
+        delta = {'instances': 2, 'volumes': 3}
+        reservations = self.driver.reserve(self.tenant_id, resources, delta)
+
+        by_usage = dict((r.usage_id, r) for r in reservations)
+        self.assertEquals(2, by_usage[instances.id].delta)
+        self.assertEquals(3, by_usage[volumes.id].delta)
+        for reservation in reservations:
+            self.assertEquals(Reservation.Statuses.RESERVED,
+                              Reservation.find_by(id=reservation.id).status)
+        self.assertEquals(4, self._usage(Resource.INSTANCES).reserved)
+        self.assertEquals(4, self._usage(Resource.VOLUMES).reserved)
+
+    def test_reserve_creates_missing_usages(self):
+        self.driver.reserve(self.tenant_id, resources, {'instances': 1})
+        usage = self._usage(Resource.INSTANCES)
+        self.assertEquals(0, usage.in_use)
+        self.assertEquals(1, usage.reserved)
+
+    def test_reserve_over_quota(self):
+        self._create_usage(Resource.INSTANCES, 0, 0)
+        self._create_usage(Resource.VOLUMES, 0, 0)
 
         delta = {'instances': 1, 'volumes': CONF.max_volumes_per_user + 1}
         self.assertRaises(exception.QuotaExceeded,
                           self.driver.reserve,
-                          FAKE_TENANT1,
+                          self.tenant_id,
                           resources,
                           delta)
+        self.assertEquals(0, self._usage(Resource.INSTANCES).reserved)
+        self.assertEquals(0, Reservation.find_all(
+            usage_id=self._usage(Resource.INSTANCES).id).count())
 
     def test_reserve_over_quota_with_usage(self):
-
-        FAKE_QUOTAS = [QuotaUsage(id=1,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.INSTANCES,
-                                  in_use=1,
-                                  reserved=0),
-                       QuotaUsage(id=2,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.VOLUMES,
-                                  in_use=0,
-                                  reserved=0)]
-
-        self.mock_quota_result.all = Mock(return_value=[])
-        self.mock_usage_result.all = Mock(return_value=FAKE_QUOTAS)
+        self._create_usage(Resource.INSTANCES, 1, 0)
+        self._create_usage(Resource.VOLUMES, 0, 0)
 
         delta = {'instances': 5, 'volumes': 3}
         self.assertRaises(exception.QuotaExceeded,
                           self.driver.reserve,
-                          FAKE_TENANT1,
+                          self.tenant_id,
                           resources,
                           delta)
 
     def test_reserve_over_quota_with_reserved(self):
-
-        FAKE_QUOTAS = [QuotaUsage(id=1,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.INSTANCES,
-                                  in_use=1,
-                                  reserved=2),
-                       QuotaUsage(id=2,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.VOLUMES,
-                                  in_use=0,
-                                  reserved=0)]
-
-        self.mock_quota_result.all = Mock(return_value=[])
-        self.mock_usage_result.all = Mock(return_value=FAKE_QUOTAS)
+        self._create_usage(Resource.INSTANCES, 1, 2)
+        self._create_usage(Resource.VOLUMES, 0, 0)
 
         delta = {'instances': 4, 'volumes': 2}
         self.assertRaises(exception.QuotaExceeded,
                           self.driver.reserve,
-                          FAKE_TENANT1,
+                          self.tenant_id,
                           resources,
                           delta)
 
-    def test_reserve_over_quota_but_can_apply_negative_deltas(self):
-
-        FAKE_QUOTAS = [QuotaUsage(id=1,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.INSTANCES,
-                                  in_use=10,
-                                  reserved=0),
-                       QuotaUsage(id=2,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.VOLUMES,
-                                  in_use=50,
-                                  reserved=0)]
-
-        self.mock_quota_result.all = Mock(return_value=[])
-        self.mock_usage_result.all = Mock(return_value=FAKE_QUOTAS)
+    def test_reserve_counts_earlier_reservations(self):
+        for i in range(CONF.max_instances_per_user):
+            self.driver.reserve(self.tenant_id, resources, {'instances': 1})
+        self.assertRaises(exception.QuotaExceeded,
+                          self.driver.reserve,
+                          self.tenant_id,
+                          resources,
+                          {'instances': 1})
 
-        QuotaUsage.save = Mock()
-        Reservation.create = Mock()
+    def test_reserve_over_quota_but_can_apply_negative_deltas(self):
+        instances = self._create_usage(Resource.INSTANCES, 10, 0)
+        volumes = self._create_usage(Resource.VOLUMES, 50, 0)
 
         delta = {'instances': -1, 'volumes': -3}
-        self.driver.reserve(FAKE_TENANT1, resources, delta)
-        _, kw = Reservation.create.call_args_list[0]
-        self.assertEquals(1, kw['usage_id'])
-        self.assertEquals(-1, kw['delta'])
-        self.assertEquals(Reservation.Statuses.RESERVED, kw['status'])
-        _, kw = Reservation.create.call_args_list[1]
-        self.assertEquals(2, kw['usage_id'])
-        self.assertEquals(-3, kw['delta'])
-        self.assertEquals(Reservation.Statuses.RESERVED, kw['status'])
-
-    def test_commit(self):
-
-        Reservation.save = Mock()
-        QuotaUsage.save = Mock()
+        reservations = self.driver.reserve(self.tenant_id, resources, delta)
 
-        FAKE_QUOTAS = [QuotaUsage(id=1,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.INSTANCES,
-                                  in_use=5,
-                                  reserved=2),
-                       QuotaUsage(id=2,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.VOLUMES,
-                                  in_use=1,
-                                  reserved=2)]
-
-        FAKE_RESERVATIONS = [Reservation(usage_id=1,
-                                         delta=1,
-                                         status=Reservation.Statuses.RESERVED),
-                             Reservation(usage_id=2,
-                                         delta=2,
-                                         status=Reservation.Statuses.RESERVED)]
+        by_usage = dict((r.usage_id, r) for r in reservations)
+        self.assertEquals(-1, by_usage[instances.id].delta)
+        self.assertEquals(-3, by_usage[volumes.id].delta)
+        self.assertEquals(0, self._usage(Resource.INSTANCES).reserved)
 
-        QuotaUsage.find_by = Mock(side_effect=FAKE_QUOTAS)
-        self.driver.commit(FAKE_RESERVATIONS)
-
-        self.assertEqual(6, FAKE_QUOTAS[0].in_use)
-        self.assertEqual(1, FAKE_QUOTAS[0].reserved)
-        self.assertEqual(Reservation.Statuses.COMMITTED,
-                         FAKE_RESERVATIONS[0].status)
-
-        self.assertEqual(3, FAKE_QUOTAS[1].in_use)
-        self.assertEqual(0, FAKE_QUOTAS[1].reserved)
-        self.assertEqual(Reservation.Statuses.COMMITTED,
-                         FAKE_RESERVATIONS[1].status)
+    def test_commit(self):
+        self._create_usage(Resource.INSTANCES, 3, 1)
+        self._create_usage(Resource.VOLUMES, 1, 0)
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': 1, 'volumes': 2})
+
+        self.driver.commit(reservations)
+
+        instances = self._usage(Resource.INSTANCES)
+        self.assertEqual(4, instances.in_use)
+        self.assertEqual(1, instances.reserved)
+        volumes = self._usage(Resource.VOLUMES)
+        self.assertEqual(3, volumes.in_use)
+        self.assertEqual(0, volumes.reserved)
+        for reservation in reservations:
+            self.assertEqual(Reservation.Statuses.COMMITTED,
+                             reservation.status)
+            self.assertEqual(Reservation.Statuses.COMMITTED,
+                             Reservation.find_by(id=reservation.id).status)
+
+    def test_commit_negative_delta(self):
+        self._create_usage(Resource.INSTANCES, 5, 0)
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': -1})
+
+        self.driver.commit(reservations)
+
+        instances = self._usage(Resource.INSTANCES)
+        self.assertEqual(4, instances.in_use)
+        self.assertEqual(0, instances.reserved)
 
     def test_rollback(self):
+        self._create_usage(Resource.INSTANCES, 3, 1)
+        self._create_usage(Resource.VOLUMES, 1, 0)
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': 1, 'volumes': 2})
+
+        self.driver.rollback(reservations)
+
+        instances = self._usage(Resource.INSTANCES)
+        self.assertEqual(3, instances.in_use)
+        self.assertEqual(1, instances.reserved)
+        volumes = self._usage(Resource.VOLUMES)
+        self.assertEqual(1, volumes.in_use)
+        self.assertEqual(0, volumes.reserved)
+        for reservation in reservations:
+            self.assertEqual(Reservation.Statuses.ROLLEDBACK,
+                             Reservation.find_by(id=reservation.id).status)
+
+    def _age(self, reservations, seconds):
+        for reservation in reservations:
+            db_reservation = Reservation.find_by(id=reservation.id)
+            db_reservation.created = (utils.utcnow() -
+                                      datetime.timedelta(seconds=seconds))
+            db_reservation.save()
+
+    def test_expire_reservations(self):
+        self._create_usage(Resource.INSTANCES, 1, 0)
+        stale = self.driver.reserve(self.tenant_id, resources,
+                                    {'instances': 2})
+        fresh = self.driver.reserve(self.tenant_id, resources,
+                                    {'instances': 1})
+        self._age(stale, 3600)
+
+        before = utils.utcnow() - datetime.timedelta(seconds=600)
+        self.assertEquals(1, self.driver.expire_reservations(before))
+
+        self.assertEquals(1, self._usage(Resource.INSTANCES).reserved)
+        self.assertEquals(Reservation.Statuses.EXPIRED,
+                          Reservation.find_by(id=stale[0].id).status)
+        self.assertEquals(Reservation.Statuses.RESERVED,
+                          Reservation.find_by(id=fresh[0].id).status)
+
+    def test_commit_after_expiry_is_ignored(self):
+        self._create_usage(Resource.INSTANCES, 1, 0)
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': 1})
+        self._age(reservations, 3600)
+        self.driver.expire_reservations(utils.utcnow())
+
+        self.driver.commit(reservations)
+
+        usage = self._usage(Resource.INSTANCES)
+        self.assertEquals(1, usage.in_use)
+        self.assertEquals(0, usage.reserved)
 
-        Reservation.save = Mock()
-        QuotaUsage.save = Mock()
 
-        FAKE_QUOTAS = [QuotaUsage(id=1,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.INSTANCES,
-                                  in_use=5,
-                                  reserved=2),
-                       QuotaUsage(id=2,
-                                  tenant_id=FAKE_TENANT1,
-                                  resource=Resource.VOLUMES,
-                                  in_use=1,
-                                  reserved=2)]
-
-        FAKE_RESERVATIONS = [Reservation(usage_id=1,
-                                         delta=1,
-                                         status=Reservation.Statuses.RESERVED),
-                             Reservation(usage_id=2,
-                                         delta=2,
-                                         status=Reservation.Statuses.RESERVED)]
-
-        QuotaUsage.find_by = Mock(side_effect=FAKE_QUOTAS)
-        self.driver.rollback(FAKE_RESERVATIONS)
-
-        self.assertEqual(5, FAKE_QUOTAS[0].in_use)
-        self.assertEqual(1, FAKE_QUOTAS[0].reserved)
-        self.assertEqual(Reservation.Statuses.ROLLEDBACK,
-                         FAKE_RESERVATIONS[0].status)
-
-        self.assertEqual(1, FAKE_QUOTAS[1].in_use)
-        self.assertEqual(0, FAKE_QUOTAS[1].reserved)
-        self.assertEqual(Reservation.Statuses.ROLLEDBACK,
-                         FAKE_RESERVATIONS[1].status)
+class QuotaModelTest(testtools.TestCase):
+
+    def setUp(self):
+        super(QuotaModelTest, self).setUp()
+        util.init_db()
+
+    def test_create(self):
+        quota = Quota.create(tenant_id=FAKE_TENANT1,
+                             resource=Resource.BACKUPS,
+                             hard_limit=7)
+        found = Quota.find_by(id=quota.id)
+        self.assertEqual(7, found.hard_limit)
+        self.assertEqual(Resource.BACKUPS, found.resource)
+        found.delete()
@@ -0,0 +1,171 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+import eventlet
+from mockito import mock, when, verify, unstub, any
+import testtools
+from testtools.matchers import Equals, LessThan
+
+from trove.common import cfg
+from trove.common.exception import PollTimeOut
+from trove.taskmanager import api as task_api
+from trove.taskmanager import events
+from trove.taskmanager.manager import Manager
+
+CONF = cfg.CONF
+
+
+class Counter(object):
+
+    def __init__(self, ready_after):
+        self.calls = 0
+        self.ready_after = ready_after
+
+    def __call__(self):
+        self.calls += 1
+        return self.calls > self.ready_after
+
+
+class WaitUntilTest(testtools.TestCase):
+
+    def setUp(self):
+        super(WaitUntilTest, self).setUp()
+        self.orig_sources = CONF.task_event_sources
+        self.orig_interval = CONF.task_wait_fallback_interval
+        CONF.task_event_sources = [events.GUEST, events.COMPUTE]
+        CONF.task_wait_fallback_interval = 30
+
+    def tearDown(self):
+        super(WaitUntilTest, self).tearDown()
+        CONF.task_event_sources = self.orig_sources
+        CONF.task_wait_fallback_interval = self.orig_interval
+        unstub()
+
+    def _notify_later(self, key):
+        def notify():
+            eventlet.sleep(0.01)
+            events.notify(key)
+        return eventlet.spawn(notify)
+
+    def test_returns_at_once_when_ready(self):
+        retriever = Counter(0)
+        self.assertTrue(events.wait_until(retriever, instance_id='1'))
+        self.assertThat(retriever.calls, Equals(1))
+        self.assertThat(events.waiting(), Equals(0))
+
+    def test_woken_up_by_instance_notification(self):
+        retriever = Counter(1)
+        self._notify_later('1')
+        start = time.time()
+        events.wait_until(retriever, instance_id='1', time_out=10)
+        self.assertThat(time.time() - start, LessThan(5))
+        self.assertThat(retriever.calls, Equals(2))
+        self.assertThat(events.waiting(), Equals(0))
+
+    def test_woken_up_by_server_notification(self):
+        retriever = Counter(1)
+        self._notify_later('server-1')
+        events.wait_until(retriever, instance_id='1', server_id='server-1',
+                          time_out=10)
+        self.assertThat(retriever.calls, Equals(2))
+
+    def test_other_notifications_are_ignored(self):
+        retriever = Counter(5)
+        self._notify_later('2')
+        self.assertRaises(PollTimeOut, events.wait_until, retriever,
+                          instance_id='1', time_out=0.1)
+        self.assertThat(retriever.calls, Equals(2))
+        self.assertThat(events.waiting(), Equals(0))
+
+    def test_polls_without_event_sources(self):
+        CONF.task_event_sources = []
+        retriever = Counter(2)
+        events.wait_until(retriever, instance_id='1', sleep_time=0.01,
+                          time_out=10)
+        self.assertThat(retriever.calls, Equals(3))
+        self.assertThat(events.waiting(), Equals(0))
+
+    def test_fallback_poll(self):
+        CONF.task_wait_fallback_interval = 0.01
+        retriever = Counter(2)
+        events.wait_until(retriever, instance_id='1', sleep_time=0.001,
+                          time_out=10)
+        self.assertThat(retriever.calls, Equals(3))
+
+    def test_condition(self):
+        values = iter(['BUILD', 'ACTIVE'])
+
+        def retriever():
+            return values.next()
+        self._notify_later('server-1')
+        result = events.wait_until(retriever, lambda v: v != 'BUILD',
+                                   server_id='server-1', time_out=10)
+        self.assertThat(result, Equals('ACTIVE'))
+
+
+class TaskManagerEventsTest(testtools.TestCase):
+
+    def setUp(self):
+        super(TaskManagerEventsTest, self).setUp()
+        self.orig_sources = CONF.task_event_sources
+        self.manager = Manager()
+
+    def tearDown(self):
+        super(TaskManagerEventsTest, self).tearDown()
+        CONF.task_event_sources = self.orig_sources
+        unstub()
+
+    def test_instance_status_changed(self):
+        when(events).notify(any()).thenReturn(None)
+        self.manager.instance_status_changed(None, ['1', '2'])
+        verify(events).notify('1')
+        verify(events).notify('2')
+
+    def test_compute_notification(self):
+        when(events).notify(any()).thenReturn(None)
+        self.manager._compute_notification(
+            {'event_type': 'compute.instance.create.end',
+             'payload': {'instance_id': 'server-1', 'state': 'active'}})
+        self.manager._compute_notification(
+            {'event_type': 'volume.create.end',
+             'payload': {'volume_id': 'volume-1'}})
+        verify(events, times=1).notify(any())
+        verify(events).notify('server-1')
+
+    def test_compute_notifications_are_consumed(self):
+        CONF.task_event_sources = [events.COMPUTE]
+        service = mock()
+        service.conn = mock()
+        service.host = 'host-1'
+        self.manager.initialize_service_hook(service)
+        verify(service.conn).join_consumer_pool(
+            self.manager._compute_notification,
+            '%s.notifications.host-1' % CONF.taskmanager_queue,
+            CONF.nova_notification_topic,
+            CONF.nova_notification_exchange)
+
+    def test_notification_pool_is_not_the_node_queue(self):
+        # The RPC service consumes '<topic>.<host>' for calls to this host.
+        node_topic = '%s.%s' % (CONF.taskmanager_queue, 'host-1')
+        self.assertNotEqual(node_topic,
+                            self.manager._notification_pool('host-1'))
+
+    def test_status_changes_are_broadcast(self):
+        api = task_api.API(None)
+        when(api)._fanout_cast(any(), instance_ids=any()).thenReturn(None)
+        api.instance_status_changed(['1'])
+        verify(api)._fanout_cast('instance_status_changed',
+                                 instance_ids=['1'])
@@ -18,6 +18,96 @@ import trove.taskmanager.models as taskmanager_models
 import trove.backup.models as backup_models
 from mockito import mock, when, unstub, any, verify, never
 from swiftclient.client import ClientException
+from testtools.matchers import Equals
+from trove.common.context import TroveContext
+from trove.extensions.security_group.models import SecurityGroup
+from trove.instance.models import DBInstance
+from trove.instance.tasks import InstanceTasks
+from trove.openstack.common import jsonutils
+from trove.tests.unittests.util import util
+
+
+class FreshInstanceTasksTest(testtools.TestCase):
+    def setUp(self):
+        super(FreshInstanceTasksTest, self).setUp()
+        util.init_db()
+        self.context = TroveContext(tenant='tenant')
+        self.db_info = DBInstance.create(name='instance', flavor_id=1,
+                                         tenant_id='tenant',
+                                         task_status=InstanceTasks.BUILDING)
+        self.instance = taskmanager_models.FreshInstanceTasks(
+            self.context, self.db_info, None, None)
+        self.volume_info = {'device_path': '/dev/vdb',
+                            'mount_point': '/var/lib/mysql'}
+        when(self.instance)._build_volume_info(any()).thenReturn(
+            self.volume_info)
+        when(self.instance)._create_server_volume_individually(
+            any(), any(), any(), any(), any()).thenReturn(
+                ('server', self.volume_info))
+        when(self.instance)._create_dns_entry().thenReturn(None)
+        when(self.instance)._guest_prepare(
+            any(), any(), any(), any(), any(), any()).thenReturn(None)
+        when(self.instance)._service_is_active().thenReturn(True)
+        when(self.instance).send_usage_event(
+            any(), instance_size=any()).thenReturn(None)
+
+    def tearDown(self):
+        super(FreshInstanceTasksTest, self).tearDown()
+        unstub()
+        self.db_info.delete()
+
+    def _create_instance(self, security_groups=None):
+        self.instance.create_instance(1, 512, 'image', [], [], 'mysql', 1,
+                                      security_groups, None)
+
+    def test_create_instance_creates_security_group(self):
+        when(SecurityGroup).create_for_instance(
+            self.db_info.id, self.context).thenReturn({'name': 'SecGroup'})
+        self._create_instance()
+
+        verify(self.instance)._create_server_volume_individually(
+            1, 'image', ['SecGroup'], 'mysql', self.volume_info)
+        verify(self.instance)._guest_prepare(
+            'server', 512, self.volume_info, [], [], None)
+        db_info = DBInstance.find_by(id=self.db_info.id)
+        self.assertThat(db_info.task_status, Equals(InstanceTasks.NONE))
+
+    def test_create_instance_records_build_timings(self):
+        when(SecurityGroup).create_for_instance(
+            any(), any()).thenReturn({'name': 'SecGroup'})
+        self._create_instance(security_groups=['given'])
+
+        verify(SecurityGroup, never).create_for_instance(any(), any())
+        db_info = DBInstance.find_by(id=self.db_info.id)
+        timings = jsonutils.loads(db_info.build_timings)
+        self.assertThat(sorted(timings),
+                        Equals(['dns', 'guest_prepare', 'security_groups',
+                                'server', 'service_active', 'volume']))
+
+    def test_security_group_failure(self):
+        when(SecurityGroup).create_for_instance(
+            any(), any()).thenRaise(Exception("Nova is down."))
+
+        self.assertRaises(Exception, self._create_instance)
+        verify(self.instance, never)._create_server_volume_individually(
+            any(), any(), any(), any(), any())
+        db_info = DBInstance.find_by(id=self.db_info.id)
+        self.assertThat(db_info.task_status,
+                        Equals(InstanceTasks.BUILDING_ERROR_SEC_GROUP))
+        self.assertTrue('volume' in jsonutils.loads(db_info.build_timings))
+
+    def test_dns_failure_stops_guest_prepare(self):
+        when(SecurityGroup).create_for_instance(
+            any(), any()).thenReturn({'name': 'SecGroup'})
+        when(self.instance)._create_dns_entry().thenRaise(
+            Exception("DNS is down."))
+
+        self.assertRaises(Exception, self._create_instance)
+        verify(self.instance, never)._guest_prepare(
+            any(), any(), any(), any(), any(), any())
+        db_info = DBInstance.find_by(id=self.db_info.id)
+        self.assertThat(db_info.task_status,
+                        Equals(InstanceTasks.BUILDING_ERROR_DNS))
 
 
 class BackupTasksTest(testtools.TestCase):
@@ -0,0 +1,177 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import event
+from mockito import mock, when, verify, unstub, any
+import testtools
+from testtools.matchers import Equals
+
+from trove.instance.models import BuiltInstance
+from trove.taskmanager import scheduler
+from trove.taskmanager.manager import Manager
+from trove.taskmanager.scheduler import TaskScheduler
+
+
+def run_others():
+    """Lets the green threads started by the scheduler run their course."""
+    for i in range(10):
+        eventlet.sleep(0)
+
+
+class BlockingTasks(object):
+    """Tasks which run until they are released."""
+
+    def __init__(self):
+        self.started = []
+        self.release = event.Event()
+
+    def __call__(self, name):
+        self.started.append(name)
+        self.release.wait()
+
+
+class TaskSchedulerTest(testtools.TestCase):
+
+    def setUp(self):
+        super(TaskSchedulerTest, self).setUp()
+        self.tasks = BlockingTasks()
+
+    def _submit(self, task_scheduler, operation, tenant, name):
+        task_scheduler.submit(operation, tenant, self.tasks, name)
+        run_others()
+
+    def _finish(self):
+        self.tasks.release.send()
+        run_others()
+
+    def test_global_limit(self):
+        task_scheduler = TaskScheduler(max_running=2)
+        for i in range(3):
+            self._submit(task_scheduler, 'create', 'tenant-%d' % i, i)
+
+        self.assertThat(self.tasks.started, Equals([0, 1]))
+        self.assertThat(task_scheduler.stats()['queued'], Equals(1))
+        self._finish()
+        self.assertThat(self.tasks.started, Equals([0, 1, 2]))
+
+    def test_tenant_limit(self):
+        task_scheduler = TaskScheduler(max_running=10, max_per_tenant=2)
+        for i in range(5):
+            self._submit(task_scheduler, 'create', 'greedy', 'greedy-%d' % i)
+        self._submit(task_scheduler, 'create', 'other', 'other')
+
+        self.assertThat(self.tasks.started,
+                        Equals(['greedy-0', 'greedy-1', 'other']))
+        stats = task_scheduler.stats()
+        self.assertThat(stats['running'], Equals(3))
+        self.assertThat(stats['queued'], Equals(3))
+        self.assertThat(stats['tenants_running'], Equals(2))
+
+    def test_tenants_take_turns(self):
+        task_scheduler = TaskScheduler(max_running=1)
+        self._submit(task_scheduler, 'create', 'blocker', 'blocker')
+        for i in range(3):
+            self._submit(task_scheduler, 'create', 'greedy', 'greedy-%d' % i)
+        self._submit(task_scheduler, 'create', 'other', 'other')
+
+        operation = task_scheduler.queues['create']
+        order = [operation.take(lambda tenant: True).args[0]
+                 for i in range(4)]
+        self.assertThat(order,
+                        Equals(['greedy-0', 'other', 'greedy-1', 'greedy-2']))
+
+    def test_operations_take_turns(self):
+        task_scheduler = TaskScheduler(max_running=1)
+        self._submit(task_scheduler, 'create', 'blocker', 'blocker')
+        for i in range(2):
+            self._submit(task_scheduler, 'create', 'tenant', 'create-%d' % i)
+        self._submit(task_scheduler, 'delete', 'tenant', 'delete')
+
+        order = [task_scheduler._next_task().args[0] for i in range(3)]
+        self.assertThat(order, Equals(['create-0', 'delete', 'create-1']))
+
+    def test_failed_task_frees_its_slot(self):
+        task_scheduler = TaskScheduler(max_running=1)
+
+        def fail():
+            raise Exception("Nova is down.")
+        task_scheduler.submit('create', 'tenant', fail)
+        self._submit(task_scheduler, 'create', 'tenant', 'next')
+
+        self.assertThat(self.tasks.started, Equals(['next']))
+        stats = task_scheduler.stats()['operations']['create']
+        self.assertThat(stats['failed'], Equals(1))
+        self.assertThat(stats['running'], Equals(1))
+
+    def test_stats(self):
+        task_scheduler = TaskScheduler(max_running=1)
+        self._submit(task_scheduler, 'create', 'tenant', 'first')
+        self._submit(task_scheduler, 'delete', 'tenant', 'second')
+        self._finish()
+
+        stats = task_scheduler.stats()
+        self.assertThat(stats['running'], Equals(0))
+        self.assertThat(stats['queued'], Equals(0))
+        self.assertThat(stats['operations']['create']['completed'],
+                        Equals(1))
+        self.assertThat(stats['operations']['delete']['completed'],
+                        Equals(1))
+        self.assertTrue(stats['operations']['delete']['max_wait_seconds'] >
+                        0)
+
+
+class ScheduledManagerTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ScheduledManagerTest, self).setUp()
+        self.manager = Manager()
+        self.context = mock()
+        self.context.tenant = 'tenant'
+        self.instance = mock()
+        when(BuiltInstance).load(
+            any(), any()).thenReturn(self.instance)
+
+    def tearDown(self):
+        super(ScheduledManagerTest, self).tearDown()
+        scheduler._SCHEDULER = None
+        unstub()
+
+    def test_runs_directly_without_limits(self):
+        self.manager.reboot(self.context, 'instance-1')
+        verify(self.instance).reboot()
+        self.assertThat(self.manager.get_task_stats(self.context),
+                        Equals({}))
+
+    def test_runs_through_scheduler(self):
+        scheduler._SCHEDULER = TaskScheduler(max_running=1)
+        self.manager.reboot(self.context, 'instance-1')
+        run_others()
+
+        verify(self.instance).reboot()
+        stats = self.manager.get_task_stats(self.context)
+        self.assertThat(stats['operations']['reboot']['completed'],
+                        Equals(1))
+
+    def test_create_instances_builds_side_by_side(self):
+        tasks = BlockingTasks()
+        self.manager.create_instance = (
+            lambda context, **kwargs: tasks(kwargs['name']))
+        self.manager.create_instances(
+            self.context, [{'instance_id': '1', 'name': 'a'},
+                           {'instance_id': '2', 'name': 'b'}])
+        run_others()
+
+        self.assertThat(tasks.started, Equals(['a', 'b']))
+        tasks.release.send()
@@ -0,0 +1,73 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import testtools
+from testtools.matchers import Equals
+
+from trove.common.exception import TroveError
+from trove.taskmanager.steps import StepGraph
+
+
+class StepGraphTest(testtools.TestCase):
+
+    def setUp(self):
+        super(StepGraphTest, self).setUp()
+        self.log = []
+        self.steps = StepGraph()
+
+    def _step(self, name, result=None, fail=False):
+        def step(done):
+            self.log.append('start %s' % name)
+            eventlet.sleep(0.01)
+            self.log.append('end %s' % name)
+            if fail:
+                raise Exception("%s failed." % name)
+            return result
+        return step
+
+    def test_independent_steps_run_concurrently(self):
+        self.steps.add('volume', self._step('volume'))
+        self.steps.add('security_groups', self._step('security_groups'))
+        self.steps.run()
+
+        self.assertThat(self.log[:2], Equals(['start volume',
+                                              'start security_groups']))
+        self.assertThat(sorted(self.steps.timings),
+                        Equals(['security_groups', 'volume']))
+
+    def test_steps_wait_for_their_requirements(self):
+        self.steps.add('server', lambda done: done['volume'] + 1,
+                       requires=['volume'])
+        self.steps.add('volume', self._step('volume', result=1))
+        results = self.steps.run()
+
+        self.assertThat(results, Equals({'volume': 1, 'server': 2}))
+
+    def test_failure_stops_later_steps(self):
+        self.steps.add('volume', self._step('volume', fail=True))
+        self.steps.add('security_groups', self._step('security_groups'))
+        self.steps.add('server', self._step('server'),
+                       requires=['volume', 'security_groups'])
+
+        self.assertRaises(Exception, self.steps.run)
+        self.assertThat(sorted(self.log),
+                        Equals(['end security_groups', 'end volume',
+                                'start security_groups', 'start volume']))
+        self.assertThat(sorted(self.steps.timings),
+                        Equals(['security_groups', 'volume']))
+
+    def test_missing_requirement(self):
+        self.steps.add('server', self._step('server'), requires=['volume'])
+        self.assertRaises(TroveError, self.steps.run)
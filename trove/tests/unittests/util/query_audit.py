@@ -0,0 +1,140 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Records the SQL statements issued by the code under test.
+
+Wrap an API call in a QueryAuditor to check how many statements it issues,
+which catches N+1 query patterns, and how the database runs them, which
+catches lookups that scan a whole table for want of an index:
+
+    with QueryAuditor() as auditor:
+        controller.show(req, tenant_id, id)
+    self.assertEqual(2, auditor.count(), auditor.report())
+    self.assertEqual([], auditor.full_scans(), auditor.report())
+"""
+
+import re
+import weakref
+
+from sqlalchemy import event
+
+from trove.db.sqlalchemy import session
+
+# SQLite plans a statement it can't serve from an index as "SCAN <table>",
+# or "SCAN TABLE <table>" in versions before 3.36.
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+EXPLAIN = {
+    'sqlite': ('EXPLAIN QUERY PLAN ', ('SELECT', 'UPDATE', 'DELETE')),
+    'mysql': ('EXPLAIN ', ('SELECT',)),
+}
+
+_ACTIVE = []
+_LISTENING = weakref.WeakKeyDictionary()
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    for auditor in _ACTIVE:
+        if auditor.engine is conn.engine:
+            auditor.statements.append((statement, parameters))
+
+
+class QueryAuditor(object):
+    """Records every statement an engine executes while it is active."""
+
+    def __init__(self, engine=None):
+        self.engine = engine or session._ENGINE
+        self.statements = []
+        if self.engine not in _LISTENING:
+            event.listen(self.engine, "before_cursor_execute", _record)
+            _LISTENING[self.engine] = True
+
+    def __enter__(self):
+        _ACTIVE.append(self)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        _ACTIVE.remove(self)
+
+    def count(self, verb=None):
+        """The number of statements, optionally only those of one verb."""
+        return len([statement for statement, parameters in self.statements
+                    if verb is None or _verb(statement) == verb])
+
+    def counts(self):
+        """The number of times each distinct statement was executed."""
+        counts = {}
+        for statement, parameters in self.statements:
+            counts[statement] = counts.get(statement, 0) + 1
+        return counts
+
+    def explain(self):
+        """The plan of each distinct statement that can be explained.
+
+        Returns (statement, plan) tuples in the order the statements were
+        first executed. Each plan is the list of rows EXPLAIN returned for
+        the parameters the statement was first executed with, as dicts keyed
+        by column name.
+        """
+        prefix, verbs = EXPLAIN.get(self.engine.dialect.name, ('', ()))
+        plans = []
+        seen = set()
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for statement, parameters in self.statements:
+                if statement in seen or _verb(statement) not in verbs:
+                    continue
+                seen.add(statement)
+                cursor.execute(prefix + statement, parameters)
+                columns = [column[0] for column in cursor.description]
+                plans.append((statement, [dict(zip(columns, row))
+                                          for row in cursor.fetchall()]))
+            cursor.close()
+        finally:
+            connection.close()
+        return plans
+
+    def full_scans(self):
+        """The (statement, table) pairs where a whole table is read."""
+        dialect = self.engine.dialect.name
+        scans = []
+        for statement, plan in self.explain():
+            for row in plan:
+                if dialect == 'sqlite':
+                    match = SQLITE_SCAN.match(row['detail'])
+                    table = match and match.group(1)
+                else:
+                    table = row['table'] if row['type'] == 'ALL' else None
+                if table:
+                    scans.append((statement, table))
+        return scans
+
+    def report(self):
+        """Describes the statements, their counts and plans."""
+        counts = self.counts()
+        plans = dict(self.explain())
+        lines = ["%d statements:" % len(self.statements)]
+        for statement, parameters in self.statements:
+            if statement not in counts:
+                continue
+            lines.append("%dx %s" % (counts.pop(statement),
+                                     " ".join(statement.split())))
+            for row in plans.get(statement, []):
+                lines.append("    %s" % row.get('detail', row))
+        return "\n".join(lines)
+
+
+def _verb(statement):
+    return statement.lstrip().split(None, 1)[0].upper()